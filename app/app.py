@@ -1,37 +1,908 @@
 # app/app.py
-from flask import Flask, request, render_template_string, redirect, url_for, jsonify
+from flask import Flask, request, render_template_string, redirect, url_for, jsonify, make_response, Response
 import sqlite3
 from datetime import datetime, timedelta
+from collections import OrderedDict
+from functools import wraps
+import gzip
+import hashlib
 import json
+import os
+import queue
+import threading
+import time
+import uuid
+from rules import BookingRules, REASON_MESSAGES
+from generation import GenerationCounter
+from backup import backup_database
+from partitions import partition_name, partition_for_id, partition_month, first_id, list_partitions
+from journal import SlotJournal, JournalError
+from snapshot import BookedSnapshot
 
 app = Flask(__name__)
 DATABASE = 'appointments.db'
 
+# Slot rules. Each slot is SLOT_MINUTES long and takes up to SLOT_CAPACITY
+# appointments (e.g. one per van). Slots start between the first and last
+# business hours inclusive.
+SLOT_CAPACITY = int(os.environ.get('SLOT_CAPACITY', 1))
+SLOT_MINUTES = int(os.environ.get('SLOT_MINUTES', 60))
+FIRST_SLOT_HOUR = 8
+LAST_SLOT_HOUR = 20
+RULES = BookingRules(SLOT_CAPACITY, SLOT_MINUTES, FIRST_SLOT_HOUR, LAST_SLOT_HOUR)
+
+# Read snapshot of booked slots (see BookedSnapshot). Readers grab the current
+# snapshot and never touch the database, so page views and /api/booked-slots
+# polls cannot contend with a booking commit. Writers replace it under the
+# lock after they commit.
+_snapshot_lock = threading.Lock()
+_booked_snapshot = None
+
+# Data generation shared by all worker processes on the database. Every
+# committed write bumps it; per-worker caches are tagged with the generation
+# they were built from and rebuilt when it moves on.
+_generation_counter = None
+
+# Short-lived slot holds taken when a customer clicks a time slot. A held slot
+# counts against capacity for everyone but the holder until it expires. Holds
+# live in the shared state database (see state_db), so every worker counts
+# them. They are indexed by expiry, so expiring them only touches holds that
+# are actually due: every HOLD_EXPIRY_POLL_SECONDS, a worker with open event
+# streams publishes the release of holds that expired since it last looked.
+HOLD_TTL_SECONDS = int(os.environ.get('HOLD_TTL_SECONDS', 300))
+HOLD_EXPIRY_POLL_SECONDS = 1
+_holds_lock = threading.Lock()
+_holds_checked_at = time.time()  # expiry up to which this worker has published releases
+
+# Responses to recent booking POSTs, keyed by the client's Idempotency-Key, so
+# a retried submission replays the original answer instead of running the
+# conflict check and insert again. They are kept in the shared state database
+# for IDEMPOTENCY_TTL_SECONDS, so a retry that reaches another worker is
+# answered the same way, and at most IDEMPOTENCY_CACHE_SIZE of them are kept.
+# A key whose request has been running for IDEMPOTENCY_IN_FLIGHT_SECONDS is
+# taken to belong to a worker that died.
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 600))
+IDEMPOTENCY_CACHE_SIZE = int(os.environ.get('IDEMPOTENCY_CACHE_SIZE', 10000))
+IDEMPOTENCY_IN_FLIGHT_SECONDS = 60
+IDEMPOTENCY_POLL_SECONDS = 0.02
+
+# Live slot updates for open booking pages. Writers publish occupancy changes
+# once; each /api/slot-events stream has its own bounded queue, and a client
+# that falls behind has its backlog replaced by a single resync event instead
+# of slowing the publisher down.
+SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', 100))
+SSE_HEARTBEAT_SECONDS = 15
+_subscribers_lock = threading.Lock()
+_subscribers = set()
+
+# Bookings and clears committed by other worker processes reach this worker's
+# event streams through the change feed: once anyone subscribes, a follower
+# thread watches the generation counter and publishes the changes this worker
+# did not publish itself, along with expired holds.
+CHANGE_POLL_SECONDS = 0.2
+_follower_lock = threading.Lock()
+_change_follower = None
+_local_change_seqs = set()
+
+# Rendered iCalendar feeds, keyed by date range and tagged with the data
+# generation they were rendered from. Dispatch clients poll with If-None-Match,
+# so an unchanged range costs a generation check and a 304.
+ICS_CACHE_SIZE = 64
+_ics_lock = threading.Lock()
+_ics_cache = OrderedDict()  # (from date, to date) -> (generation, body)
+
+# Utilization aggregates, keyed like the iCalendar cache and likewise rebuilt
+# only when the data generation moves on.
+STATS_CACHE_SIZE = 64
+_stats_lock = threading.Lock()
+_stats_cache = OrderedDict()  # (from date, to date, group) -> (generation, groups)
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+# Online backups started from /api/admin/backup. One runs at a time, in a
+# background thread, and its progress is kept here for polling.
+BACKUP_DIR = os.environ.get('BACKUP_DIR', 'backups')
+_backup_lock = threading.Lock()
+_backup_state = {"status": "idle"}
+
+# gzip-compressed response bodies, keyed by path, data generation and a digest
+# of the uncompressed body, so a payload that has not changed is compressed
+# once however many clients fetch it. Hashing is much cheaper than deflating.
+GZIP_MIN_SIZE = 1024
+GZIP_CACHE_SIZE = 32
+COMPRESSIBLE_TYPES = {'text/html', 'application/json', 'text/calendar'}
+_gzip_lock = threading.Lock()
+_gzip_cache = OrderedDict()  # (path, generation, body digest) -> compressed body
+
+# Appointments live in one table per month (see partitions.py). Queries go
+# only to the partitions their date range touches, and months that are over
+# can be detached into archive files. Partitions this worker knows exist:
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR', 'archive')
+_known_partitions = set()
+
+# Optional in-memory slot store (SLOT_STORE=memory), for a single serving
+# process. Bookings are checked and counted in memory and made durable in an
+# append-only journal next to the database (see journal.py). A checkpoint
+# moves them into the tables above every CHECKPOINT_SECONDS, and before any
+# request that reads or changes appointments in SQLite directly.
+SLOT_STORE = os.environ.get('SLOT_STORE', 'sqlite')
+CHECKPOINT_SECONDS = float(os.environ.get('CHECKPOINT_SECONDS', 1))
+JOURNAL_BATCH_MS = float(os.environ.get('JOURNAL_BATCH_MS', 0))
+_slot_store_lock = threading.Lock()
+_slot_store = None
+
+def ensure_partition(c, dt):
+    # Create the partition for dt's month if it does not exist yet, inside
+    # the caller's write transaction, and return its name. A new partition's
+    # id sequence starts at its month's id range, and its triggers keep the
+    # search index in step with it.
+    name = partition_name(dt)
+    if name in _known_partitions:
+        return name
+    if c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is None:
+        c.execute(f'''CREATE TABLE {name}
+                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
+                      appointment_time TEXT,
+                      details TEXT)''')
+        c.execute(f"CREATE INDEX idx_{name}_time ON {name} (appointment_time)")
+        c.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (name, first_id(dt)))
+        c.execute(f'''CREATE TRIGGER {name}_fts_insert AFTER INSERT ON {name} BEGIN
+                       INSERT INTO appointments_fts (rowid, details, appointment_time)
+                       VALUES (new.id, new.details, new.appointment_time);
+                     END''')
+        c.execute(f'''CREATE TRIGGER {name}_fts_delete AFTER DELETE ON {name} BEGIN
+                       DELETE FROM appointments_fts WHERE rowid = old.id;
+                     END''')
+        c.execute(f'''CREATE TRIGGER {name}_fts_update AFTER UPDATE ON {name} BEGIN
+                       UPDATE appointments_fts SET details = new.details, appointment_time = new.appointment_time
+                       WHERE rowid = new.id;
+                     END''')
+    _known_partitions.add(name)
+    return name
+
+def find_appointment(c, appointment_id):
+    # (partition, appointment_time, details) of an appointment, looked up in
+    # the one partition its id belongs to, or None if there is no such
+    # appointment. That is the month the id was allocated in, unless the
+    # appointment has been moved to another month since. The table is looked
+    # up rather than taken from _known_partitions, since another worker may
+    # have detached it.
+    moved = c.execute("SELECT partition FROM moved_appointments WHERE id = ?", (appointment_id,)).fetchone()
+    name = moved[0] if moved else partition_for_id(appointment_id)
+    if c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is None:
+        return None
+    row = c.execute(f"SELECT appointment_time, details FROM {name} WHERE id = ?", (appointment_id,)).fetchone()
+    return (name,) + row if row else None
+
+def insert_appointment(c, appointment_time, details):
+    # Insert an appointment into its month's partition and return its id. If
+    # another worker detached the partition since this one created or saw
+    # it, the insert finds no table; the partition is then made again. The
+    # id is the next one in the partition's sequence rather than past its
+    # largest id, since an appointment moved in from a later month keeps
+    # that month's id.
+    dt = datetime.fromisoformat(appointment_time)
+    name = ensure_partition(c, dt)
+    insert_sql = (f"INSERT INTO {name} (id, appointment_time, details) VALUES "
+                  "((SELECT seq + 1 FROM sqlite_sequence WHERE name = ?), ?, ?)")
+    try:
+        c.execute(insert_sql, (name, appointment_time, details))
+    except sqlite3.OperationalError:
+        _known_partitions.discard(name)
+        name = ensure_partition(c, dt)
+        c.execute(insert_sql, (name, appointment_time, details))
+    return c.lastrowid
+
+def move_appointment(c, appointment_id, appointment_time, details):
+    # Insert an appointment deleted from another month's partition into its
+    # new month's, under the same id, and record where it went. The new
+    # partition's id sequence is put back afterwards, since an id from a
+    # later month's range would move it on into that range.
+    dt = datetime.fromisoformat(appointment_time)
+    name = ensure_partition(c, dt)
+    seq = c.execute("SELECT seq FROM sqlite_sequence WHERE name = ?", (name,)).fetchone()[0]
+    c.execute(f"INSERT INTO {name} (id, appointment_time, details) VALUES (?, ?, ?)",
+              (appointment_id, appointment_time, details))
+    c.execute("UPDATE sqlite_sequence SET seq = ? WHERE name = ?", (seq, name))
+    if name == partition_for_id(appointment_id):
+        c.execute("DELETE FROM moved_appointments WHERE id = ?", (appointment_id,))
+    else:
+        c.execute("INSERT OR REPLACE INTO moved_appointments (id, partition) VALUES (?, ?)",
+                  (appointment_id, name))
+
 def init_db():
-    # Initialize the SQLite database with an appointments table.
+    # Initialize the SQLite database with appointment partitions.
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
-    c.execute('''CREATE TABLE IF NOT EXISTS appointments
-                 (id INTEGER PRIMARY KEY AUTOINCREMENT,
+    _known_partitions.clear()
+    # Full-text index over details for /api/appointments/search, with the
+    # appointment id as rowid. It spans every partition, so a search is one
+    # index lookup, and each partition's triggers keep it in step with every
+    # insert, update and delete. Replace the single-table version, which
+    # indexed appointments in place.
+    fts_sql = c.execute("SELECT sql FROM sqlite_master WHERE name = 'appointments_fts'").fetchone()
+    if fts_sql is not None and 'content=' in fts_sql[0]:
+        c.execute("DROP TABLE appointments_fts")
+        for trigger in ('insert', 'delete', 'update'):
+            c.execute(f"DROP TRIGGER IF EXISTS appointments_fts_{trigger}")
+    c.execute('''CREATE VIRTUAL TABLE IF NOT EXISTS appointments_fts
+                 USING fts5(details, appointment_time UNINDEXED)''')
+    # Change feed: every insert, delete and clear gets the next sequence number, in
+    # the same transaction as the change itself, so clients can replicate with
+    # /api/changes?since=<seq>. Detaching a month is one 'detach' row, whose
+    # appointment_time is the first day of the month. lsn is the journal record (see SLOT_STORE) of
+    # a checkpointed booking or of a clear made with the in-memory store on.
+    c.execute('''CREATE TABLE IF NOT EXISTS changes
+                 (seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                  op TEXT NOT NULL,
+                  appointment_id INTEGER,
                   appointment_time TEXT,
-                  details TEXT)''')
+                  lsn INTEGER)''')
+    if 'lsn' not in [column[1] for column in c.execute("PRAGMA table_info(changes)")]:
+        c.execute("ALTER TABLE changes ADD COLUMN lsn INTEGER")
+    # Move appointments from the single table used before partitioning into
+    # their months. They get new ids, so restart the change feed with a clear.
+    if c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'appointments'").fetchone():
+        for appointment_time, details in c.execute(
+                "SELECT appointment_time, details FROM appointments ORDER BY id").fetchall():
+            insert_appointment(c, appointment_time, details)
+        c.execute("DROP TABLE appointments")
+        c.execute("DELETE FROM changes")
+        c.execute("INSERT INTO changes (op) VALUES ('clear')")
+        for name in list_partitions(c):
+            c.execute(f'''INSERT INTO changes (op, appointment_id, appointment_time)
+                         SELECT 'insert', id, appointment_time FROM {name} ORDER BY id''')
+    # Appointments rescheduled out of the month their id was allocated in,
+    # and the partition they are in now, so ids stay the same across moves
+    c.execute('''CREATE TABLE IF NOT EXISTS moved_appointments
+                 (id INTEGER PRIMARY KEY,
+                  partition TEXT NOT NULL)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_moved_appointments_partition ON moved_appointments (partition)")
+    # Per-slot booking counter used to enforce capacity without scanning
+    # appointments. It is derived data, so rebuild it in case the slot length
+    # changed since the last run.
+    c.execute('''CREATE TABLE IF NOT EXISTS slot_counts
+                 (slot_start TEXT PRIMARY KEY,
+                  booked INTEGER NOT NULL) WITHOUT ROWID''')
+    c.execute("DELETE FROM slot_counts")
+    counts = {}
+    for name in list_partitions(c):
+        for (appointment_time,) in c.execute(f"SELECT appointment_time FROM {name}"):
+            key = RULES.slot_key(datetime.fromisoformat(appointment_time))
+            counts[key] = counts.get(key, 0) + 1
+    c.executemany("INSERT INTO slot_counts (slot_start, booked) VALUES (?, ?)", counts.items())
+    # Seed the change feed from appointments made before it existed
+    if c.execute("SELECT 1 FROM changes LIMIT 1").fetchone() is None:
+        for name in list_partitions(c):
+            c.execute(f'''INSERT INTO changes (op, appointment_id, appointment_time)
+                         SELECT 'insert', id, appointment_time FROM {name} ORDER BY id''')
+    # Last journal record (see SLOT_STORE) whose booking is in the tables above
+    c.execute("CREATE TABLE IF NOT EXISTS journal_checkpoint (lsn INTEGER NOT NULL)")
+    if c.execute("SELECT 1 FROM journal_checkpoint").fetchone() is None:
+        c.execute("INSERT INTO journal_checkpoint (lsn) VALUES (0)")
+    conn.commit()
+    conn.close()
+
+def state_db():
+    # Connection to the state the workers share but which need not survive a
+    # crash: slot holds and idempotency keys. It is a separate file next to
+    # the database, written without fsync and outside the appointments'
+    # write lock.
+    conn = sqlite3.connect(DATABASE + '.state')
+    conn.execute("PRAGMA synchronous = OFF")
+    return conn
+
+def init_state_db():
+    # Create the shared state tables, empty: holds and idempotency keys only
+    # last minutes and, like the in-process state they replace, do not
+    # outlive a restart.
+    conn = state_db()
+    c = conn.cursor()
+    c.execute("PRAGMA journal_mode = WAL")
+    c.execute('''CREATE TABLE IF NOT EXISTS holds
+                 (hold_id TEXT PRIMARY KEY,
+                  slot_start TEXT NOT NULL,
+                  expires_at REAL NOT NULL)''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_holds_slot_expiry ON holds (slot_start, expires_at)")
+    c.execute("CREATE INDEX IF NOT EXISTS idx_holds_expires_at ON holds (expires_at)")
+    # status is NULL while the request is still running
+    c.execute('''CREATE TABLE IF NOT EXISTS idempotency_keys
+                 (path TEXT NOT NULL,
+                  key TEXT NOT NULL,
+                  stored_at REAL NOT NULL,
+                  fingerprint TEXT NOT NULL,
+                  status INTEGER,
+                  headers TEXT,
+                  body BLOB,
+                  PRIMARY KEY (path, key))''')
+    c.execute("CREATE INDEX IF NOT EXISTS idx_idempotency_keys_stored_at ON idempotency_keys (stored_at)")
+    c.execute("DELETE FROM holds")
+    c.execute("DELETE FROM idempotency_keys")
     conn.commit()
     conn.close()
 
 def setup():
     # Manually initialize the database.
     init_db()
+    init_state_db()
+    load_snapshot()
+
+def generation_counter():
+    # The generation counter file for the current database.
+    global _generation_counter
+    if _generation_counter is None or _generation_counter.path != DATABASE + '.gen':
+        _generation_counter = GenerationCounter(DATABASE + '.gen')
+    return _generation_counter
+
+def data_generation():
+    # Current data generation, as seen by every worker.
+    return generation_counter().value()
+
+def bump_generation():
+    # Record a committed write and return the new generation.
+    return generation_counter().bump()
+
+def load_snapshot():
+    # Bring the read snapshot up to date with the database. The generation
+    # is read first, so a write that lands during the load triggers another
+    # one. A snapshot that is only behind is caught up from the change feed,
+    # which holds every committed change in commit order, so another
+    # worker's booking costs this worker a read of that booking, not of the
+    # whole table. Bookings in the in-memory store's journal are copied
+    # first, holding its lock only for the copy; a checkpoint or clear that
+    # runs after the copy shows up in the database reads, with the journal
+    # record it reached, so nothing is missed or counted twice.
+    global _booked_snapshot
+    with _snapshot_lock:
+        generation = data_generation()
+        # Another reader may have reloaded while this one waited for the lock
+        if _booked_snapshot is not None and _booked_snapshot.generation == generation:
+            return _booked_snapshot
+        store = _slot_store
+        pending, lsn = [], 0
+        if store:
+            with store.locked():
+                pending, lsn = list(store.pending), store.lsn
+        conn = sqlite3.connect(DATABASE)
+        c = conn.cursor()
+        if _booked_snapshot is not None:
+            c.execute("SELECT seq, op, appointment_time, lsn FROM changes WHERE seq > ? ORDER BY seq",
+                      (_booked_snapshot.seq,))
+            _booked_snapshot = catch_up(_booked_snapshot, generation, c.fetchall(), pending, lsn)
+            conn.close()
+            return _booked_snapshot
+        # The read transaction keeps the feed position, the checkpointed
+        # journal record and every partition at the same commit
+        slots = []
+        c.execute("BEGIN")
+        seq = c.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        checkpointed = c.execute("SELECT lsn FROM journal_checkpoint").fetchone()[0]
+        for name in list_partitions(c):
+            c.execute(f"SELECT appointment_time FROM {name} ORDER BY id")
+            slots.extend(datetime.fromisoformat(row[0]) for row in c.fetchall())
+        conn.close()
+        slots.extend(datetime.fromisoformat(appointment_time)
+                     for record_lsn, _, appointment_time, _ in pending if record_lsn > checkpointed)
+        _booked_snapshot = BookedSnapshot.build(generation, seq, max(lsn, checkpointed), RULES, slots)
+    return _booked_snapshot
+
+def catch_up(snapshot, generation, rows, pending=(), lsn=0):
+    # The snapshot after the change feed rows (seq, op, appointment_time,
+    # lsn) that followed it, then the journalled bookings in pending, as
+    # copied from the in-memory store at journal record lsn. The snapshot
+    # has every journal record up to its own lsn, so checkpointed bookings
+    # up to there are skipped, and a pending booking that has been
+    # checkpointed since is counted at its feed row. Everything before a
+    # clear is dropped, and a detached month is dropped in one step.
+    changes = []
+    cleared = False
+    reached = snapshot.lsn
+    caught_up = snapshot
+    for _, op, appointment_time, record_lsn in rows:
+        if op == 'clear':
+            changes = []
+            cleared = True
+        elif op == 'detach':
+            caught_up = caught_up.patched(caught_up.generation, changes, cleared).without_month(
+                datetime.fromisoformat(appointment_time).strftime('%Y-%m'))
+            changes = []
+            cleared = False
+        elif record_lsn is None or record_lsn > snapshot.lsn:
+            changes.append((op == 'insert', datetime.fromisoformat(appointment_time)))
+        if record_lsn is not None:
+            reached = max(reached, record_lsn)
+    changes.extend((True, datetime.fromisoformat(appointment_time))
+                   for record_lsn, _, appointment_time, _ in pending if record_lsn > reached)
+    return caught_up.patched(generation, changes, cleared, seq=rows[-1][0] if rows else None,
+                             lsn=max(reached, lsn))
+
+def patch_snapshot(generation, seqs=(), lsn=None, added=(), removed=(), cleared=False, checkpoint=None):
+    # Apply a committed write, which moved the data to `generation`, to the
+    # snapshot without re-reading the table. The write is placed by the
+    # consecutive change feed rows it wrote (seqs) or, for a booking in the
+    # in-memory store, by its journal record (lsn); a clear made with the
+    # store on has both. Removed slots are taken out before added ones go
+    # in, so a reschedule is one patch. A write is patched in only if it is
+    # the next one both by generation and by position: writers bump the
+    # generation after they commit, so two writes can bump in the opposite
+    # order to their commits. A checkpoint, whose bookings the snapshot
+    # already counts by journal record, moves it on only if it has them
+    # all, up to journal record `checkpoint`. Otherwise the snapshot keeps
+    # its older generation and the next read catches it up.
+    global _booked_snapshot
+    with _snapshot_lock:
+        snapshot = _booked_snapshot
+        if snapshot is None or snapshot.generation != generation - 1:
+            return
+        if seqs and snapshot.seq != seqs[0] - 1:
+            return
+        if lsn is not None and snapshot.lsn != lsn - 1:
+            return
+        if checkpoint is not None and snapshot.lsn < checkpoint:
+            return
+        changes = [(False, slot) for slot in removed] + [(True, slot) for slot in added]
+        _booked_snapshot = snapshot.patched(generation, changes, cleared,
+                                            seq=seqs[-1] if seqs else None, lsn=lsn)
+
+def discard_snapshot():
+    # Drop the read snapshot, so the next read loads it afresh. For a
+    # journalled booking that was rolled back: a snapshot may count it, and
+    # nothing in the change feed takes it out again.
+    global _booked_snapshot
+    with _snapshot_lock:
+        _booked_snapshot = None
+
+def get_snapshot():
+    # Current read snapshot, catching it up if any worker has written since
+    # it was taken.
+    snapshot = _booked_snapshot
+    if snapshot is None or snapshot.generation != data_generation():
+        snapshot = load_snapshot()
+    return snapshot
 
 def get_booked_slots():
-    # Get all booked time slots from the database
+    # Get all booked time slots from the read snapshot
+    return list(get_snapshot().slots)
+
+def publish_slot_event(op, slot=None):
+    # Fan an occupancy change out to every open event stream without blocking.
+    event = json.dumps({"op": op, "slot": slot.isoformat() if slot else None})
+    with _subscribers_lock:
+        for events in _subscribers:
+            try:
+                events.put_nowait(event)
+            except queue.Full:
+                while not events.empty():
+                    try:
+                        events.get_nowait()
+                    except queue.Empty:
+                        break
+                events.put_nowait(json.dumps({"op": "resync", "slot": None}))
+
+def note_local_change(seq):
+    # Remember a change this worker publishes itself, so the follower skips it.
+    with _follower_lock:
+        if _change_follower is not None:
+            _local_change_seqs.add(seq)
+
+def follow_changes(last_seq, generation):
+    # Publish changes committed by other workers, waking only when the
+    # generation moves, and holds as they expire.
+    while True:
+        time.sleep(CHANGE_POLL_SECONDS)
+        if time.time() - _holds_checked_at >= HOLD_EXPIRY_POLL_SECONDS:
+            publish_expired_holds()
+        if data_generation() == generation:
+            continue
+        generation = data_generation()
+        conn = sqlite3.connect(DATABASE)
+        c = conn.cursor()
+        c.execute("SELECT seq, op, appointment_time FROM changes WHERE seq > ? ORDER BY seq", (last_seq,))
+        rows = c.fetchall()
+        conn.close()
+        for seq, op, appointment_time in rows:
+            last_seq = seq
+            with _follower_lock:
+                if seq in _local_change_seqs:
+                    _local_change_seqs.discard(seq)
+                    continue
+            if op == 'insert':
+                publish_slot_event("book", datetime.fromisoformat(appointment_time))
+            elif op == 'delete':
+                publish_slot_event("cancel", datetime.fromisoformat(appointment_time))
+            elif op == 'clear':
+                publish_slot_event("clear")
+            # A detached month is over, so no open page shows its slots
+
+def start_change_follower():
+    # Start this worker's change follower if it is not running yet.
+    global _change_follower
+    with _follower_lock:
+        if _change_follower is None:
+            generation = data_generation()
+            conn = sqlite3.connect(DATABASE)
+            last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+            conn.close()
+            _change_follower = threading.Thread(target=follow_changes, args=(last_seq, generation), daemon=True)
+            _change_follower.start()
+
+def count_holds(c, dt, hold_id=None, now=None):
+    # Number of live holds on dt's slot, not counting hold_id, read with the
+    # state database cursor c.
+    return c.execute("SELECT COUNT(*) FROM holds WHERE slot_start = ? AND expires_at > ? AND hold_id IS NOT ?",
+                     (RULES.slot_key(dt), now or time.time(), hold_id)).fetchone()[0]
+
+def held_by_others(dt, hold_id=None):
+    # Number of live holds on dt's slot, not counting hold_id.
+    conn = state_db()
+    held = count_holds(conn.cursor(), dt, hold_id)
+    conn.close()
+    return held
+
+def refusal_message(dt, hold_id=None):
+    # Why a booking found no room in dt's slot.
+    if held_by_others(dt, hold_id):
+        return "Time slot is temporarily held"
+    return "Time slot already booked"
+
+def place_hold(dt):
+    # Hold dt's slot if bookings plus holds leave room. Returns the hold id
+    # and expiry time, or None if the slot is unavailable. Bookings are
+    # counted where they are made, not in the read snapshot, which can lag
+    # behind them. Bookings count holds under the store's lock, or inside a
+    # write transaction, so the count is taken under the same lock and no
+    # booking can land between it and the hold.
+    key = RULES.slot_key(dt)
+    store = slot_store()
+    if store:
+        with store.locked():
+            return add_hold(dt, store.counts.get(key, 0))
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
-    c.execute("SELECT appointment_time FROM appointments")
-    booked_slots = [datetime.fromisoformat(row[0]) for row in c.fetchall()]
+    c.execute("BEGIN IMMEDIATE")
+    row = c.execute("SELECT booked FROM slot_counts WHERE slot_start = ?", (key,)).fetchone()
+    hold = add_hold(dt, row[0] if row else 0)
+    conn.rollback()
+    conn.close()
+    return hold
+
+def add_hold(dt, booked):
+    # Hold dt's slot if its `booked` places plus live holds leave room.
+    # Returns as place_hold(). Holds that expired a TTL ago, long after any
+    # worker published their release, are deleted on the way.
+    now = time.time()
+    conn = state_db()
+    c = conn.cursor()
+    if booked + count_holds(c, dt, now=now) >= SLOT_CAPACITY:
+        conn.close()
+        return None
+    hold_id = uuid.uuid4().hex
+    expires_at = now + HOLD_TTL_SECONDS
+    c.execute("INSERT INTO holds (hold_id, slot_start, expires_at) VALUES (?, ?, ?)",
+              (hold_id, RULES.slot_key(dt), expires_at))
+    c.execute("DELETE FROM holds WHERE expires_at <= ?", (now - HOLD_TTL_SECONDS,))
+    conn.commit()
+    conn.close()
+    publish_slot_event("hold", RULES.slot_start(dt))
+    return hold_id, expires_at
+
+def release_hold(hold_id):
+    # Release a hold early. Returns False if it was unknown or already expired.
+    conn = state_db()
+    c = conn.cursor()
+    row = c.execute("SELECT slot_start FROM holds WHERE hold_id = ? AND expires_at > ?",
+                    (hold_id, time.time())).fetchone()
+    if row is not None:
+        c.execute("DELETE FROM holds WHERE hold_id = ?", (hold_id,))
+        conn.commit()
+    conn.close()
+    if row is None or not c.rowcount:
+        return False
+    publish_slot_event("release", datetime.fromisoformat(row[0]))
+    return True
+
+def clear_holds():
+    # Drop every hold.
+    conn = state_db()
+    conn.execute("DELETE FROM holds")
+    conn.commit()
     conn.close()
-    return booked_slots
+
+def live_hold_counts():
+    # Slot key -> number of live holds, counted over the expiry index's live
+    # end rather than grouped over every hold.
+    conn = state_db()
+    held = {}
+    for slot_start, in conn.execute("SELECT slot_start FROM holds WHERE expires_at > ?", (time.time(),)):
+        held[slot_start] = held.get(slot_start, 0) + 1
+    conn.close()
+    return held
+
+def get_held_slots():
+    # Start times of all live holds, one entry per hold.
+    conn = state_db()
+    rows = conn.execute("SELECT slot_start FROM holds WHERE expires_at > ?", (time.time(),)).fetchall()
+    conn.close()
+    return [datetime.fromisoformat(slot_start) for slot_start, in rows]
+
+def publish_expired_holds():
+    # Publish the release of every hold that expired since this worker last
+    # looked, whichever worker placed it, so open pages free the slot.
+    global _holds_checked_at
+    now = time.time()
+    with _holds_lock:
+        since, _holds_checked_at = _holds_checked_at, max(_holds_checked_at, now)
+    if since >= now:
+        return
+    conn = state_db()
+    rows = conn.execute("SELECT slot_start FROM holds WHERE expires_at > ? AND expires_at <= ?",
+                        (since, now)).fetchall()
+    conn.close()
+    for slot_start, in rows:
+        publish_slot_event("release", datetime.fromisoformat(slot_start))
+
+def claim_idempotency_key(path, key, fingerprint):
+    # Record a request as running under an idempotency key. Returns None if
+    # the key was free, or the entry already there as (fingerprint, status,
+    # headers, body), with status None while its request is still running.
+    # Expired entries and abandoned running ones are deleted on the way, and
+    # the oldest stored responses past IDEMPOTENCY_CACHE_SIZE, leaving room
+    # for this one. Running entries are left to the in-flight timeout, so a
+    # retry never misses a request that is still going.
+    now = time.time()
+    conn = state_db()
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    c.execute("DELETE FROM idempotency_keys WHERE stored_at <= ? OR (status IS NULL AND stored_at <= ?)",
+              (now - IDEMPOTENCY_TTL_SECONDS, now - IDEMPOTENCY_IN_FLIGHT_SECONDS))
+    c.execute('''DELETE FROM idempotency_keys WHERE rowid IN
+                 (SELECT rowid FROM idempotency_keys WHERE status IS NOT NULL
+                  ORDER BY stored_at DESC LIMIT -1 OFFSET ?)''', (max(IDEMPOTENCY_CACHE_SIZE - 1, 0),))
+    entry = c.execute("SELECT fingerprint, status, headers, body FROM idempotency_keys WHERE path = ? AND key = ?",
+                      (path, key)).fetchone()
+    if entry is None:
+        c.execute("INSERT INTO idempotency_keys (path, key, stored_at, fingerprint) VALUES (?, ?, ?, ?)",
+                  (path, key, now, fingerprint))
+    conn.commit()
+    conn.close()
+    return entry
+
+def finish_idempotency_key(path, key, response=None):
+    # Store the response to a claimed idempotency key, or free the key if
+    # there is none to replay.
+    conn = state_db()
+    if response is None:
+        conn.execute("DELETE FROM idempotency_keys WHERE path = ? AND key = ?", (path, key))
+    else:
+        conn.execute("UPDATE idempotency_keys SET stored_at = ?, status = ?, headers = ?, body = ? "
+                     "WHERE path = ? AND key = ?",
+                     (time.time(), response.status_code, json.dumps(list(response.headers)),
+                      response.get_data(), path, key))
+    conn.commit()
+    conn.close()
+
+def idempotent(view):
+    # Replay the stored response for POSTs that repeat an Idempotency-Key
+    # header (or idempotency_key form field, for plain HTML forms). A retry
+    # that arrives while the original is still running, on any worker, waits
+    # for its result; reusing a key for a different request is rejected.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if request.method != 'POST':
+            return view(*args, **kwargs)
+        key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+        if not key:
+            return view(*args, **kwargs)
+        fingerprint = json.dumps(sorted((name, value) for name, value in request.form.items(multi=True)
+                                        if name != 'idempotency_key'))
+        while True:
+            entry = claim_idempotency_key(request.path, key, fingerprint)
+            if entry is None:
+                break
+            stored_fingerprint, status, headers, body = entry
+            if stored_fingerprint != fingerprint:
+                return "Idempotency key was already used for a different request", 422
+            if status is not None:
+                return make_response(body, status, [tuple(header) for header in json.loads(headers)])
+            time.sleep(IDEMPOTENCY_POLL_SECONDS)
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            finish_idempotency_key(request.path, key)
+            raise
+        finish_idempotency_key(request.path, key, response if response.status_code < 500 else None)
+        return response
+    return wrapper
+
+def compressed(view):
+    # gzip the view's response for clients whose Accept-Encoding allows it.
+    # Streamed responses are sent as they are.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.mimetype not in COMPRESSIBLE_TYPES or response.is_streamed:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (response.status_code != 200 or 'Content-Encoding' in response.headers or
+                not request.accept_encodings['gzip']):
+            return response
+        body = response.get_data()
+        if len(body) < GZIP_MIN_SIZE:
+            return response
+        key = (request.path, data_generation(), hashlib.blake2b(body, digest_size=16).digest())
+        with _gzip_lock:
+            packed = _gzip_cache.get(key)
+            if packed is not None:
+                _gzip_cache.move_to_end(key)
+        if packed is None:
+            packed = gzip.compress(body, compresslevel=6, mtime=0)
+            with _gzip_lock:
+                _gzip_cache[key] = packed
+                while len(_gzip_cache) > GZIP_CACHE_SIZE:
+                    _gzip_cache.popitem(last=False)
+        response.set_data(packed)
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+    return wrapper
+
+def slot_store():
+    # This process's in-memory slot store, opened and replayed on first use,
+    # or None when bookings go straight to SQLite. Only request handling
+    # opens it (see open_slot_store), so it is never opened by setup() in the
+    # launcher's parent or the debug reloader's watcher process.
+    global _slot_store
+    if SLOT_STORE != 'memory':
+        return None
+    with _slot_store_lock:
+        if _slot_store is None or _slot_store.path != DATABASE + '.journal':
+            conn = sqlite3.connect(DATABASE)
+            counts = dict(conn.execute("SELECT slot_start, booked FROM slot_counts WHERE booked > 0"))
+            lsn = conn.execute("SELECT lsn FROM journal_checkpoint").fetchone()[0]
+            conn.close()
+            store = SlotJournal(DATABASE + '.journal', SLOT_CAPACITY, JOURNAL_BATCH_MS / 1000)
+            store.open(counts, lsn)
+            # Bookings replayed from the journal go into SQLite straight away.
+            # The snapshot was loaded without them, so it is reloaded rather
+            # than patched.
+            if store.checkpoint(write_checkpoint):
+                bump_generation()
+            _slot_store = store
+            threading.Thread(target=checkpoint_loop, args=(store,), daemon=True).start()
+        return _slot_store
+
+def _forget_slot_store():
+    # A forked child gets the parent's store without the threads that fsync
+    # and checkpoint it, so it opens its own on first use.
+    global _slot_store, _slot_store_lock
+    _slot_store = None
+    _slot_store_lock = threading.Lock()
+
+os.register_at_fork(after_in_child=_forget_slot_store)
+
+@app.before_request
+def open_slot_store():
+    # Open the slot store before the serving process's first request, so
+    # bookings replayed from the journal are visible to reads too.
+    if SLOT_STORE == 'memory' and _slot_store is None:
+        slot_store()
+
+def write_checkpoint(bookings, lsn):
+    # Store journalled bookings and the journal position they reach in one
+    # transaction, and return their change feed rows. The store already
+    # enforced capacity, so the slot counters are bumped unconditionally.
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    seqs = []
+    for record_lsn, appointment_time, details in bookings:
+        c.execute('''INSERT INTO slot_counts (slot_start, booked) VALUES (?, 1)
+                     ON CONFLICT(slot_start) DO UPDATE SET booked = booked + 1''',
+                  (RULES.slot_key(datetime.fromisoformat(appointment_time)),))
+        appointment_id = insert_appointment(c, appointment_time, details)
+        c.execute("INSERT INTO changes (op, appointment_id, appointment_time, lsn) VALUES ('insert', ?, ?, ?)",
+                  (appointment_id, appointment_time, record_lsn))
+        seqs.append(c.lastrowid)
+    c.execute("UPDATE journal_checkpoint SET lsn = ?", (lsn,))
+    conn.commit()
+    conn.close()
+    # These bookings were published to event streams when they were made
+    for seq in seqs:
+        note_local_change(seq)
+    return seqs
+
+def checkpoint_slot_store():
+    # Move journalled bookings into SQLite now. The snapshot normally has
+    # them already, so it only moves on to the new generation and feed
+    # position.
+    store = slot_store()
+    seqs = []
+    reached = None
+
+    def write(bookings, lsn):
+        nonlocal reached
+        seqs.extend(write_checkpoint(bookings, lsn))
+        reached = lsn
+
+    if store and store.checkpoint(write):
+        patch_snapshot(bump_generation(), seqs, checkpoint=reached)
+
+def checkpoint_loop(store):
+    # Checkpoint the store every CHECKPOINT_SECONDS while it is current.
+    while _slot_store is store:
+        checkpoint_slot_store()
+        time.sleep(CHECKPOINT_SECONDS)
+
+def checkpointed(view):
+    # Checkpoint the in-memory slot store before a view that reads or writes
+    # appointments in SQLite, so it sees every booking made so far.
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        checkpoint_slot_store()
+        return view(*args, **kwargs)
+    return wrapper
+
+def occupancy_for(slots):
+    # Bookings plus live holds for the slots containing each datetime in slots.
+    counts = get_snapshot().counts
+    held = live_hold_counts()
+    keys = {RULES.slot_key(slot) for slot in slots}
+    return {key: counts.get(key, 0) + held.get(key, 0) for key in keys}
+
+def ui_state(days):
+    # What the booking page shows for each date: whether its date card can be
+    # picked, and which time slots are enabled, from the same booked and held
+    # slots that feed the page and one batched evaluation of the rules.
+    now = datetime.now()
+    slots = [slot for day in days for slot in RULES.day_slots(day)]
+    reasons = iter(RULES.evaluate(slots, occupancy_for(slots), now))
+    states = []
+    for day in days:
+        day_reason = RULES.day_reason(day.date(), now)
+        states.append({
+            "date": day.strftime('%Y-%m-%d'),
+            "selectable": day_reason is None,
+            "reason": day_reason,
+            "slots": [{"time": slot.strftime('%H:%M'), "enabled": reason is None, "reason": reason}
+                      for slot, reason in zip(RULES.day_slots(day), reasons)]
+        })
+    return states
+
+def month_calendar(year, month):
+    # The page state of every date in a month, keyed by date.
+    day = datetime(year, month, 1)
+    days = []
+    while day.month == month:
+        days.append(day)
+        day += timedelta(days=1)
+    return {state["date"]: state for state in ui_state(days)}
+
+def next_available_slots(after, count):
+    # Earliest count free slots starting at or after `after`. Walks the slot
+    # ordinals from the starting position and skips the full ones, which the
+    # snapshot's sorted per-month index yields in order, so the cost depends
+    # on count and the number of full slots passed, not on how many days are
+    # covered.
+    # Held slots are few, so those filled up by holds are checked in a set.
+    first_day = RULES.first_bookable_date()
+    first_day_start = datetime(first_day.year, first_day.month, first_day.day)
+    snapshot = get_snapshot()
+    held_full = set()
+    for key, held in live_hold_counts().items():
+        if snapshot.counts.get(key, 0) + held >= SLOT_CAPACITY:
+            held_full.add(RULES.slot_ordinal(datetime.fromisoformat(key)))
+    position = RULES.first_slot_ordinal_from(max(after, first_day_start))
+    full_slots = snapshot.full_slots_from(position)
+    next_full = next(full_slots, None)
+    found = []
+    while len(found) < count:
+        if position == next_full:
+            next_full = next(full_slots, None)
+        elif position not in held_full:
+            found.append(RULES.slot_from_ordinal(position))
+        position += 1
+    return found
 
 @app.route('/api/booked-slots', methods=['GET'])
+@compressed
 def booked_slots_api():
     # API endpoint to get booked slots
     booked_slots = get_booked_slots()
@@ -39,17 +910,651 @@ def booked_slots_api():
     formatted_slots = [slot.isoformat() for slot in booked_slots]
     return jsonify(formatted_slots)
     
+@app.route('/api/changes', methods=['GET'])
+@compressed
+@checkpointed
+def changes_api():
+    # API endpoint to get inserts, deletes, clears and detached months after a
+    # sequence number
+    try:
+        since = int(request.args.get('since', 0))
+        limit = min(int(request.args.get('limit', 1000)), 10000)
+    except ValueError:
+        return "Invalid change cursor", 400
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    c.execute('''SELECT seq, op, appointment_id, appointment_time FROM changes
+                 WHERE seq > ? ORDER BY seq LIMIT ?''', (since, limit + 1))
+    rows = c.fetchall()
+    conn.close()
+    changes = [{
+        "seq": seq,
+        "op": op,
+        "id": appointment_id,
+        "appointment_time": datetime.fromisoformat(appointment_time).isoformat() if appointment_time else None
+    } for seq, op, appointment_id, appointment_time in rows[:limit]]
+    return jsonify({
+        "changes": changes,
+        "last_seq": changes[-1]["seq"] if changes else since,
+        "more": len(rows) > limit
+    })
+
+def fts_query(text):
+    # Turn free text into an FTS5 query matching every word, quoting each one
+    # so punctuation in notes cannot be read as query syntax.
+    return ' '.join('"%s"' % word.replace('"', '""') for word in text.split())
+
+@app.route('/api/appointments/search', methods=['GET'])
+@compressed
+@checkpointed
+def search_appointments_api():
+    # API endpoint to find appointments whose details contain every word of q,
+    # best matches first
+    query = fts_query(request.args.get('q', ''))
+    if not query:
+        return "Missing search query", 400
+    try:
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError:
+        return "Invalid search page", 400
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    c.execute('''SELECT rowid, appointment_time, details FROM appointments_fts
+                 WHERE appointments_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?''',
+              (query, limit + 1, offset))
+    rows = c.fetchall()
+    conn.close()
+    results = [{
+        "id": appointment_id,
+        "appointment_time": datetime.fromisoformat(appointment_time).isoformat(),
+        "details": details
+    } for appointment_id, appointment_time, details in rows[:limit]]
+    return jsonify({
+        "results": results,
+        "next_offset": offset + limit if len(rows) > limit else None
+    })
+
+@app.route('/api/calendar', methods=['GET'])
+@compressed
+def calendar_api():
+    # API endpoint to get the bookability of every slot in a month (YYYY-MM)
+    try:
+        month = datetime.strptime(request.args.get('month', ''), '%Y-%m')
+    except ValueError:
+        return "Invalid month format", 400
+    return jsonify(month_calendar(month.year, month.month))
+
+@app.route('/api/ui-state', methods=['GET'])
+@compressed
+def ui_state_api():
+    # API endpoint to get exactly which time slots the page enables for a date (YYYY-MM-DD)
+    try:
+        day = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d')
+    except ValueError:
+        return "Invalid date format", 400
+    return jsonify(ui_state([day])[0])
+
+@app.route('/api/next-available', methods=['GET'])
+def next_available_api():
+    # API endpoint to find the earliest bookable slots
+    try:
+        after = datetime.fromisoformat(request.args.get('after', datetime.now().isoformat()))
+        count = int(request.args.get('count', 1))
+    except ValueError:
+        return "Invalid search parameters", 400
+    if after.tzinfo is not None:
+        after = after.astimezone().replace(tzinfo=None)
+    if count < 1 or count > 100:
+        return "Count must be between 1 and 100", 400
+    return jsonify([slot.isoformat() for slot in next_available_slots(after, count)])
+
+@app.route('/api/holds', methods=['POST'])
+@idempotent
+def create_hold_api():
+    # API endpoint to hold a time slot while the customer finishes the form
+    try:
+        appt_dt = datetime.fromisoformat(request.form.get('appointment_time'))
+    except Exception:
+        return "Invalid datetime format", 400
+    reason = RULES.evaluate([appt_dt])[0]
+    if reason is not None:
+        return REASON_MESSAGES[reason], 400
+    hold = place_hold(appt_dt)
+    if hold is None:
+        return "Time slot is not available", 400
+    hold_id, expires_at = hold
+    return jsonify({
+        "hold_id": hold_id,
+        "appointment_time": RULES.slot_start(appt_dt).isoformat(),
+        "expires_at": datetime.fromtimestamp(expires_at).isoformat()
+    }), 201
+
+@app.route('/api/holds/<hold_id>', methods=['DELETE'])
+def release_hold_api(hold_id):
+    # API endpoint to release a hold before it expires
+    if not release_hold(hold_id):
+        return "Hold not found", 404
+    return jsonify({"status": "success", "message": "Hold released"})
+
+@app.route('/api/held-slots', methods=['GET'])
+def held_slots_api():
+    # API endpoint to get the start times of currently held slots
+    return jsonify([slot.isoformat() for slot in get_held_slots()])
+
+@app.route('/api/slot-events', methods=['GET'])
+def slot_events_api():
+    # Server-Sent Events stream of slot occupancy changes
+    start_change_follower()
+    events = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+    with _subscribers_lock:
+        _subscribers.add(events)
+
+    def stream():
+        try:
+            # Send something straight away so the client sees the stream open
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    yield f"data: {events.get(timeout=SSE_HEARTBEAT_SECONDS)}\n\n"
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            with _subscribers_lock:
+                _subscribers.discard(events)
+
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@app.route('/api/slot-config', methods=['GET'])
+def slot_config_api():
+    # API endpoint describing the slot rules the page and clients should apply
+    return jsonify(RULES.config())
+
+def ics_escape(text):
+    # Escape text for an iCalendar property value.
+    return (text.replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,')
+            .replace('\r\n', '\\n').replace('\n', '\\n'))
+
+def ics_line(line):
+    # Fold a content line at 75 octets as RFC 5545 requires.
+    encoded = line.encode('utf-8')
+    parts = []
+    while len(encoded) > 75:
+        cut = 75 if not parts else 74
+        while cut and (encoded[cut] & 0xC0) == 0x80:  # don't split a UTF-8 sequence
+            cut -= 1
+        parts.append(encoded[:cut].decode('utf-8'))
+        encoded = encoded[cut:]
+    parts.append(encoded.decode('utf-8'))
+    return '\r\n '.join(parts) + '\r\n'
+
+def render_ics(first_day, last_day):
+    # Yield the iCalendar feed of appointments between two dates inclusive,
+    # one VEVENT at a time, using the appointment_time index.
+    stamp = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())
+    yield ics_line('BEGIN:VCALENDAR')
+    yield ics_line('VERSION:2.0')
+    yield ics_line('PRODID:-//AI_ATDD//Appointment Scheduler//EN')
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    rows = (row for name in list_partitions(c, first_day, last_day)
+            for row in c.execute(f'''SELECT id, appointment_time, details FROM {name}
+                                     WHERE appointment_time >= ? AND appointment_time < ?
+                                     ORDER BY appointment_time''',
+                                 (first_day.isoformat(), (last_day + timedelta(days=1)).isoformat())).fetchall())
+    for appointment_id, appointment_time, details in rows:
+        start = datetime.fromisoformat(appointment_time)
+        end = RULES.slot_start(start) + timedelta(minutes=SLOT_MINUTES)
+        yield ics_line('BEGIN:VEVENT')
+        yield ics_line(f'UID:appointment-{appointment_id}@appointment-scheduler')
+        yield ics_line(f'DTSTAMP:{stamp}')
+        yield ics_line(f"DTSTART:{start.strftime('%Y%m%dT%H%M%S')}")
+        yield ics_line(f"DTEND:{end.strftime('%Y%m%dT%H%M%S')}")
+        yield ics_line('SUMMARY:Delivery')
+        if details:
+            yield ics_line(f'DESCRIPTION:{ics_escape(details)}')
+        yield ics_line('END:VEVENT')
+    conn.close()
+    yield ics_line('END:VCALENDAR')
+
+def date_range_args():
+    # The `from` and `to` query arguments (YYYY-MM-DD, inclusive, default
+    # today only) as dates. Raises ValueError with the message to return.
+    try:
+        first_day = datetime.strptime(request.args.get('from', datetime.now().strftime('%Y-%m-%d')), '%Y-%m-%d').date()
+        last_day = datetime.strptime(request.args.get('to', first_day.isoformat()), '%Y-%m-%d').date()
+    except ValueError:
+        raise ValueError("Invalid date format")
+    if last_day < first_day or (last_day - first_day).days > 366:
+        raise ValueError("Date range must be between 1 and 367 days")
+    return first_day, last_day
+
+@app.route('/calendar.ics', methods=['GET'])
+@compressed
+@checkpointed
+def calendar_ics():
+    # iCalendar feed of booked appointments from `from` to `to` (YYYY-MM-DD,
+    # inclusive, default today only)
+    try:
+        first_day, last_day = date_range_args()
+    except ValueError as e:
+        return str(e), 400
+
+    generation = data_generation()
+    etag = f'{generation}-{first_day:%Y%m%d}-{last_day:%Y%m%d}'
+    headers = {'Cache-Control': 'no-cache'}
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304, headers=headers)
+        response.set_etag(etag, weak=True)
+        return response
+
+    key = (first_day, last_day)
+    with _ics_lock:
+        cached = _ics_cache.get(key)
+        if cached is not None and cached[0] == generation:
+            _ics_cache.move_to_end(key)
+            body = cached[1]
+        else:
+            body = None
+
+    if body is None:
+        # Stream a fresh rendering and keep a copy for the next poll
+        def stream():
+            chunks = []
+            for chunk in render_ics(first_day, last_day):
+                chunks.append(chunk)
+                yield chunk
+            with _ics_lock:
+                _ics_cache[key] = (generation, ''.join(chunks))
+                _ics_cache.move_to_end(key)
+                while len(_ics_cache) > ICS_CACHE_SIZE:
+                    _ics_cache.popitem(last=False)
+        body = stream()
+
+    response = Response(body, mimetype='text/calendar', headers=headers)
+    response.set_etag(etag, weak=True)
+    return response
+
+def utilization(first_day, last_day, group):
+    # Booked and total places per day, hour or weekday between two dates
+    # inclusive. Bookings are summed in SQLite straight from the slot_counts
+    # primary key, which holds both columns, so a year is a few thousand index
+    # entries and no appointment rows. Capacity is worked out from the rules.
+    slots_per_hour = 60 // SLOT_MINUTES
+    capacity = {}
+    day = first_day
+    while day <= last_day:
+        if day.weekday() != 6:
+            if group == 'day':
+                capacity[day.isoformat()] = RULES.slots_per_day() * SLOT_CAPACITY
+            elif group == 'weekday':
+                name = WEEKDAY_NAMES[day.weekday()]
+                capacity[name] = capacity.get(name, 0) + RULES.slots_per_day() * SLOT_CAPACITY
+            else:
+                for hour in range(FIRST_SLOT_HOUR, LAST_SLOT_HOUR + 1):
+                    capacity[hour] = capacity.get(hour, 0) + slots_per_hour * SLOT_CAPACITY
+        day += timedelta(days=1)
+    if group == 'weekday':
+        # Keep Monday to Saturday order whatever day the range starts on
+        capacity = {name: capacity[name] for name in WEEKDAY_NAMES if name in capacity}
+
+    key_sql = {
+        'day': "substr(slot_start, 1, 10)",
+        'hour': "CAST(substr(slot_start, 12, 2) AS INTEGER)",
+        'weekday': "CAST(strftime('%w', substr(slot_start, 1, 10)) AS INTEGER)",
+    }[group]
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    c.execute(f'''SELECT {key_sql}, SUM(booked) FROM slot_counts
+                  WHERE slot_start >= ? AND slot_start < ? GROUP BY 1''',
+              (first_day.isoformat(), (last_day + timedelta(days=1)).isoformat()))
+    booked = dict(c.fetchall())
+    conn.close()
+    if group == 'weekday':
+        # strftime('%w') counts from Sunday = 0
+        booked = {WEEKDAY_NAMES[(number - 1) % 7]: count for number, count in booked.items()}
+
+    return [{
+        "key": key,
+        "booked": booked.get(key, 0),
+        "free": max(places - booked.get(key, 0), 0),
+        "capacity": places,
+        "utilization": round(booked.get(key, 0) / places, 4)
+    } for key, places in capacity.items()]
+
+@app.route('/api/stats/utilization', methods=['GET'])
+@compressed
+@checkpointed
+def utilization_api():
+    # API endpoint for booked versus free places between `from` and `to`,
+    # grouped by day, hour or weekday
+    try:
+        first_day, last_day = date_range_args()
+    except ValueError as e:
+        return str(e), 400
+    group = request.args.get('group', 'day')
+    if group not in ('day', 'hour', 'weekday'):
+        return "Invalid group: use day, hour or weekday", 400
+
+    generation = data_generation()
+    key = (first_day, last_day, group)
+    with _stats_lock:
+        cached = _stats_cache.get(key)
+        if cached is not None and cached[0] == generation:
+            _stats_cache.move_to_end(key)
+            groups = cached[1]
+        else:
+            groups = None
+    if groups is None:
+        groups = utilization(first_day, last_day, group)
+        with _stats_lock:
+            _stats_cache[key] = (generation, groups)
+            _stats_cache.move_to_end(key)
+            while len(_stats_cache) > STATS_CACHE_SIZE:
+                _stats_cache.popitem(last=False)
+    return jsonify({
+        "from": first_day.isoformat(),
+        "to": last_day.isoformat(),
+        "group": group,
+        "groups": groups
+    })
+
+def run_backup(target):
+    # Back up the database to target, recording progress and the outcome.
+    def progress(remaining, total):
+        with _backup_lock:
+            _backup_state.update(remaining=remaining, total=total)
+    try:
+        summary = backup_database(DATABASE, target, progress=progress)
+    except Exception as e:
+        with _backup_lock:
+            _backup_state.update(status="failed", error=str(e))
+    else:
+        with _backup_lock:
+            _backup_state.update(status="complete", verified=True, **summary)
+
+@app.route('/api/admin/backup', methods=['POST'])
+@checkpointed
+def start_backup_api():
+    # API endpoint to start an online backup of the database into BACKUP_DIR.
+    # Bookings keep being accepted while it runs.
+    global _backup_state
+    with _backup_lock:
+        if _backup_state["status"] == "running":
+            return "A backup is already running", 409
+        os.makedirs(BACKUP_DIR, exist_ok=True)
+        target = os.path.join(BACKUP_DIR, time.strftime('appointments-%Y%m%dT%H%M%S.db'))
+        _backup_state = {"status": "running", "target": target, "remaining": None, "total": None}
+        state = dict(_backup_state)
+    threading.Thread(target=run_backup, args=(target,), daemon=True).start()
+    return jsonify(state), 202
+
+@app.route('/api/admin/backup', methods=['GET'])
+def backup_status_api():
+    # API endpoint reporting the progress or outcome of the latest backup
+    with _backup_lock:
+        return jsonify(_backup_state)
+
+@app.route('/api/admin/partitions', methods=['GET'])
+@checkpointed
+def partitions_api():
+    # API endpoint listing the live monthly partitions and their sizes
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    partitions = [{"name": name,
+                   "month": partition_month(name).strftime('%Y-%m'),
+                   "appointments": c.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]}
+                  for name in list_partitions(c)]
+    conn.close()
+    return jsonify({"partitions": partitions})
+
+@app.route('/api/admin/partitions/<month>/detach', methods=['POST'])
+@checkpointed
+def detach_partition_api(month):
+    # API endpoint to move a finished month's partition out of the live
+    # database into ARCHIVE_DIR/appointments-YYYY-MM.db. Only that month's
+    # table, search rows and slot counters are touched; the live partitions
+    # are not rewritten. Replicas see one 'detach' of the month.
+    try:
+        first_day = datetime.strptime(month, '%Y-%m')
+    except ValueError:
+        return "Invalid month format", 400
+    if first_day >= datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0):
+        return "Only months that are over can be detached", 400
+    name = partition_name(first_day)
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    archive = os.path.join(ARCHIVE_DIR, f'appointments-{month}.db')
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    if name not in list_partitions(c):
+        conn.close()
+        return "Partition not found", 404
+    if os.path.exists(archive):
+        conn.close()
+        return "Month is already archived", 409
+    # ATTACH cannot run inside a transaction, so attach before taking the lock
+    c.execute("ATTACH DATABASE ? AS archive", (archive,))
+    next_month = (first_day + timedelta(days=31)).replace(day=1)
+    try:
+        c.execute("BEGIN IMMEDIATE")
+        c.execute(f'''CREATE TABLE archive.{name}
+                     (id INTEGER PRIMARY KEY,
+                      appointment_time TEXT,
+                      details TEXT)''')
+        c.execute(f"INSERT INTO archive.{name} SELECT id, appointment_time, details FROM {name}")
+        archived = c.rowcount
+        c.execute("INSERT INTO changes (op, appointment_time) VALUES ('detach', ?)",
+                  (first_day.strftime('%Y-%m-%dT%H:%M'),))
+        # Every row of the month is going, so clear its search rows by id and
+        # its slot counters by range; dropping the table drops its triggers
+        # unfired. Appointments moved into the month go with it.
+        c.execute(f"DELETE FROM appointments_fts WHERE rowid IN (SELECT id FROM {name})")
+        c.execute("DELETE FROM moved_appointments WHERE partition = ?", (name,))
+        c.execute("DELETE FROM slot_counts WHERE slot_start >= ? AND slot_start < ?",
+                  (first_day.strftime('%Y-%m-%dT%H:%M'), next_month.strftime('%Y-%m-%dT%H:%M')))
+        c.execute(f"DROP TABLE {name}")
+        conn.commit()
+    except BaseException:
+        # Leave the live database as it was and no partial archive behind,
+        # so the month can be detached again
+        conn.rollback()
+        conn.close()
+        for path in (archive, archive + '-journal'):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    c.execute("DETACH DATABASE archive")
+    conn.close()
+    _known_partitions.discard(name)
+    store = slot_store()
+    if store:
+        store.forget(first_day.strftime('%Y-%m-%dT%H:%M'), next_month.strftime('%Y-%m-%dT%H:%M'))
+    bump_generation()
+    return jsonify({"status": "success", "partition": name, "archive": archive, "appointments": archived})
+
 @app.route('/api/clear-slots', methods=['POST'])
 def clear_slots_api():
     # API endpoint to clear all booked slots (for testing)
+    seq = None
+    cleared_lsn = None
+
+    def clear(lsn=None):
+        nonlocal seq, cleared_lsn
+        conn = sqlite3.connect(DATABASE)
+        c = conn.cursor()
+        for name in list_partitions(c):
+            c.execute(f"DELETE FROM {name}")
+        c.execute("DELETE FROM slot_counts")
+        c.execute("DELETE FROM moved_appointments")
+        # Nothing before a clear matters to a replica, so compact the feed
+        # down to the clear itself
+        c.execute("DELETE FROM changes")
+        c.execute("INSERT INTO changes (op, lsn) VALUES ('clear', ?)", (lsn,))
+        seq = c.lastrowid
+        # Bookings still in the journal are cleared along with the rest
+        if lsn is not None:
+            c.execute("UPDATE journal_checkpoint SET lsn = ?", (lsn,))
+        conn.commit()
+        conn.close()
+        cleared_lsn = lsn
+
+    store = slot_store()
+    if store:
+        store.reset(clear)
+    else:
+        clear()
+    note_local_change(seq)
+    patch_snapshot(bump_generation(), (seq,), cleared_lsn, cleared=True)
+    clear_holds()
+    publish_slot_event("clear")
+    return jsonify({"status": "success", "message": "All appointments cleared"})
+
+def reserve_slot(c, dt, held=0):
+    # Take a place in dt's slot within the caller's transaction, leaving
+    # `held` places for other customers' holds. The counter row is bumped
+    # only while below capacity, so the check and the reservation are one
+    # indexed statement. Returns False if the slot is full.
+    if held >= SLOT_CAPACITY:
+        return False
+    c.execute('''INSERT INTO slot_counts (slot_start, booked) VALUES (?, 1)
+                 ON CONFLICT(slot_start) DO UPDATE SET booked = booked + 1
+                 WHERE booked + ? < ?''',
+              (RULES.slot_key(dt), held, SLOT_CAPACITY))
+    return c.rowcount > 0
+
+def free_slot(c, dt):
+    # Give back a place in dt's slot within the caller's transaction.
+    c.execute("UPDATE slot_counts SET booked = booked - 1 WHERE slot_start = ?", (RULES.slot_key(dt),))
+
+@app.route('/api/appointments/<int:appointment_id>', methods=['DELETE'])
+@checkpointed
+def cancel_appointment_api(appointment_id):
+    # API endpoint to cancel one appointment and free its place
     conn = sqlite3.connect(DATABASE)
     c = conn.cursor()
-    c.execute("DELETE FROM appointments")
+    c.execute("BEGIN IMMEDIATE")
+    found = find_appointment(c, appointment_id)
+    if found is None:
+        conn.rollback()
+        conn.close()
+        return "Appointment not found", 404
+    name, appointment_time, _ = found
+    appt_dt = datetime.fromisoformat(appointment_time)
+    c.execute(f"DELETE FROM {name} WHERE id = ?", (appointment_id,))
+    c.execute("DELETE FROM moved_appointments WHERE id = ?", (appointment_id,))
+    free_slot(c, appt_dt)
+    c.execute("INSERT INTO changes (op, appointment_id, appointment_time) VALUES ('delete', ?, ?)",
+              (appointment_id, appointment_time))
     conn.commit()
     conn.close()
-    return jsonify({"status": "success", "message": "All appointments cleared"})
+    store = slot_store()
+    if store:
+        store.release(RULES.slot_key(appt_dt))
+    note_local_change(c.lastrowid)
+    patch_snapshot(bump_generation(), (c.lastrowid,), removed=(appt_dt,))
+    publish_slot_event("cancel", appt_dt)
+    return jsonify({"status": "success", "message": "Appointment cancelled"})
+
+@app.route('/api/appointments/<int:appointment_id>/reschedule', methods=['POST'])
+@idempotent
+@checkpointed
+def reschedule_appointment_api(appointment_id):
+    # API endpoint to move one appointment to another slot. The new slot is
+    # taken and the old one freed in the same transaction, so nobody else can
+    # book the new slot in between and a refusal leaves the booking as it was.
+    appointment_time = request.form.get('appointment_time')
+    try:
+        appt_dt = datetime.fromisoformat(appointment_time)
+    except Exception:
+        return "Invalid datetime format", 400
+
+    # Same rules and hold check as a new booking
+    reason = RULES.evaluate([appt_dt])[0]
+    if reason is not None:
+        return REASON_MESSAGES[reason], 400
+    hold_id = request.form.get('hold_id')
+
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    found = find_appointment(c, appointment_id)
+    if found is None:
+        conn.rollback()
+        conn.close()
+        return "Appointment not found", 404
+    name, old_time, details = found
+    old_dt = datetime.fromisoformat(old_time)
+    # Moving within a slot keeps its place. With the in-memory store on, it
+    # decides whether the new slot has room, as it does for new bookings.
+    # Holds are counted under its lock or in this write transaction, as
+    # place_hold() counts bookings.
+    store = slot_store()
+    moved = RULES.slot_key(old_dt) != RULES.slot_key(appt_dt)
+    if moved:
+        if store and not store.take(RULES.slot_key(appt_dt), lambda: held_by_others(appt_dt, hold_id)):
+            conn.rollback()
+            conn.close()
+            return refusal_message(appt_dt, hold_id), 400
+        if not reserve_slot(c, appt_dt, held_by_others(appt_dt, hold_id)):
+            if store:
+                store.release(RULES.slot_key(appt_dt))
+            conn.rollback()
+            conn.close()
+            return refusal_message(appt_dt, hold_id), 400
+        free_slot(c, old_dt)
+    # Within a month the row is updated in place; a move to another month
+    # goes to that month's partition and keeps its id
+    if partition_name(appt_dt) == name:
+        c.execute(f"UPDATE {name} SET appointment_time = ? WHERE id = ?", (appointment_time, appointment_id))
+    else:
+        c.execute(f"DELETE FROM {name} WHERE id = ?", (appointment_id,))
+        move_appointment(c, appointment_id, appointment_time, details)
+    # Replicas see a move as a delete and an insert of the same id
+    c.execute("INSERT INTO changes (op, appointment_id, appointment_time) VALUES ('delete', ?, ?)",
+              (appointment_id, old_time))
+    first_seq = c.lastrowid
+    note_local_change(first_seq)
+    c.execute("INSERT INTO changes (op, appointment_id, appointment_time) VALUES ('insert', ?, ?)",
+              (appointment_id, appointment_time))
+    conn.commit()
+    conn.close()
+    if store and moved:
+        store.release(RULES.slot_key(old_dt))
+    note_local_change(c.lastrowid)
+    patch_snapshot(bump_generation(), (first_seq, c.lastrowid), added=(appt_dt,), removed=(old_dt,))
+    publish_slot_event("cancel", old_dt)
+    publish_slot_event("book", appt_dt)
+    if hold_id:
+        release_hold(hold_id)
+    return jsonify({"status": "success", "id": appointment_id, "appointment_time": appt_dt.isoformat()})
+
+def book_in_database(appt_dt, appointment_time, details, hold_id=None):
+    # Book in SQLite: the slot is reserved in the same transaction as the
+    # insert, leaving room for holds other than hold_id. The write lock is
+    # taken before the holds are counted, so place_hold() cannot add one in
+    # between. Returns the booking's change feed row, or False if the slot
+    # is full.
+    conn = sqlite3.connect(DATABASE)
+    c = conn.cursor()
+    c.execute("BEGIN IMMEDIATE")
+    if not reserve_slot(c, appt_dt, held_by_others(appt_dt, hold_id)):
+        conn.rollback()
+        conn.close()
+        return False
+
+    # Insert the appointment into the database.
+    appointment_id = insert_appointment(c, appointment_time, details)
+    c.execute("INSERT INTO changes (op, appointment_id, appointment_time) VALUES ('insert', ?, ?)",
+              (appointment_id, appointment_time))
+    conn.commit()
+    conn.close()
+    note_local_change(c.lastrowid)
+    return c.lastrowid
 
 @app.route('/', methods=['GET', 'POST'])
+@compressed
+@idempotent
 def schedule():
     if request.method == 'POST':
         appointment_time = request.form.get('appointment_time')
@@ -60,34 +1565,38 @@ def schedule():
         except Exception:
             return "Invalid datetime format", 400
 
-        # Check if date is in the past
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        if appt_dt.date() < today.date():
-            return "Cannot book appointments for past dates", 400
-            
-        # Check if date is a Sunday
-        if appt_dt.weekday() == 6:  # Sunday is 6 in Python's weekday()
-            return "Cannot book appointments on Sundays", 400
+        # Check the date and business-hours rules (capacity is enforced below)
+        reason = RULES.evaluate([appt_dt])[0]
+        if reason is not None:
+            return REASON_MESSAGES[reason], 400
             
-        # Check the booking constraint: no overlapping appointments in the same one-hour slot.
-        conn = sqlite3.connect(DATABASE)
-        c = conn.cursor()
-        c.execute("SELECT appointment_time FROM appointments")
-        existing = c.fetchall()
-        for (existing_time_str,) in existing:
-            existing_time = datetime.fromisoformat(existing_time_str)
-            if (appt_dt.year == existing_time.year and
-                appt_dt.month == existing_time.month and
-                appt_dt.day == existing_time.day and
-                appt_dt.hour == existing_time.hour):
-                conn.close()
-                return "Time slot already booked", 400
-
-        # Insert the appointment into the database.
-        c.execute("INSERT INTO appointments (appointment_time, details) VALUES (?, ?)",
-                  (appointment_time, details))
-        conn.commit()
-        conn.close()
+        # Check the booking constraint: at most SLOT_CAPACITY appointments per
+        # slot, less other customers' holds, in the in-memory store when it is
+        # on and in SQLite otherwise.
+        hold_id = request.form.get('hold_id')
+        store = slot_store()
+        if store:
+            try:
+                booked = store.book(RULES.slot_key(appt_dt), appointment_time, details,
+                                    lambda: held_by_others(appt_dt, hold_id))
+            except JournalError:
+                # The booking was undone, but a snapshot loaded while it was
+                # in the journal may still show it
+                discard_snapshot()
+                bump_generation()
+                return "Booking could not be saved, please try again", 503
+        else:
+            booked = book_in_database(appt_dt, appointment_time, details, hold_id)
+        if not booked:
+            return refusal_message(appt_dt, hold_id), 400
+        # The store returns the booking's journal record, SQLite its feed row
+        if store:
+            patch_snapshot(bump_generation(), lsn=booked, added=(appt_dt,))
+        else:
+            patch_snapshot(bump_generation(), (booked,), added=(appt_dt,))
+        publish_slot_event("book", appt_dt)
+        if hold_id:
+            release_hold(hold_id)
         return redirect(url_for('schedule'))
 
     # Get booked slots for the UI (with cache-busting timestamp)
@@ -204,6 +1713,30 @@ def schedule():
                 background-color: #e3f2fd;
                 font-weight: bold;
             }}
+            .date-card.other-month,
+            .date-card.other-month:hover {{
+                opacity: 0.5;
+                background-color: #f8f8f8;
+            }}
+            .date-card.unavailable,
+            .date-card.unavailable:hover {{
+                opacity: 0.5;
+                background-color: #f0f0f0;
+                cursor: not-allowed;
+            }}
+            .date-card.sunday,
+            .date-card.sunday:hover {{
+                background-color: #ffe5e5;
+                color: #999;
+            }}
+            .date-card.today,
+            .date-card.today:hover {{
+                background-color: #d4edda;
+                color: #333;
+                border-color: #28a745;
+                border-width: 2px;
+                font-weight: bold;
+            }}
             .date-day {{
                 font-size: 16px;
                 font-weight: 600;
@@ -366,6 +1899,8 @@ def schedule():
                 <div class="time-slots" id="timeSlots"></div>
                 
                 <input type="hidden" id="appointment_time" name="appointment_time">
+                <input type="hidden" id="hold_id" name="hold_id">
+                <input type="hidden" id="idempotency_key" name="idempotency_key">
                 
                 <h2>3. Add Delivery Notes (Optional)</h2>
                 <textarea id="details" name="details" placeholder="e.g. Notes for driver, feedback or product suggestions..." required></textarea>
@@ -382,9 +1917,17 @@ def schedule():
         </div>
 
         <script>
-            // Store the booked slots from the server
+            // Store the booked slots from the server, for the list of bookings.
+            // Which dates and time slots can be picked is the server's call:
+            // the page shows /api/calendar for the month in view and
+            // /api/ui-state for the selected date.
             const bookedSlots = {formatted_slots};
-            const bookedDatesMap = new Map();
+            // Tooltips for date cards the server says cannot be picked
+            const dateTitles = {{
+                past: 'Appointments must be booked at least one day in advance',
+                sunday: 'Sundays are not available for appointments'
+            }};
+            let currentHoldId = null;
             
             // Current view state
             let currentViewMonth = new Date().getMonth();
@@ -393,17 +1936,18 @@ def schedule():
             const today = new Date();
             today.setHours(0, 0, 0, 0);
             
-            // Parse booked slots into a map for faster lookup
-            bookedSlots.forEach(slot => {{
-                const date = new Date(slot);
-                const dateStr = date.toISOString().split('T')[0];
-                const hour = date.getHours();
-                
-                if (!bookedDatesMap.has(dateStr)) {{
-                    bookedDatesMap.set(dateStr, new Set());
-                }}
-                bookedDatesMap.get(dateStr).add(hour);
-            }});
+            // A local date as YYYY-MM-DD
+            function formatDate(date) {{
+                const month = date.getMonth() + 1;
+                const day = date.getDate();
+                return date.getFullYear() + '-' + (month < 10 ? '0' + month : month) + '-' + (day < 10 ? '0' + day : day);
+            }}
+            
+            // Format minutes since midnight as H:MM
+            function formatSlotTime(slotMinute) {{
+                const minutes = slotMinute % 60;
+                return Math.floor(slotMinute / 60) + ':' + (minutes < 10 ? '0' + minutes : minutes);
+            }}
             
             // Update the month display
             function updateMonthDisplay() {{
@@ -420,109 +1964,150 @@ def schedule():
                 document.getElementById('prevMonth').disabled = prevMonthDate < currentMonthStart;
             }}
             
-            // Set up date selector
+            // Add or remove a class only if that changes the element
+            function setClass(element, name, on) {{
+                if (element.classList.contains(name) !== on) {{
+                    element.classList.toggle(name, on);
+                }}
+            }}
+            
+            // Set a property only if that changes the element
+            function setProperty(element, name, value) {{
+                if (element[name] !== value) {{
+                    element[name] = value;
+                }}
+            }}
+            
+            // Select a date card, deselecting only the one selected before
+            let selectedDateCard = null;
+            function selectDateCard(dateCard) {{
+                if (selectedDateCard && selectedDateCard !== dateCard) {{
+                    setClass(selectedDateCard, 'selected', false);
+                }}
+                selectedDateCard = dateCard;
+                setClass(dateCard, 'selected', true);
+                selectedDateStr = dateCard.dataset.date;
+                updateTimeSlots(selectedDateStr);
+            }}
+            
+            // Page state of every date of a month (YYYY-MM), fetched from
+            // /api/calendar once per page load. Whether a date can be booked
+            // only changes at midnight.
+            const monthStates = new Map();
+            function fetchMonthStates(date) {{
+                const month = formatDate(date).slice(0, 7);
+                if (!monthStates.has(month)) {{
+                    monthStates.set(month, fetch('/api/calendar?month=' + month)
+                        .then(response => response.ok ? response.json() : Promise.reject(response))
+                        .catch(error => {{
+                            monthStates.delete(month);
+                            throw error;
+                        }}));
+                }}
+                return monthStates.get(month);
+            }}
+            
+            // Set up date selector. The 42 cards (6 weeks) are created once and
+            // reused for every month; a month change only rewrites the cards
+            // whose date, text or state differ. The grid can show days of the
+            // months either side, so their states are fetched too. A month
+            // whose states arrive after the next one was chosen is not shown.
+            const monthAbbreviations = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
+                                        'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'];
+            const dateCards = [];
+            let dateSelectorRequest = 0;
             function setupDateSelector() {{
                 const dateSelector = document.getElementById('dateSelector');
-                dateSelector.innerHTML = ''; // Clear existing calendar
+                if (dateCards.length === 0) {{
+                    for (let i = 0; i < 42; i++) {{
+                        const dateCard = document.createElement('div');
+                        dateCard.className = 'date-card';
+                        const dayDiv = document.createElement('div');
+                        dayDiv.className = 'date-day';
+                        const monthDiv = document.createElement('div');
+                        monthDiv.className = 'date-month';
+                        dateCard.appendChild(dayDiv);
+                        dateCard.appendChild(monthDiv);
+                        dateCards.push(dateCard);
+                        dateSelector.appendChild(dateCard);
+                    }}
+                }}
                 
                 // Calculate the first day of the month grid view
                 const firstDayOfMonth = new Date(currentViewYear, currentViewMonth, 1);
                 const startDate = new Date(firstDayOfMonth);
                 startDate.setDate(1 - startDate.getDay()); // Go back to the previous Sunday
                 
+                const endDate = new Date(startDate);
+                endDate.setDate(startDate.getDate() + dateCards.length - 1);
+                
                 // Update the month display
                 updateMonthDisplay();
                 
-                // Generate a calendar grid (6 weeks = 42 days)
-                for (let i = 0; i < 42; i++) {{
-                    const date = new Date(startDate);
-                    date.setDate(startDate.getDate() + i);
-                    
-                    const dateStr = date.toISOString().split('T')[0];
-                    const dayNum = date.getDate();
-                    const month = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                                 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'][date.getMonth()];
-                    
-                    // Check if this date is from the current view month
-                    const isCurrentViewMonth = date.getMonth() === currentViewMonth && 
-                                               date.getFullYear() === currentViewYear;
-                    const isPastDate = date < today;
-                    const isSunday = date.getDay() === 0; // Sunday is day 0
-                    const isToday = dateStr === today.toISOString().split('T')[0];
-                    
-                    const dateCard = document.createElement('div');
-                    dateCard.className = 'date-card';
-                    
-                    // Style dates appropriately
-                    if (!isCurrentViewMonth) {{
-                        dateCard.style.opacity = '0.5';
-                        dateCard.style.backgroundColor = '#f8f8f8';
-                    }}
-                    
-                    if (isPastDate || isSunday || isToday) {{
-                        dateCard.style.opacity = '0.5';
-                        dateCard.style.backgroundColor = '#f0f0f0';
-                        dateCard.style.cursor = 'not-allowed';
-                    }}
-                    
-                    // Add special styling for Sundays
-                    if (isSunday) {{
-                        dateCard.style.backgroundColor = '#ffe5e5';
-                        dateCard.style.color = '#999';
-                        dateCard.title = 'Sundays are not available for appointments';
-                    }}
-                    
-                    // Highlight today's date with light green background
-                    if (isToday) {{
-                        dateCard.style.backgroundColor = '#d4edda'; // Light green
-                        dateCard.style.color = '#333';
-                        dateCard.style.borderColor = '#28a745'; // Darker green border
-                        dateCard.style.borderWidth = '2px';
-                        dateCard.style.fontWeight = 'bold';
-                        dateCard.title = 'Appointments must be booked at least one day in advance';
-                    }}
-                    
-                    dateCard.dataset.date = dateStr;
-                    
-                    const dayDiv = document.createElement('div');
-                    dayDiv.className = 'date-day';
-                    dayDiv.textContent = dayNum;
-                    
-                    const monthDiv = document.createElement('div');
-                    monthDiv.className = 'date-month';
-                    monthDiv.textContent = month;
-                    
-                    dateCard.appendChild(dayDiv);
-                    dateCard.appendChild(monthDiv);
-                    
-                    // Only add click handler for future dates (not today) that are not Sundays
-                    if (!isPastDate && !isSunday && !isToday) {{
-                        dateCard.addEventListener('click', () => {{
-                            // Deselect all dates
-                            document.querySelectorAll('.date-card').forEach(card => {{
-                                card.classList.remove('selected');
-                            }});
+                const request = ++dateSelectorRequest;
+                return Promise.all([startDate, firstDayOfMonth, endDate].map(fetchMonthStates))
+                    .then(months => {{
+                        if (request !== dateSelectorRequest) {{
+                            return;
+                        }}
+                        const dateStates = Object.assign({{}}, ...months);
+                        const todayStr = formatDate(today);
+                        dateCards.forEach((dateCard, i) => {{
+                            const date = new Date(startDate);
+                            date.setDate(startDate.getDate() + i);
+                            
+                            const dateStr = formatDate(date);
+                            const state = dateStates[dateStr];
+                            
+                            // Check if this date is from the current view month
+                            const isCurrentViewMonth = date.getMonth() === currentViewMonth && 
+                                                       date.getFullYear() === currentViewYear;
+                            
+                            if (dateCard.dataset.date !== dateStr) {{
+                                dateCard.dataset.date = dateStr;
+                                setProperty(dateCard.firstChild, 'textContent', String(date.getDate()));
+                                setProperty(dateCard.lastChild, 'textContent', monthAbbreviations[date.getMonth()]);
+                            }}
                             
-                            // Select this date
-                            dateCard.classList.add('selected');
-                            selectedDateStr = dateStr;
+                            // Only dates the server calls selectable can be clicked
+                            setClass(dateCard, 'other-month', !isCurrentViewMonth);
+                            setClass(dateCard, 'unavailable', !state.selectable);
+                            setClass(dateCard, 'sunday', state.reason === 'sunday');
+                            setClass(dateCard, 'today', dateStr === todayStr);
+                            setProperty(dateCard, 'title', dateTitles[state.reason] || '');
                             
-                            // Update time slots
-                            updateTimeSlots(dateStr);
+                            // Keep the selected date selected if it's visible in this month
+                            if (state.selectable && dateStr === selectedDateStr) {{
+                                selectDateCard(dateCard);
+                            }} else if (dateCard === selectedDateCard) {{
+                                setClass(dateCard, 'selected', false);
+                                selectedDateCard = null;
+                            }}
                         }});
-                    }}
-                    
-                    dateSelector.appendChild(dateCard);
-                    
-                    // Select the previously selected date if it's visible in this month
-                    // (not if it's a Sunday or today)
-                    if ((!isSunday) && (!isToday) && (selectedDateStr && dateStr === selectedDateStr)) {{
-                        dateCard.classList.add('selected');
-                        updateTimeSlots(dateStr);
+                    }});
+            }}
+            
+            // Select the first date in view that can be booked, unless a date
+            // is selected already
+            function selectFirstBookableDate() {{
+                if (!selectedDateCard) {{
+                    const dateCard = dateCards.find(card => !card.classList.contains('unavailable'));
+                    if (dateCard) {{
+                        selectDateCard(dateCard);
                     }}
                 }}
             }}
             
+            // One listener for every date card
+            function setupDateClicks() {{
+                document.getElementById('dateSelector').addEventListener('click', event => {{
+                    const dateCard = event.target.closest('.date-card');
+                    if (dateCard && !dateCard.classList.contains('unavailable')) {{
+                        selectDateCard(dateCard);
+                    }}
+                }});
+            }}
+            
             // Set up navigation buttons
             function setupNavigation() {{
                 // Previous month button
@@ -552,46 +2137,192 @@ def schedule():
                 }});
             }}
             
-            // Update time slots based on selected date
-            function updateTimeSlots(dateStr) {{
+            // The slot this page has selected is shown as selected, not greyed
+            // out by the page's own hold on it
+            function isSelectedSlot(dateStr, time) {{
+                return document.getElementById('appointment_time').value.startsWith(dateStr + 'T' + time);
+            }}
+            
+            // Bring one time slot in line with the server's state for it
+            function renderTimeSlot(timeSlot, slotState) {{
+                const selected = isSelectedSlot(timeSlot.dataset.date, timeSlot.dataset.time);
+                setClass(timeSlot, 'selected', selected);
+                setClass(timeSlot, 'disabled', !selected && !slotState.enabled);
+                if (selected) {{
+                    selectedTimeSlot = timeSlot;
+                }}
+            }}
+            
+            // Show the time slots of a date as /api/ui-state describes them. The
+            // slot nodes are created once; another date only relabels them and
+            // touches the ones whose state changes.
+            const timeSlotNodes = [];
+            let selectedTimeSlot = null;
+            function renderTimeSlots(dateStr, slotStates) {{
                 const timeSlots = document.getElementById('timeSlots');
-                timeSlots.innerHTML = '';
-                
-                // Business hours: 8:00 AM to 8:00 PM
-                for (let hour = 8; hour <= 20; hour++) {{
+                while (timeSlotNodes.length < slotStates.length) {{
                     const timeSlot = document.createElement('div');
-                    const isBooked = bookedDatesMap.has(dateStr) && bookedDatesMap.get(dateStr).has(hour);
-                    
-                    timeSlot.className = isBooked ? 'time-slot disabled' : 'time-slot';
-                    timeSlot.textContent = hour + ':00';
-                    timeSlot.dataset.hour = hour;
+                    timeSlot.className = 'time-slot';
+                    timeSlotNodes.push(timeSlot);
+                    timeSlots.appendChild(timeSlot);
+                }}
+                if (selectedTimeSlot && selectedTimeSlot.dataset.date !== dateStr) {{
+                    setClass(selectedTimeSlot, 'selected', false);
+                    selectedTimeSlot = null;
+                }}
+                timeSlotNodes.forEach((timeSlot, i) => {{
+                    setClass(timeSlot, 'hidden', i >= slotStates.length);
+                    if (i >= slotStates.length) {{
+                        return;
+                    }}
                     timeSlot.dataset.date = dateStr;
+                    if (timeSlot.dataset.time !== slotStates[i].time) {{
+                        timeSlot.dataset.time = slotStates[i].time;
+                        timeSlot.textContent = slotStates[i].time.replace(/^0/, '');
+                    }}
+                    renderTimeSlot(timeSlot, slotStates[i]);
+                }});
+            }}
+            
+            // Fetch the page state of a date and show its time slots. An answer
+            // that arrives after another date was chosen is dropped.
+            let timeSlotsRequest = 0;
+            function updateTimeSlots(dateStr) {{
+                const request = ++timeSlotsRequest;
+                return fetch('/api/ui-state?date=' + dateStr)
+                    .then(response => response.json())
+                    .then(state => {{
+                        if (request === timeSlotsRequest && dateStr === selectedDateStr) {{
+                            renderTimeSlots(dateStr, state.slots);
+                        }}
+                    }});
+            }}
+            
+            // One listener for every time slot: a disabled slot can free up
+            // while the page is open, so the check happens on click
+            function setupTimeSlotClicks() {{
+                document.getElementById('timeSlots').addEventListener('click', event => {{
+                    const timeSlot = event.target.closest('.time-slot');
+                    if (!timeSlot || timeSlot.classList.contains('disabled')) {{
+                        return;
+                    }}
                     
-                    if (!isBooked) {{
-                        timeSlot.addEventListener('click', () => {{
-                            // Deselect all time slots
-                            document.querySelectorAll('.time-slot').forEach(slot => {{
-                                slot.classList.remove('selected');
-                            }});
-                            
-                            // Select this time slot
-                            timeSlot.classList.add('selected');
-                            
-                            // Update hidden input with selected date and time
-                            const selectedDateTime = dateStr + 'T' + (hour < 10 ? '0' + hour : hour) + ':00:00';
-                            document.getElementById('appointment_time').value = selectedDateTime;
-                            
-                            document.getElementById('bookingMessage').textContent = 
-                                'You are booking a delivery for ' + 
-                                new Date(selectedDateTime).toLocaleString() + '.';
-                            document.getElementById('bookingMessage').classList.remove('hidden');
-                        }});
+                    // Move the selection to this time slot
+                    if (selectedTimeSlot && selectedTimeSlot !== timeSlot) {{
+                        setClass(selectedTimeSlot, 'selected', false);
                     }}
+                    selectedTimeSlot = timeSlot;
+                    setClass(timeSlot, 'selected', true);
                     
-                    timeSlots.appendChild(timeSlot);
+                    // Update hidden input with selected date and time
+                    const selectedDateTime = timeSlot.dataset.date + 'T' + timeSlot.dataset.time + ':00';
+                    document.getElementById('appointment_time').value = selectedDateTime;
+                    newIdempotencyKey();
+                    
+                    document.getElementById('bookingMessage').textContent = 
+                        'You are booking a delivery for ' + 
+                        new Date(selectedDateTime).toLocaleString() + '.';
+                    document.getElementById('bookingMessage').className = 'message info';
+                    
+                    holdTimeSlot(selectedDateTime);
+                }});
+            }}
+            
+            // Re-fetch the shown date's time slots after an occupancy change
+            // on that date, or on every date when slot is null
+            function refreshTimeSlots(slot) {{
+                if (selectedDateStr && (!slot || slot.split('T')[0] === selectedDateStr)) {{
+                    updateTimeSlots(selectedDateStr);
                 }}
             }}
             
+            // Reload the booked slots from the server
+            function fetchSlots() {{
+                return fetch('/api/booked-slots?' + new Date().getTime())
+                    .then(response => response.json())
+                    .then(booked => {{
+                        bookedSlots.length = 0;
+                        booked.forEach(slot => bookedSlots.push(slot));
+                    }});
+            }}
+            
+            // Apply occupancy changes pushed by the server
+            function listenForSlotEvents() {{
+                if (!window.EventSource) {{
+                    return;
+                }}
+                const source = new EventSource('/api/slot-events');
+                source.onmessage = message => {{
+                    const event = JSON.parse(message.data);
+                    if (event.op === 'book') {{
+                        bookedSlots.push(event.slot);
+                    }} else if (event.op === 'cancel') {{
+                        const index = bookedSlots.indexOf(event.slot);
+                        if (index !== -1) {{
+                            bookedSlots.splice(index, 1);
+                        }}
+                    }} else if (event.op === 'clear') {{
+                        bookedSlots.length = 0;
+                    }} else if (event.op === 'resync') {{
+                        fetchSlots().then(() => {{
+                            refreshTimeSlots(null);
+                            displayBookedSlots();
+                        }});
+                        return;
+                    }}
+                    refreshTimeSlots(event.slot);
+                    if (event.op === 'book' || event.op === 'cancel' || event.op === 'clear') {{
+                        displayBookedSlots();
+                    }}
+                }};
+            }}
+            
+            // Release the slot this page is holding, if any
+            function releaseCurrentHold() {{
+                if (currentHoldId) {{
+                    fetch('/api/holds/' + currentHoldId, {{ method: 'DELETE' }});
+                    currentHoldId = null;
+                    document.getElementById('hold_id').value = '';
+                }}
+            }}
+            
+            // Hold the selected slot so nobody else can book it while the notes are typed
+            function holdTimeSlot(selectedDateTime) {{
+                releaseCurrentHold();
+                fetch('/api/holds', {{
+                    method: 'POST',
+                    body: new URLSearchParams({{ appointment_time: selectedDateTime }})
+                }})
+                    .then(response => response.ok ? response.json() : Promise.reject(response))
+                    .then(hold => {{
+                        // Another slot was picked while this request was in flight
+                        if (document.getElementById('appointment_time').value !== selectedDateTime) {{
+                            fetch('/api/holds/' + hold.hold_id, {{ method: 'DELETE' }});
+                            return;
+                        }}
+                        currentHoldId = hold.hold_id;
+                        document.getElementById('hold_id').value = hold.hold_id;
+                        document.getElementById('bookingMessage').textContent += 
+                            ' The slot is held for you until ' + 
+                            new Date(hold.expires_at).toLocaleTimeString() + '.';
+                    }})
+                    .catch(() => {{
+                        if (document.getElementById('appointment_time').value !== selectedDateTime) {{
+                            return;
+                        }}
+                        // Someone else has just taken or held this slot
+                        document.getElementById('appointment_time').value = '';
+                        if (selectedTimeSlot) {{
+                            setClass(selectedTimeSlot, 'selected', false);
+                            setClass(selectedTimeSlot, 'disabled', true);
+                            selectedTimeSlot = null;
+                        }}
+                        const bookingMessage = document.getElementById('bookingMessage');
+                        bookingMessage.textContent = 'Sorry, that time slot has just been taken. Please choose another.';
+                        bookingMessage.className = 'message error';
+                    }});
+            }}
+            
             // Display already booked slots
             function displayBookedSlots() {{
                 const slotsList = document.getElementById('slots-list');
@@ -610,7 +2341,7 @@ def schedule():
                             bookingsByDate[dateStr] = [];
                         }}
                         
-                        bookingsByDate[dateStr].push(date.getHours() + ':00');
+                        bookingsByDate[dateStr].push(formatSlotTime(date.getHours() * 60 + date.getMinutes()));
                     }});
                     
                     // Display bookings by date
@@ -632,6 +2363,13 @@ def schedule():
                 }}
             }}
             
+            // One key per chosen slot, so a resubmitted form replays the first answer
+            function newIdempotencyKey() {{
+                document.getElementById('idempotency_key').value = window.crypto && crypto.randomUUID ?
+                    crypto.randomUUID() : Date.now() + '-' + Math.random().toString(36).slice(2);
+            }}
+            newIdempotencyKey();
+            
             // Form submission validation
             document.getElementById('appointmentForm').addEventListener('submit', function(e) {{
                 const appointmentTime = document.getElementById('appointment_time').value;
@@ -644,52 +2382,21 @@ def schedule():
             
             // Initialize the appointment scheduler
             window.addEventListener('DOMContentLoaded', () => {{
-                // Refresh data each time page loads to prevent caching issues
-                fetch('/api/booked-slots?' + new Date().getTime())
-                    .then(response => response.json())
-                    .then(data => {{
-                        // Update booked slots with fresh data
-                        bookedSlots.length = 0;
-                        data.forEach(slot => bookedSlots.push(slot));
-                        
-                        // Now initialize with fresh data
-                        setupNavigation();  // Set up month navigation buttons
-                        setupDateSelector(); // Set up initial calendar
-                        displayBookedSlots(); // Display list of booked slots
-                        
-                        // Initialize the current month display
-                        updateMonthDisplay();
-                    }})
-                    .catch(error => {{
-                        console.error('Error fetching booked slots:', error);
-                        
-                        // Fall back to default initialization
-                        setupNavigation();
-                        setupDateSelector();
-                        displayBookedSlots();
-                        updateMonthDisplay();
-                    }});
+                // Listen for other customers' bookings, then refresh data
+                // each time page loads to prevent caching issues
+                listenForSlotEvents();
+                setupNavigation();  // Set up month navigation buttons
+                setupDateClicks();
+                setupTimeSlotClicks();
+                fetchSlots()
+                    .catch(error => console.error('Error fetching booked slots:', error))
+                    .then(displayBookedSlots); // Display list of booked slots
                 
-                // Select tomorrow as the default date since today is not available
-                const tomorrow = new Date(today);
-                tomorrow.setDate(tomorrow.getDate() + 1);
-                // Skip Sunday
-                if (tomorrow.getDay() === 0) {{
-                    tomorrow.setDate(tomorrow.getDate() + 1);
-                }}
-                selectedDateStr = tomorrow.toISOString().split('T')[0];
-                
-                // Find and select tomorrow's date card
-                setTimeout(() => {{
-                    const tomorrowCard = document.querySelector('.date-card[data-date="' + selectedDateStr + '"]');
-                    if (tomorrowCard && !tomorrowCard.classList.contains('selected')) {{
-                        document.querySelectorAll('.date-card').forEach(card => {{
-                            card.classList.remove('selected');
-                        }});
-                        tomorrowCard.classList.add('selected');
-                        updateTimeSlots(selectedDateStr);
-                    }}
-                }}, 100);
+                // Set up the calendar for this month and select the first
+                // date that can be booked, since today is not available
+                setupDateSelector()
+                    .then(selectFirstBookableDate)
+                    .catch(error => console.error('Error fetching the calendar:', error));
             }});
         </script>
     </body>
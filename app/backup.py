@@ -0,0 +1,95 @@
+# app/backup.py
+import argparse
+import os
+import sqlite3
+import time
+from partitions import list_partitions
+
+PAGES_PER_STEP = 100
+STEP_PAUSE_SECONDS = 0.01
+MAX_RESTARTS = 20
+
+class BackupError(Exception):
+    """
+    Raised when a finished backup fails verification.
+    """
+
+class _TooManyRestarts(Exception):
+    pass
+
+def backup_database(source, target, pages=PAGES_PER_STEP, pause=STEP_PAUSE_SECONDS, progress=None):
+    # Copy the live database at `source` to `target` with SQLite's online
+    # backup API, `pages` pages at a time. The source is only read-locked
+    # during a step and the pause between steps lets bookings commit. A
+    # commit from another connection makes SQLite restart the copy; if that
+    # keeps happening the rest is copied in one step so the backup finishes.
+    # The copy is written next to `target`, checked, and then renamed into
+    # place, so `target` only ever holds a complete, consistent snapshot.
+    # progress(remaining, total) is called after every step. Returns a
+    # summary of the verified copy.
+    partial = target + '.partial'
+    if os.path.exists(partial):
+        os.remove(partial)
+    started = time.perf_counter()
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(partial)
+    restarts = 0
+    last_remaining = None
+
+    def step(status, remaining, total):
+        nonlocal restarts, last_remaining
+        if progress:
+            progress(remaining, total)
+        if last_remaining is not None and remaining > last_remaining:
+            restarts += 1
+            if restarts > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        last_remaining = remaining
+        time.sleep(pause)
+
+    try:
+        try:
+            src.backup(dst, pages=pages, progress=step)
+        except _TooManyRestarts:
+            src.backup(dst)
+            if progress:
+                progress(0, dst.execute("PRAGMA page_count").fetchone()[0])
+        summary = verify_backup(dst)
+    finally:
+        src.close()
+        dst.close()
+    os.replace(partial, target)
+    summary["restarts"] = restarts
+    summary["seconds"] = round(time.perf_counter() - started, 3)
+    return summary
+
+def verify_backup(conn):
+    # Check a backup copy for corruption and return its size and row count
+    # across every monthly partition.
+    result = conn.execute("PRAGMA integrity_check").fetchone()[0]
+    if result != 'ok':
+        raise BackupError(f"Backup failed integrity check: {result}")
+    appointments = sum(conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0]
+                       for name in list_partitions(conn))
+    return {
+        "pages": conn.execute("PRAGMA page_count").fetchone()[0],
+        "appointments": appointments
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Back up the appointments database while the app is running.")
+    parser.add_argument('--database', default='appointments.db')
+    parser.add_argument('target', help="file to write the backup to")
+    parser.add_argument('--pages', type=int, default=PAGES_PER_STEP, help="pages copied per step")
+    parser.add_argument('--pause', type=float, default=STEP_PAUSE_SECONDS, help="seconds to wait between steps")
+    args = parser.parse_args()
+
+    def report(remaining, total):
+        print(f"\r{total - remaining}/{total} pages", end='', flush=True)
+
+    summary = backup_database(args.database, args.target, args.pages, args.pause, report)
+    print(f"\nBacked up {summary['appointments']} appointments ({summary['pages']} pages) "
+          f"to {args.target} in {summary['seconds']}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+# app/generation.py
+import fcntl
+import mmap
+import os
+import struct
+import threading
+
+class GenerationCounter:
+    """
+    Data generation number shared by every process serving the same database.
+    Writers bump it after each commit and each worker compares it with the
+    generation its caches were built from. It lives in a small memory-mapped
+    file next to the database, so checking it is a memory read, not a query.
+    """
+    def __init__(self, path):
+        self.path = path
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self._fd).st_size < 8:
+            os.ftruncate(self._fd, 8)
+        self._map = mmap.mmap(self._fd, 8)
+        # lockf locks exclude other processes; the thread lock excludes the
+        # other threads of this one
+        self._lock = threading.Lock()
+
+    def value(self):
+        # Current generation.
+        return struct.unpack_from('Q', self._map)[0]
+
+    def bump(self):
+        # Advance the generation and return the new value.
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                generation = self.value() + 1
+                struct.pack_into('Q', self._map, 0, generation)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        return generation
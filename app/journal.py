@@ -0,0 +1,234 @@
+# app/journal.py
+import json
+import os
+import threading
+import time
+
+class JournalError(Exception):
+    """
+    Raised when a booking could not be made durable in the journal.
+    """
+
+class SlotJournal:
+    """
+    In-memory slot occupancy for a single serving process, backed by an
+    append-only journal file. A booking is a dict lookup and an append; a
+    background thread fsyncs the journal for every booking that arrived since
+    its last fsync, so concurrent bookings share one disk flush. Each record
+    has a log sequence number (lsn). checkpoint() hands the journalled
+    bookings to the database together with the last lsn they reach, then
+    empties the journal; replay skips records the database already has, so a
+    crash between the two is harmless. If a flush or fsync fails, every
+    booking not yet on disk is rolled back and its caller gets a JournalError.
+    """
+    def __init__(self, path, capacity, batch_seconds=0):
+        self.path = path
+        self.capacity = capacity
+        self.batch_seconds = batch_seconds
+        self.counts = {}    # slot key -> places taken
+        self.pending = []   # (lsn, slot key, appointment_time, details) not yet checkpointed
+        self.lsn = 0
+        self._lock = threading.Lock()
+        self._durable = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._synced_lsn = 0
+        self._size = 0          # bytes written to the journal
+        self._synced_size = 0   # bytes of it on disk, up to _synced_lsn
+        self._failed = set()    # rolled back lsns whose callers have not been told yet
+        self.rolled_back = 0
+        self._file = None
+
+    def open(self, counts, checkpointed_lsn):
+        # Start from the database's slot counters, replay journal records
+        # newer than checkpointed_lsn on top of them and start the fsync
+        # thread. A torn record at the end, from a crash mid-write, is cut off.
+        self.counts = dict(counts)
+        self.pending = []
+        self.lsn = checkpointed_lsn
+        good_size = 0
+        if os.path.exists(self.path):
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b'\n'):
+                        break
+                    good_size += len(line)
+                    if record["lsn"] > checkpointed_lsn:
+                        self._apply(record["lsn"], record["slot"], record["appointment_time"], record["details"])
+        self._file = open(self.path, 'ab')
+        self._file.truncate(good_size)
+        self._synced_lsn = self.lsn
+        self._size = self._synced_size = good_size
+        threading.Thread(target=self._sync_loop, daemon=True).start()
+
+    def _apply(self, lsn, key, appointment_time, details):
+        # Count a booking and queue it for the next checkpoint; callers hold
+        # the lock or have not started the store yet.
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.pending.append((lsn, key, appointment_time, details))
+        self.lsn = lsn
+
+    def book(self, key, appointment_time, details, held=None):
+        # Take a place in the slot with this key and journal the booking.
+        # Returns False if the slot is full, and the booking's lsn once it is
+        # on disk. Raises JournalError, with the booking undone, if it could not
+        # be written. held(), if given, returns the places others hold in the
+        # slot; it is called under the store's lock.
+        with self._lock:
+            if self._file is None:
+                raise JournalError("Journal is unavailable")
+            if self._full(key, held):
+                return False
+            lsn = self.lsn + 1
+            record = json.dumps({"lsn": lsn, "slot": key, "appointment_time": appointment_time,
+                                 "details": details}).encode() + b'\n'
+            try:
+                self._file.write(record)
+            except OSError as e:
+                self._roll_back()
+                raise JournalError(f"Journal write failed: {e}")
+            self._size += len(record)
+            self._apply(lsn, key, appointment_time, details)
+            self._wake.set()
+            while self._synced_lsn < lsn and lsn not in self._failed:
+                self._durable.wait()
+            if lsn in self._failed:
+                self._failed.discard(lsn)
+                raise JournalError("Journal write failed, booking rolled back")
+        return lsn
+
+    def _sync_loop(self):
+        # Flush and fsync the journal whenever bookings are waiting. Bookings
+        # that arrive during an fsync share the next one; batch_seconds waits
+        # a little longer to gather more of them.
+        while True:
+            self._wake.wait()
+            if self.batch_seconds:
+                time.sleep(self.batch_seconds)
+            self._wake.clear()
+            with self._lock:
+                target, target_size = self.lsn, self._size
+                if self._synced_lsn >= target or self._file is None:
+                    continue
+                try:
+                    self._file.flush()
+                except OSError:
+                    self._roll_back()
+                    continue
+                fd = self._file.fileno()
+            try:
+                os.fsync(fd)
+            except OSError:
+                failed = True
+            else:
+                failed = False
+            with self._lock:
+                if failed:
+                    # Nothing is left to undo if a checkpoint stored the
+                    # bookings in the meantime
+                    self._roll_back()
+                elif target > self._synced_lsn:
+                    self._synced_lsn, self._synced_size = target, target_size
+                self._durable.notify_all()
+
+    def _roll_back(self):
+        # Undo every booking written since the last successful fsync, since
+        # none of them is known to be on disk, and cut the journal back to
+        # its synced size; callers hold the lock. The bookings leave counts
+        # and pending, so no checkpoint stores them, and book() raises
+        # JournalError for each. If the journal cannot be reopened, the store
+        # refuses bookings from then on.
+        while self.pending and self.pending[-1][0] > self._synced_lsn:
+            lsn, key, _, _ = self.pending.pop()
+            self._uncount(key)
+            self._failed.add(lsn)
+            self.rolled_back += 1
+        try:
+            self._file.close()
+        except OSError:
+            pass
+        try:
+            self._file = open(self.path, 'ab')
+            self._file.truncate(self._synced_size)
+            self._size = self._synced_size
+        except OSError:
+            self._file = None
+        self._durable.notify_all()
+
+    def take(self, key, held=None):
+        # Take a place without journalling it, for a change the caller writes
+        # to the database itself. Returns False if the slot is full; held is
+        # as for book().
+        with self._lock:
+            if self._full(key, held):
+                return False
+            self.counts[key] = self.counts.get(key, 0) + 1
+            return True
+
+    def _full(self, key, held):
+        # Whether bookings, plus places held by others, fill the slot with
+        # this key; callers hold the lock.
+        return self.counts.get(key, 0) + (held() if held else 0) >= self.capacity
+
+    def release(self, key):
+        # Give back a place taken by a booking that has been checkpointed.
+        with self._lock:
+            self._uncount(key)
+
+    def _uncount(self, key):
+        # Give back a place in the slot with this key; callers hold the lock.
+        if self.counts.get(key, 0) > 1:
+            self.counts[key] -= 1
+        else:
+            self.counts.pop(key, None)
+
+    def forget(self, first_key, end_key):
+        # Drop the counters of slots from first_key up to, not including,
+        # end_key, after the database let go of them.
+        with self._lock:
+            for key in [key for key in self.counts if first_key <= key < end_key]:
+                del self.counts[key]
+
+    def locked(self):
+        # The store's lock, for reading the database and pending bookings as
+        # one consistent view: checkpoints and bookings cannot run while it
+        # is held.
+        return self._lock
+
+    def checkpoint(self, write):
+        # Pass pending bookings, as (lsn, appointment_time, details), to
+        # write(bookings, lsn), which must store them and lsn in one
+        # transaction, then empty the journal. Bookings wait while it runs.
+        # Returns the number of bookings written.
+        with self._lock:
+            if not self.pending:
+                return 0
+            bookings = [(lsn, appointment_time, details) for lsn, _, appointment_time, details in self.pending]
+            write(bookings, self.lsn)
+            self._empty()
+            return len(bookings)
+
+    def reset(self, write):
+        # Forget every booking, pending or not. The reset takes the next lsn,
+        # so it is ordered among the bookings; write(lsn) clears the database
+        # and records lsn in the same transaction.
+        with self._lock:
+            write(self.lsn + 1)
+            self.lsn += 1
+            self.counts = {}
+            self._empty()
+
+    def _empty(self):
+        # Truncate the journal once the database holds everything in it;
+        # callers hold the lock. Bookings still waiting for the fsync thread
+        # are durable now too.
+        self.pending = []
+        if self._file is not None:
+            self._file.seek(0)
+            self._file.truncate()
+        self._synced_lsn = self.lsn
+        self._size = self._synced_size = 0
+        self._durable.notify_all()
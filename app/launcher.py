@@ -0,0 +1,86 @@
+# app/launcher.py
+import argparse
+import os
+import signal
+import socket
+import sys
+from werkzeug.serving import make_server
+import app as scheduler
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the appointment scheduler with several worker processes.")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help="number of worker processes (default: one per CPU)")
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8999)
+    parser.add_argument('--database', default=scheduler.DATABASE,
+                        help="SQLite database file shared by the workers")
+    return parser.parse_args(argv)
+
+def listen(host, port):
+    # Bind the listening socket once in the parent so every worker accepts
+    # connections on the same port.
+    family = socket.AF_INET6 if ':' in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(128)
+    sock.set_inheritable(True)
+    return sock
+
+def run_worker(sock, host, port):
+    # Serve requests on the inherited socket until told to stop. Each worker
+    # keeps its own read snapshot and checks the shared generation counter,
+    # so a booking committed by any worker is visible to all of them.
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    server = make_server(host, port, scheduler.app, threaded=True, fd=sock.fileno())
+    try:
+        server.serve_forever()
+    finally:
+        os._exit(0)
+
+def spawn(sock, host, port):
+    # Fork one worker and return its pid.
+    pid = os.fork()
+    if pid == 0:
+        run_worker(sock, host, port)
+    return pid
+
+def main(argv=None):
+    args = parse_args(argv)
+    if scheduler.SLOT_STORE == 'memory' and args.workers != 1:
+        # Each worker would have its own idea of which slots are taken
+        sys.exit("SLOT_STORE=memory needs --workers 1")
+    scheduler.DATABASE = args.database
+    scheduler.setup()  # Initialize the database once, before forking
+    sock = listen(args.host, args.port)
+    workers = {spawn(sock, args.host, args.port) for _ in range(args.workers)}
+    print(f"Serving on http://{args.host}:{args.port} with {args.workers} workers", flush=True)
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in workers:
+            os.kill(pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    # Replace workers that die until asked to stop
+    while workers:
+        try:
+            pid, _ = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        workers.discard(pid)
+        if not stopping:
+            workers.add(spawn(sock, args.host, args.port))
+    sock.close()
+
+if __name__ == '__main__':
+    main()
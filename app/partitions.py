@@ -0,0 +1,44 @@
+# app/partitions.py
+from datetime import date
+
+# Appointments are stored in one table per calendar month, named
+# appointments_YYYY_MM. Ids are allocated per partition starting at
+# month_number << 32, so an id names its partition and a lookup by id goes
+# straight to one table. An appointment rescheduled into another month keeps
+# its id; the app records which partition it moved to.
+PARTITION_GLOB = 'appointments_[0-9][0-9][0-9][0-9]_[0-9][0-9]'
+ID_BITS = 32
+
+def month_number(year, month):
+    # Months since year 0, the partition's position in time.
+    return year * 12 + month - 1
+
+def partition_name(dt):
+    # Table holding appointments in dt's month.
+    return f'appointments_{dt.year:04d}_{dt.month:02d}'
+
+def partition_month(name):
+    # First day of the month a partition table holds.
+    year, month = name.rsplit('_', 2)[1:]
+    return date(int(year), int(month), 1)
+
+def partition_for_id(appointment_id):
+    # Table an appointment id was allocated in.
+    year, month = divmod(appointment_id >> ID_BITS, 12)
+    return f'appointments_{year:04d}_{month + 1:02d}'
+
+def first_id(dt):
+    # Id sequence start for dt's partition; its first row gets first_id + 1.
+    return month_number(dt.year, dt.month) << ID_BITS
+
+def list_partitions(conn, first_day=None, last_day=None):
+    # Names of existing partition tables, oldest first, limited to the months
+    # that overlap first_day..last_day when given.
+    names = [name for (name,) in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name GLOB ? ORDER BY name",
+        (PARTITION_GLOB,))]
+    if first_day is not None:
+        names = [name for name in names if partition_name(first_day) <= name]
+    if last_day is not None:
+        names = [name for name in names if name <= partition_name(last_day)]
+    return names
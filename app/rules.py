@@ -0,0 +1,136 @@
+# app/rules.py
+from datetime import datetime, timedelta
+
+# Reasons a slot cannot be booked, with the message shown to the customer.
+PAST = 'past'
+SUNDAY = 'sunday'
+CLOSED = 'closed'
+FULL = 'full'
+REASON_MESSAGES = {
+    PAST: "Cannot book appointments for today or past dates",
+    SUNDAY: "Cannot book appointments on Sundays",
+    CLOSED: "Cannot book appointments outside business hours",
+    FULL: "Time slot already booked",
+}
+
+class BookingRules:
+    """
+    The booking rules shared by the app, the protocol driver and the DSL:
+    bookings start from tomorrow, never on a Sunday, in slots of slot_minutes
+    starting between first_slot_hour and last_slot_hour inclusive, with at
+    most capacity bookings per slot.
+    """
+    def __init__(self, capacity=1, slot_minutes=60, first_slot_hour=8, last_slot_hour=20):
+        if 60 % slot_minutes != 0:
+            raise ValueError("slot_minutes must divide an hour evenly")
+        self.capacity = capacity
+        self.slot_minutes = slot_minutes
+        self.first_slot_hour = first_slot_hour
+        self.last_slot_hour = last_slot_hour
+
+    @classmethod
+    def from_config(cls, config):
+        # Build the rules from the /api/slot-config payload
+        return cls(config["capacity"], config["slot_minutes"],
+                   config["first_slot_hour"], config["last_slot_hour"])
+
+    def config(self):
+        # The rules as the /api/slot-config payload
+        return {
+            "capacity": self.capacity,
+            "slot_minutes": self.slot_minutes,
+            "first_slot_hour": self.first_slot_hour,
+            "last_slot_hour": self.last_slot_hour
+        }
+
+    def slot_start(self, dt):
+        # Floor a datetime to the start of the slot that contains it.
+        minute_of_day = dt.hour * 60 + dt.minute
+        minute_of_day -= minute_of_day % self.slot_minutes
+        return dt.replace(hour=minute_of_day // 60, minute=minute_of_day % 60, second=0, microsecond=0)
+
+    def slot_key(self, dt):
+        # Key of the slot counter row for a datetime.
+        return self.slot_start(dt).strftime('%Y-%m-%dT%H:%M')
+
+    def slots_per_day(self):
+        # Number of bookable slots in a business day.
+        return (self.last_slot_hour + 1 - self.first_slot_hour) * 60 // self.slot_minutes
+
+    def day_slots(self, day):
+        # Start datetimes of every business-hours slot on a date.
+        start = datetime(day.year, day.month, day.day, self.first_slot_hour)
+        return [start + timedelta(minutes=i * self.slot_minutes) for i in range(self.slots_per_day())]
+
+    def slot_ordinal(self, dt):
+        # Position of dt's slot in the unbroken sequence of bookable slots
+        # (business hours, Monday to Saturday), or None if the slot is not
+        # bookable. Free-slot searches work on these integers instead of
+        # walking the calendar.
+        per_day = self.slots_per_day()
+        days = dt.toordinal() - 1  # 0001-01-01 is a Monday
+        weekday = days % 7
+        index = (dt.hour * 60 + dt.minute - self.first_slot_hour * 60) // self.slot_minutes
+        if weekday == 6 or index < 0 or index >= per_day:
+            return None
+        return (days // 7 * 6 + weekday) * per_day + index
+
+    def first_slot_ordinal_from(self, dt):
+        # Ordinal of the first bookable slot starting at or after dt.
+        per_day = self.slots_per_day()
+        days = dt.toordinal() - 1
+        offset = dt.hour * 3600 + dt.minute * 60 + dt.second - self.first_slot_hour * 3600
+        index = max(0, -(-offset // (self.slot_minutes * 60)))
+        if index >= per_day:
+            days, index = days + 1, 0
+        if days % 7 == 6:
+            days, index = days + 1, 0
+        return (days // 7 * 6 + days % 7) * per_day + index
+
+    def slot_from_ordinal(self, ordinal):
+        # Start datetime of the slot with the given ordinal.
+        day, index = divmod(ordinal, self.slots_per_day())
+        week, weekday = divmod(day, 6)
+        return (datetime.fromordinal(week * 7 + weekday + 1) +
+                timedelta(minutes=self.first_slot_hour * 60 + index * self.slot_minutes))
+
+    def first_bookable_date(self, now=None):
+        # The earliest date that can be booked: tomorrow, or Monday if that is a Sunday.
+        day = (now or datetime.now()).date() + timedelta(days=1)
+        if day.weekday() == 6:
+            day += timedelta(days=1)
+        return day
+
+    def day_reason(self, day, now=None):
+        # Why a whole date cannot be booked, or None if its slots can be.
+        if day <= (now or datetime.now()).date():
+            return PAST
+        if day.weekday() == 6:
+            return SUNDAY
+        return None
+
+    def evaluate(self, candidates, counts=None, now=None):
+        # Evaluate a batch of candidate datetimes against the rules and the
+        # occupancy in counts (slot key -> bookings). Returns one entry per
+        # candidate: None if it can be booked, otherwise the reason. The
+        # date-level rules are decided once per distinct day in the batch, so a
+        # whole month costs one call and a dictionary lookup per slot.
+        now = now or datetime.now()
+        counts = counts or {}
+        first_minute = self.first_slot_hour * 60
+        end_minute = (self.last_slot_hour + 1) * 60
+        day_reasons = {}
+        reasons = []
+        for dt in candidates:
+            day = dt.date()
+            if day not in day_reasons:
+                day_reasons[day] = self.day_reason(day, now)
+            reason = day_reasons[day]
+            if reason is None:
+                minute_of_day = dt.hour * 60 + dt.minute
+                if minute_of_day < first_minute or minute_of_day >= end_minute:
+                    reason = CLOSED
+                elif counts.get(self.slot_key(dt), 0) >= self.capacity:
+                    reason = FULL
+            reasons.append(reason)
+        return reasons
@@ -0,0 +1,142 @@
+# app/snapshot.py
+from bisect import bisect_left, insort
+from collections import namedtuple
+from collections.abc import Mapping
+
+# Booked slots of one calendar month, keyed by 'YYYY-MM', the first seven
+# characters of its slot keys:
+#   slots      - booked datetimes in booking order
+#   counts     - slot key -> number of bookings in that slot
+#   full_slots - sorted ordinals (see BookingRules.slot_ordinal) of slots at capacity
+MonthSlots = namedtuple('MonthSlots', ['slots', 'counts', 'full_slots'])
+EMPTY_MONTH = MonthSlots((), {}, ())
+
+def month_of(key):
+    # Month a slot key belongs to.
+    return key[:7]
+
+def build_month(rules, slots):
+    # Count a month's booked slots and index the full ones.
+    counts = {}
+    full_slots = []
+    for slot in slots:
+        key = rules.slot_key(slot)
+        counts[key] = counts.get(key, 0) + 1
+        if counts[key] == rules.capacity:
+            ordinal = rules.slot_ordinal(slot)
+            if ordinal is not None:
+                full_slots.append(ordinal)
+    full_slots.sort()
+    return MonthSlots(tuple(slots), counts, tuple(full_slots))
+
+def patch_month(rules, month, changes):
+    # A month's booked slots after applying changes, (added, slot) pairs, in
+    # order. Its lists and counts are copied, which is cheap next to
+    # recounting every slot. Raises ValueError if a removed slot is not booked.
+    slots = list(month.slots)
+    counts = dict(month.counts)
+    full_slots = list(month.full_slots)
+    for added, slot in changes:
+        key = rules.slot_key(slot)
+        if added:
+            slots.append(slot)
+            counts[key] = counts.get(key, 0) + 1
+            if counts[key] == rules.capacity:
+                ordinal = rules.slot_ordinal(slot)
+                if ordinal is not None:
+                    insort(full_slots, ordinal)
+            continue
+        slots.remove(slot)
+        if counts[key] == rules.capacity:
+            ordinal = rules.slot_ordinal(slot)
+            if ordinal is not None:
+                del full_slots[bisect_left(full_slots, ordinal)]
+        if counts[key] > 1:
+            counts[key] -= 1
+        else:
+            del counts[key]
+    return MonthSlots(tuple(slots), counts, tuple(full_slots))
+
+class SlotCounts(Mapping):
+    """
+    Read-only slot key -> bookings mapping over a snapshot's months. A lookup
+    goes to the one month the key belongs to.
+    """
+    def __init__(self, months):
+        self._months = months
+
+    def __getitem__(self, key):
+        return self._months.get(month_of(key), EMPTY_MONTH).counts[key]
+
+    def __iter__(self):
+        for month in self._months.values():
+            yield from month.counts
+
+    def __len__(self):
+        return sum(len(month.counts) for month in self._months.values())
+
+class BookedSnapshot:
+    """
+    Immutable view of the booked slots at one data generation and position:
+    the last change feed row (changes.seq) and, with the in-memory store on,
+    the last journal record (lsn) it includes. It is held one month at a
+    time. patched() copies only the months a write touches and shares the
+    rest with the old snapshot, so applying a booking costs the size of its
+    month, not of the whole table, and readers still holding the old
+    snapshot keep a consistent view.
+    """
+    def __init__(self, generation, seq, lsn, rules, months):
+        self.generation = generation
+        self.seq = seq
+        self.lsn = lsn
+        self.rules = rules
+        self.months = months  # 'YYYY-MM' -> MonthSlots
+        self.month_keys = sorted(months)
+        self.counts = SlotCounts(months)
+
+    @classmethod
+    def build(cls, generation, seq, lsn, rules, slots):
+        # Snapshot of slots, given in booking order.
+        by_month = {}
+        for slot in slots:
+            by_month.setdefault(month_of(rules.slot_key(slot)), []).append(slot)
+        return cls(generation, seq, lsn, rules, {month: build_month(rules, month_slots)
+                                                 for month, month_slots in by_month.items()})
+
+    @property
+    def slots(self):
+        # Every booked datetime, month by month and in booking order within a
+        # month, as a reload from the database lists them.
+        return tuple(slot for month in self.month_keys for slot in self.months[month].slots)
+
+    def patched(self, generation, changes, cleared=False, seq=None, lsn=None):
+        # Snapshot at generation, seq and lsn (None keeps this one's) after
+        # applying changes, (added, slot) pairs, in order, to this snapshot
+        # or, if cleared, to an empty one. Raises ValueError if a removed
+        # slot is not booked.
+        by_month = {}
+        for added, slot in changes:
+            by_month.setdefault(month_of(self.rules.slot_key(slot)), []).append((added, slot))
+        months = {} if cleared else dict(self.months)
+        for month, month_changes in by_month.items():
+            patched = patch_month(self.rules, months.get(month, EMPTY_MONTH), month_changes)
+            if patched.slots:
+                months[month] = patched
+            else:
+                months.pop(month, None)
+        return BookedSnapshot(generation, self.seq if seq is None else seq,
+                              self.lsn if lsn is None else lsn, self.rules, months)
+
+    def without_month(self, month):
+        # This snapshot with the month 'YYYY-MM' dropped, at the same
+        # generation and position: one step however many bookings it holds.
+        months = dict(self.months)
+        months.pop(month, None)
+        return BookedSnapshot(self.generation, self.seq, self.lsn, self.rules, months)
+
+    def full_slots_from(self, ordinal):
+        # Ordinals of full slots at or after ordinal, in order.
+        first_month = month_of(self.rules.slot_key(self.rules.slot_from_ordinal(ordinal)))
+        for i in range(bisect_left(self.month_keys, first_month), len(self.month_keys)):
+            full_slots = self.months[self.month_keys[i]].full_slots
+            yield from full_slots[bisect_left(full_slots, ordinal):]
@@ -0,0 +1,56 @@
+# bench/bench_customers.py
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+from datetime import timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from driver.async_driver import AsyncClientPool, AsyncWebAppDriver
+from dsl.dsl import AppointmentDSL
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulate a peak hour of customers booking against a running app.")
+    parser.add_argument('--url', default="http://localhost:8999")
+    parser.add_argument('--customers', type=int, default=2000, help="customers arriving during the run")
+    parser.add_argument('--concurrency', type=int, default=100, help="most requests in flight at once")
+    parser.add_argument('--days', type=int, default=14, help="how many days ahead customers book")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args()
+
+async def customer(pool, rules, rng, days):
+    # One customer's visit: open the page, click a slot, book it.
+    dsl = AppointmentDSL(AsyncWebAppDriver(pool))
+    day = rules.first_bookable_date() + timedelta(days=rng.randrange(days))
+    if rules.day_reason(day) is not None:  # Sunday
+        day += timedelta(days=1)
+    slot = rng.choice(rules.day_slots(day)).strftime('%Y-%m-%dT%H:%M')
+    await dsl.visit_booking_page()
+    if await dsl.hold_time_slot(slot):
+        dsl.select_appointment_time(slot)
+        dsl.enter_appointment_details("Peak hour booking")
+        await dsl.submit_appointment()
+        dsl.verify_appointment_success()
+    return dsl.timings
+
+async def run(args):
+    rng = random.Random(args.seed)
+    async with AsyncClientPool(args.url, args.concurrency) as pool:
+        rules = await AsyncWebAppDriver(pool).get_rules()
+        start = time.perf_counter()
+        results = await asyncio.gather(*(customer(pool, rules, rng, args.days) for _ in range(args.customers)))
+        elapsed = time.perf_counter() - start
+    report = AppointmentDSL(None)
+    for timings in results:
+        report.timings.extend(timings)
+    print(f"{args.customers} customers in {elapsed:.1f}s ({args.customers / elapsed:.0f} customers/s), "
+          f"concurrency {args.concurrency}")
+    print(report.timing_report())
+
+def main():
+    asyncio.run(run(parse_args()))
+
+if __name__ == '__main__':
+    main()
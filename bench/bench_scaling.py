@@ -0,0 +1,144 @@
+# bench/bench_scaling.py
+import argparse
+import http.client
+import math
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from bench_workers import wait_until_ready
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+LAUNCHER = os.path.join(ROOT, 'app', 'launcher.py')
+SEED_DATA = os.path.join(ROOT, 'bench', 'seed_data.py')
+sys.path.insert(0, ROOT)
+from driver.driver import WebAppDriver
+
+# A path whose latency grows faster than n ** WORSE_THAN_LINEAR is flagged
+WORSE_THAN_LINEAR = 1.2
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Measure how request paths scale with the number of appointments.")
+    parser.add_argument('--sizes', default='1000,10000,100000',
+                        help="comma-separated appointment counts, 1k up to 10M (default: 1000,10000,100000)")
+    parser.add_argument('--capacity', type=int, default=25,
+                        help="bookings per slot; large sizes need room for their history")
+    parser.add_argument('--repeat', type=int, default=20, help="timed calls per path and size")
+    parser.add_argument('--port', type=int, default=8991)
+    return parser.parse_args()
+
+def worker_peak_rss(launcher_pid):
+    # Peak resident memory in MB of the launcher's worker, or None off Linux.
+    try:
+        with open(f'/proc/{launcher_pid}/task/{launcher_pid}/children') as f:
+            worker_pid = int(f.read().split()[0])
+        with open(f'/proc/{worker_pid}/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except (OSError, IndexError, ValueError):
+        return None
+
+def timed(call, repeat):
+    # Run call() repeat times and return the durations in milliseconds.
+    durations = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        call(i)
+        durations.append((time.perf_counter() - start) * 1000)
+    return durations
+
+def measure(size, args):
+    # Seed `size` appointments, serve them with one worker and time each path.
+    # Returns ({path: durations in ms}, peak worker RSS in MB).
+    with tempfile.TemporaryDirectory() as scratch:
+        database = os.path.join(scratch, 'appointments.db')
+        env = dict(os.environ, SLOT_CAPACITY=str(args.capacity))
+        subprocess.run([sys.executable, SEED_DATA, '--rows', str(size), '--database', database,
+                        '--capacity', str(args.capacity)], env=env, check=True, stdout=subprocess.DEVNULL)
+        server = subprocess.Popen(
+            [sys.executable, LAUNCHER, '--workers', '1', '--port', str(args.port), '--database', database],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_ready(args.port, timeout=600)
+            conn = http.client.HTTPConnection('localhost', args.port)
+
+            def get(path):
+                conn.request('GET', path)
+                conn.getresponse().read()
+
+            # New bookings go a year out, past the seeded data, one slot each
+            first_new = (datetime.now() + timedelta(days=365)).replace(hour=9, minute=0, second=0, microsecond=0)
+            new_slots = []
+            slot = first_new
+            while len(new_slots) < args.repeat:
+                if slot.weekday() != 6:
+                    new_slots.append(slot.strftime('%Y-%m-%dT%H:%M'))
+                slot += timedelta(hours=1)
+                if slot.hour > 20:
+                    slot = (slot + timedelta(days=1)).replace(hour=9)
+
+            def book(i):
+                conn.request('POST', '/', f"appointment_time={new_slots[i]}&details=bench",
+                             {'Content-Type': 'application/x-www-form-urlencoded'})
+                conn.getresponse().read()
+
+            # The driver starts from the current end of the change feed, as a
+            # client that has already synced would
+            driver = WebAppDriver(f"http://localhost:{args.port}")
+            with sqlite3.connect(database) as db:
+                driver.change_seq = db.execute("SELECT MAX(seq) FROM changes").fetchone()[0]
+            probe_date = first_new.strftime('%Y-%m-%d')
+
+            results = {}
+            results['POST /'] = timed(book, args.repeat)
+            results['GET /'] = timed(lambda i: get('/'), args.repeat)
+            results['GET /api/booked-slots'] = timed(lambda i: get('/api/booked-slots'), args.repeat)
+            results['driver.check_time_slot_disabled'] = timed(
+                lambda i: driver.check_time_slot_disabled(probe_date, '09:00'), args.repeat)
+            results['driver.get_booked_slots'] = timed(lambda i: driver.get_booked_slots(), args.repeat)
+            conn.close()
+            return results, worker_peak_rss(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+
+def growth_exponent(sizes, latencies):
+    # Least-squares slope of log(latency) against log(size): about 0 for a
+    # constant-time path, 1 for linear, more for worse than linear.
+    xs = [math.log(size) for size in sizes]
+    ys = [math.log(max(latency, 1e-3)) for latency in latencies]
+    mean_x, mean_y = statistics.fmean(xs), statistics.fmean(ys)
+    spread = sum((x - mean_x) ** 2 for x in xs)
+    return sum((x - mean_x) * (y - mean_y) for x, y in zip(xs, ys)) / spread if spread else 0.0
+
+def main():
+    args = parse_args()
+    sizes = [int(n) for n in args.sizes.split(',')]
+    print(f"capacity {args.capacity}, {args.repeat} calls per path and size")
+    print(f"{'appointments':>12} {'path':<34} {'median ms':>10} {'p95 ms':>9}")
+    medians = {}
+    for size in sizes:
+        results, peak_rss = measure(size, args)
+        for path, durations in results.items():
+            median = statistics.median(durations)
+            p95 = sorted(durations)[max(0, math.ceil(len(durations) * 0.95) - 1)]
+            medians.setdefault(path, []).append(median)
+            print(f"{size:>12} {path:<34} {median:>10.2f} {p95:>9.2f}")
+        print(f"{size:>12} {'peak worker memory':<34} "
+              f"{(f'{peak_rss:.0f} MB' if peak_rss is not None else 'n/a'):>10}", flush=True)
+
+    if len(sizes) > 1:
+        print()
+        print(f"{'path':<34} {'growth':>7}")
+        for path, path_medians in medians.items():
+            exponent = growth_exponent(sizes, path_medians)
+            flag = "  WORSE THAN LINEAR" if exponent > WORSE_THAN_LINEAR else ""
+            print(f"{path:<34} {f'n^{exponent:.2f}':>7}{flag}")
+
+if __name__ == '__main__':
+    main()
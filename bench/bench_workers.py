@@ -0,0 +1,99 @@
+# bench/bench_workers.py
+import argparse
+import http.client
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+LAUNCHER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'launcher.py')
+
+def parse_args():
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, 2, 4, 8, cpus} & set(range(1, cpus + 1)))
+    parser = argparse.ArgumentParser(description="Measure request throughput of app/launcher.py by worker count.")
+    parser.add_argument('--workers', default=','.join(str(n) for n in default_workers),
+                        help="comma-separated worker counts to try (default: powers of two up to the CPU count)")
+    parser.add_argument('--clients', type=int, default=2 * cpus,
+                        help="concurrent client processes generating load")
+    parser.add_argument('--duration', type=float, default=5.0, help="seconds of load per worker count")
+    parser.add_argument('--bookings', type=int, default=500, help="appointments seeded before measuring")
+    parser.add_argument('--port', type=int, default=8990)
+    return parser.parse_args()
+
+def wait_until_ready(port, timeout=10):
+    # Poll the app until it answers.
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('localhost', port, timeout=1)
+            conn.request('GET', '/api/slot-config')
+            conn.getresponse().read()
+            conn.close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"app did not start on port {port}")
+
+def seed(port, bookings):
+    # Book one appointment per business-hours slot, starting next week.
+    conn = http.client.HTTPConnection('localhost', port)
+    slot = (datetime.now() + timedelta(days=7)).replace(hour=8, minute=0, second=0, microsecond=0)
+    booked = 0
+    while booked < bookings:
+        if slot.weekday() != 6:
+            body = f"appointment_time={slot.strftime('%Y-%m-%dT%H:%M')}&details=bench"
+            conn.request('POST', '/', body, {'Content-Type': 'application/x-www-form-urlencoded'})
+            conn.getresponse().read()
+            booked += 1
+        slot += timedelta(hours=1)
+        if slot.hour > 20:
+            slot = (slot + timedelta(days=1)).replace(hour=8)
+    conn.close()
+
+def client_loop(port, duration):
+    # Issue page and API reads over one keep-alive connection; return the count.
+    paths = ['/', '/api/booked-slots']
+    conn = http.client.HTTPConnection('localhost', port)
+    count = 0
+    deadline = time.time() + duration
+    while time.time() < deadline:
+        conn.request('GET', paths[count % len(paths)])
+        conn.getresponse().read()
+        count += 1
+    conn.close()
+    return count
+
+def measure(workers, args):
+    # Requests per second served by the launcher with the given worker count.
+    with tempfile.TemporaryDirectory() as scratch:
+        server = subprocess.Popen(
+            [sys.executable, LAUNCHER, '--workers', str(workers), '--port', str(args.port),
+             '--database', os.path.join(scratch, 'appointments.db')],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            wait_until_ready(args.port)
+            seed(args.port, args.bookings)
+            with multiprocessing.Pool(args.clients) as pool:
+                counts = pool.starmap(client_loop, [(args.port, args.duration)] * args.clients)
+        finally:
+            server.terminate()
+            server.wait()
+    return sum(counts) / args.duration
+
+def main():
+    args = parse_args()
+    print(f"{args.clients} clients, {args.duration:.0f}s per run, {args.bookings} appointments, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'req/s':>10} {'speed-up':>9}")
+    baseline = None
+    for workers in (int(n) for n in args.workers.split(',')):
+        throughput = measure(workers, args)
+        baseline = baseline or throughput
+        print(f"{workers:>8} {throughput:>10.0f} {throughput / baseline:>8.2f}x", flush=True)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+# bench/seed_data.py
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+sys.path.insert(0, APP_DIR)
+import app as scheduler
+from rules import BookingRules
+from partitions import partition_name
+
+# Relative demand by slot start hour and by weekday (Monday = 0). Deliveries
+# bunch up before work and after it, and Saturdays are the busiest day.
+HOUR_WEIGHTS = {8: 0.9, 9: 1.0, 10: 0.9, 11: 0.7, 12: 0.6, 13: 0.6, 14: 0.6,
+                15: 0.7, 16: 0.8, 17: 1.0, 18: 1.0, 19: 0.8, 20: 0.5}
+WEEKDAY_WEIGHTS = [0.8, 0.75, 0.75, 0.8, 0.9, 1.0]
+NOTES = [
+    "Leave with neighbour", "Ring the bell twice", "Fragile: glassware", "Side gate is unlocked",
+    "Call on arrival", "Dog in the garden", "Leave in the porch", "Flat 3, buzzer broken",
+    "Great service last time", "Please bring the larger box", "Parking at the rear",
+    "Driver was very helpful", "Do not leave outside", "Back door please",
+]
+BATCH_SIZE = 10000
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Fill a scratch database with synthetic appointments.")
+    parser.add_argument('--rows', type=int, default=10000, help="appointments to generate (1k to 10M)")
+    parser.add_argument('--database', required=True, help="SQLite file to create; must not exist yet")
+    parser.add_argument('--capacity', type=int, default=int(os.environ.get('SLOT_CAPACITY', 1)),
+                        help="bookings per slot, as the app will run (default: SLOT_CAPACITY or 1)")
+    parser.add_argument('--fill', type=float, default=0.7,
+                        help="how full the busiest slots are, from 0 to 1")
+    parser.add_argument('--seed', type=int, default=1)
+    return parser.parse_args(argv)
+
+def synthetic_appointments(rows, rules, fill, rng, last_day):
+    # Yield (appointment_time, details) for `rows` appointments. Slots are
+    # walked backwards from last_day, so a bigger table means a longer
+    # history, and each place in a slot is taken with a probability that
+    # follows hourly and weekly demand. No slot goes over capacity.
+    ordinal = rules.first_slot_ordinal_from(datetime(last_day.year, last_day.month, last_day.day) +
+                                            timedelta(days=1)) - 1
+    produced = 0
+    while produced < rows:
+        if ordinal < 0:
+            raise ValueError(f"{rows} appointments do not fit before {last_day} at capacity "
+                             f"{rules.capacity}; use a higher capacity")
+        slot = rules.slot_from_ordinal(ordinal)
+        ordinal -= 1
+        demand = fill * HOUR_WEIGHTS.get(slot.hour, 0.5) * WEEKDAY_WEIGHTS[slot.weekday()]
+        for _ in range(rules.capacity):
+            if produced < rows and rng.random() < demand:
+                details = rng.choice(NOTES) if rng.random() < 0.7 else None
+                yield slot.strftime('%Y-%m-%dT%H:%M'), details
+                produced += 1
+
+def seed(database, rows, capacity=1, fill=0.7, seed=1, horizon_days=60):
+    # Create `database` with the app's schema and `rows` synthetic
+    # appointments ending `horizon_days` from today. The app's own triggers
+    # and start-up code fill the search index, slot counters and change feed.
+    if os.path.exists(database):
+        raise FileExistsError(f"{database} already exists")
+    rules = BookingRules(capacity, scheduler.SLOT_MINUTES, scheduler.FIRST_SLOT_HOUR, scheduler.LAST_SLOT_HOUR)
+    rng = random.Random(seed)
+    scheduler.DATABASE = database
+    scheduler.init_db()
+
+    conn = sqlite3.connect(database)
+    c = conn.cursor()
+    c.execute("PRAGMA synchronous = OFF")  # scratch data: a crash just means seeding again
+    appointments = synthetic_appointments(rows, rules, fill, rng, datetime.now().date() + timedelta(days=horizon_days))
+    while True:
+        batch = [row for _, row in zip(range(BATCH_SIZE), appointments)]
+        if not batch:
+            break
+        # Each month's rows go to that month's partition
+        for name, rows_in_month in itertools.groupby(batch, key=lambda row: partition_name(
+                datetime.fromisoformat(row[0]))):
+            rows_in_month = list(rows_in_month)
+            scheduler.ensure_partition(c, datetime.fromisoformat(rows_in_month[0][0]))
+            c.executemany(f"INSERT INTO {name} (appointment_time, details) VALUES (?, ?)", rows_in_month)
+    conn.commit()
+    conn.close()
+    # Derive the slot counters and seed the change feed from the new rows
+    scheduler.init_db()
+
+def main():
+    args = parse_args()
+    start = time.perf_counter()
+    seed(args.database, args.rows, args.capacity, args.fill, args.seed)
+    print(f"Seeded {args.rows} appointments into {args.database} in {time.perf_counter() - start:.1f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,305 @@
+# driver/async_driver.py
+import asyncio
+import gzip
+import json
+import uuid
+from datetime import datetime
+import aiohttp
+from app.rules import BookingRules, REASON_MESSAGES
+
+class AsyncResponse:
+    """
+    The parts of an HTTP response the driver checks, read in full so the
+    connection can go straight back to the pool. content holds the body as
+    it was sent, for a request that asked for it raw.
+    """
+    def __init__(self, status_code, text, headers, content=None):
+        self.status_code = status_code
+        self.text = text
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        return json.loads(self.text)
+
+class AsyncClientPool:
+    """
+    One keep-alive HTTP client shared by every simulated customer. At most
+    `concurrency` requests are in flight at once; the rest wait on the
+    semaphore instead of opening more connections.
+    """
+    def __init__(self, base_url="http://localhost:8999", concurrency=100):
+        self.base_url = base_url
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=concurrency))
+
+    async def request(self, method, path, raw=False, **kwargs):
+        # Send one request and read the whole response. Redirects are not
+        # followed: a booking's 302 is its answer. With raw, the body is kept
+        # as the bytes sent, still compressed, in the response's content.
+        async with self.semaphore:
+            async with self.session.request(method, self.base_url + path, allow_redirects=False,
+                                            auto_decompress=not raw, **kwargs) as response:
+                if raw:
+                    return AsyncResponse(response.status, None, response.headers, await response.read())
+                return AsyncResponse(response.status, await response.text(), response.headers)
+
+    async def close(self):
+        await self.session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+class AsyncWebAppDriver:
+    """
+    asyncio protocol driver with the same methods as WebAppDriver, for
+    simulating many customers from one process. Methods that talk to the SUT
+    are coroutines; setters and checks of the last response stay plain
+    methods. Each instance is one customer; instances share an AsyncClientPool.
+    """
+    def __init__(self, pool):
+        self.pool = pool
+        self.base_url = pool.base_url
+        self.appointment_time = None
+        self.details = None
+        self.html_content = None
+        self.booked_slots = None
+        self.response = None
+        # Local replica of appointments (id -> time), kept current from the change feed
+        self.replica = {}
+        self.change_seq = 0
+        self.last_changes = []
+        self.slot_config = None
+        self.hold_id = None
+        self.last_submission = None
+        self.calendar_etags = {}
+        self.calendar_feed = None
+        self.slot_events = None
+
+    async def visit_page(self):
+        # Load the appointment page
+        response = await self.pool.request('GET', '/')
+        self.html_content = response.text
+        return response.status_code == 200
+
+    async def fetch_page_over_the_wire(self):
+        # Load the appointment page as a mobile browser does, offering gzip.
+        # Returns the Content-Encoding and the bytes sent and decoded.
+        response = await self.pool.request('GET', '/', raw=True, headers={'Accept-Encoding': 'gzip'})
+        sent = response.content
+        encoding = response.headers.get('Content-Encoding')
+        decoded = gzip.decompress(sent) if encoding == 'gzip' else sent
+        return encoding, len(sent), len(decoded)
+
+    async def subscribe_slot_events(self):
+        # Open the live slot update stream, as an open booking page does. It
+        # stays open outside the pool's semaphore, like a page left open.
+        response = await self.pool.session.get(self.base_url + '/api/slot-events',
+                                               timeout=aiohttp.ClientTimeout(sock_read=20))
+        if response.status != 200:
+            response.release()
+            return False
+        self.slot_events = response
+        return True
+
+    async def next_slot_event(self):
+        # Read the next occupancy change from the stream, skipping comments
+        async for line in self.slot_events.content:
+            line = line.decode().rstrip('\r\n')
+            if line.startswith('data: '):
+                return json.loads(line[len('data: '):])
+        return None
+
+    async def get_booked_slots(self):
+        # Bring the local replica up to date from the change feed
+        self.last_changes = []
+        more = True
+        while more:
+            response = await self.pool.request('GET', '/api/changes', params={'since': self.change_seq})
+            if response.status_code != 200:
+                return False
+            feed = response.json()
+            self.last_changes.extend(feed["changes"])
+            for change in feed["changes"]:
+                if change["op"] == "insert":
+                    self.replica[change["id"]] = change["appointment_time"]
+                elif change["op"] == "delete":
+                    self.replica.pop(change["id"], None)
+                elif change["op"] == "clear":
+                    self.replica.clear()
+                elif change["op"] == "detach":
+                    month = change["appointment_time"][:7]
+                    self.replica = {appointment_id: appointment_time
+                                    for appointment_id, appointment_time in self.replica.items()
+                                    if not appointment_time.startswith(month)}
+            self.change_seq = feed["last_seq"]
+            more = feed["more"]
+        self.booked_slots = [self.replica[appointment_id] for appointment_id in sorted(self.replica)]
+        return True
+
+    async def get_next_available(self, after, count=1):
+        # Ask the API for the earliest bookable slots at or after `after`
+        response = await self.pool.request('GET', '/api/next-available', params={'after': after, 'count': count})
+        if response.status_code == 200:
+            return response.json()
+        return None
+
+    async def poll_calendar_feed(self, from_str, to_str):
+        # Poll the iCalendar feed with the ETag of the last copy
+        headers = {}
+        if (from_str, to_str) in self.calendar_etags:
+            headers['If-None-Match'] = self.calendar_etags[(from_str, to_str)]
+        response = await self.pool.request('GET', '/calendar.ics', params={'from': from_str, 'to': to_str},
+                                           headers=headers)
+        if response.status_code == 200:
+            self.calendar_etags[(from_str, to_str)] = response.headers.get('ETag')
+            self.calendar_feed = response.text
+        return response.status_code
+
+    async def search_appointments(self, text):
+        # Search appointment details, following every page of results
+        results = []
+        offset = 0
+        while offset is not None:
+            response = await self.pool.request('GET', '/api/appointments/search',
+                                               params={'q': text, 'offset': offset})
+            page = response.json()
+            results.extend(page["results"])
+            offset = page["next_offset"]
+        return results
+
+    async def get_utilization(self, from_str, to_str, group):
+        # Booked versus free places between two dates, by day, hour or weekday
+        response = await self.pool.request('GET', '/api/stats/utilization',
+                                           params={'from': from_str, 'to': to_str, 'group': group})
+        return response.json()["groups"]
+
+    async def start_backup(self):
+        # Start an online backup of the database
+        response = await self.pool.request('POST', '/api/admin/backup')
+        return response.status_code == 202
+
+    async def wait_for_backup(self, timeout=30):
+        # Poll the backup until it finishes and return its final status
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while loop.time() < deadline:
+            state = (await self.pool.request('GET', '/api/admin/backup')).json()
+            if state["status"] != "running":
+                return state
+            await asyncio.sleep(0.05)
+        return None
+
+    async def get_slot_config(self):
+        # Fetch the slot rules (capacity and slot length) once from the API
+        if self.slot_config is None:
+            response = await self.pool.request('GET', '/api/slot-config')
+            if response.status_code != 200:
+                return None
+            self.slot_config = response.json()
+        return self.slot_config
+
+    async def get_rules(self):
+        # The shared booking rules, configured the way the SUT is running them
+        return BookingRules.from_config(await self.get_slot_config())
+
+    async def clear_all_slots(self):
+        # Clear all booked slots (for testing)
+        response = await self.pool.request('POST', '/api/clear-slots')
+        return response.status_code == 200
+
+    def set_appointment_time(self, datetime_str):
+        self.appointment_time = datetime_str
+
+    def set_details(self, details):
+        self.details = details
+
+    async def hold_time_slot(self, datetime_str):
+        # Simulate clicking a time slot, which holds it for this customer
+        response = await self.pool.request('POST', '/api/holds', data={'appointment_time': datetime_str})
+        if response.status_code == 201:
+            self.hold_id = response.json()["hold_id"]
+            return True
+        self.hold_id = None
+        return False
+
+    async def submit_form(self):
+        # Submit the form data, with a fresh idempotency key
+        data = {'appointment_time': self.appointment_time}
+        if self.details is not None:
+            data['details'] = self.details
+        if self.hold_id:
+            data['hold_id'] = self.hold_id
+        headers = {'Idempotency-Key': uuid.uuid4().hex}
+        self.last_submission = (data, headers)
+        self.response = await self.pool.request('POST', '/', data=data, headers=headers)
+        self.hold_id = None
+
+    async def resubmit_form(self):
+        # Simulate a browser retrying the last submission after a timeout
+        data, headers = self.last_submission
+        self.response = await self.pool.request('POST', '/', data=data, headers=headers)
+
+    def check_success_message(self):
+        # Success is indicated by a redirect or a 200 OK without error message
+        successful = self.response.status_code in (200, 302)
+        has_error = (any(message in self.response.text for message in REASON_MESSAGES.values()) or
+                     "Invalid datetime format" in self.response.text or
+                     "Time slot is temporarily held" in self.response.text)
+        return successful and not has_error
+
+    def check_error_message(self, expected_message):
+        # Check if the expected error message is present in the response
+        return expected_message in self.response.text
+
+    async def find_appointment_id(self, datetime_str):
+        # Look up the id of the appointment booked at a time in the replica
+        await self.get_booked_slots()
+        for appointment_id, appointment_time in self.replica.items():
+            if appointment_time.startswith(datetime_str):
+                return appointment_id
+        return None
+
+    async def cancel_appointment(self, datetime_str):
+        # Cancel the appointment booked at a time
+        appointment_id = await self.find_appointment_id(datetime_str)
+        self.response = await self.pool.request('DELETE', f'/api/appointments/{appointment_id}')
+
+    async def reschedule_appointment(self, datetime_str, new_datetime_str):
+        # Move the appointment booked at one time to another
+        appointment_id = await self.find_appointment_id(datetime_str)
+        self.response = await self.pool.request('POST', f'/api/appointments/{appointment_id}/reschedule',
+                                                data={'appointment_time': new_datetime_str},
+                                                headers={'Idempotency-Key': uuid.uuid4().hex})
+
+    async def get_ui_state(self, date_str):
+        # Fetch what the page shows for a date: its date card and time slots
+        response = await self.pool.request('GET', '/api/ui-state', params={'date': date_str})
+        if response.status_code == 200:
+            return response.json()
+        return None
+
+    async def check_time_slot_disabled(self, date_str, time_str):
+        # Check if a time slot is disabled in the UI, from the server's view of the page
+        ui_state = await self.get_ui_state(date_str)
+        if ui_state is None:
+            raise AssertionError(f"The server has no page state for {date_str}")
+        # A time inside a slot belongs to the slot it falls in
+        slot_start = (await self.get_rules()).slot_start(datetime.fromisoformat(f"{date_str}T{time_str}"))
+        time_str = slot_start.strftime('%H:%M')
+        for slot in ui_state["slots"]:
+            if slot["time"] == time_str:
+                return not slot["enabled"]
+        # Times outside business hours have no slot on the page at all
+        return True
+
+    async def try_select_disabled_slot(self, date_str, time_str):
+        # Simulate attempting to book a slot the page shows as disabled
+        self.set_appointment_time(f"{date_str}T{time_str}")
+        self.set_details("Attempting to book disabled slot")
+        await self.submit_form()
+        return (any(message in self.response.text for message in REASON_MESSAGES.values()) or
+                not self.check_success_message())
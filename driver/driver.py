@@ -1,8 +1,12 @@
 # driver/driver.py
 import requests
 from bs4 import BeautifulSoup
+import gzip
 import json
+import time
+import uuid
 from datetime import datetime
+from app.rules import BookingRules, REASON_MESSAGES
 
 class WebAppDriver:
     """
@@ -16,6 +20,16 @@ class WebAppDriver:
         self.details = None
         self.html_content = None
         self.booked_slots = None
+        # Local replica of appointments (id -> time), kept current from the change feed
+        self.replica = {}
+        self.change_seq = 0
+        self.last_changes = []
+        self.slot_config = None
+        self.hold_id = None
+        self.last_submission = None
+        self.slot_events = None
+        self.calendar_etags = {}
+        self.calendar_feed = None
 
     def visit_page(self):
         # Load the appointment page
@@ -23,14 +37,129 @@ class WebAppDriver:
         self.html_content = response.text
         return response.status_code == 200
 
+    def fetch_page_over_the_wire(self):
+        # Load the appointment page as a mobile browser does, offering gzip.
+        # Returns the Content-Encoding and the bytes sent and decoded.
+        response = self.session.get(self.base_url, headers={'Accept-Encoding': 'gzip'}, stream=True)
+        sent = response.raw.read(decode_content=False)
+        encoding = response.headers.get('Content-Encoding')
+        decoded = gzip.decompress(sent) if encoding == 'gzip' else sent
+        return encoding, len(sent), len(decoded)
+
     def get_booked_slots(self):
-        # Fetch booked slots from the API
-        response = self.session.get(f"{self.base_url}/api/booked-slots")
-        if response.status_code == 200:
-            self.booked_slots = response.json()
-            return True
-        return False
+        # Bring the local replica up to date from the change feed, fetching
+        # only what changed since the last call
+        self.last_changes = []
+        more = True
+        while more:
+            response = self.session.get(f"{self.base_url}/api/changes",
+                                        params={'since': self.change_seq})
+            if response.status_code != 200:
+                return False
+            feed = response.json()
+            self.last_changes.extend(feed["changes"])
+            for change in feed["changes"]:
+                if change["op"] == "insert":
+                    self.replica[change["id"]] = change["appointment_time"]
+                elif change["op"] == "delete":
+                    self.replica.pop(change["id"], None)
+                elif change["op"] == "clear":
+                    self.replica.clear()
+                elif change["op"] == "detach":
+                    month = change["appointment_time"][:7]
+                    self.replica = {appointment_id: appointment_time
+                                    for appointment_id, appointment_time in self.replica.items()
+                                    if not appointment_time.startswith(month)}
+            self.change_seq = feed["last_seq"]
+            more = feed["more"]
+        self.booked_slots = [self.replica[appointment_id] for appointment_id in sorted(self.replica)]
+        return True
         
+    def get_next_available(self, after, count=1):
+        # Ask the API for the earliest bookable slots at or after `after`
+        response = self.session.get(f"{self.base_url}/api/next-available",
+                                    params={'after': after, 'count': count})
+        if response.status_code == 200:
+            return response.json()
+        return None
+
+    def subscribe_slot_events(self):
+        # Open the live slot update stream, as an open booking page does
+        response = requests.get(f"{self.base_url}/api/slot-events", stream=True, timeout=20)
+        if response.status_code != 200:
+            return False
+        self.slot_events = response.iter_lines(decode_unicode=True)
+        return True
+
+    def next_slot_event(self):
+        # Read the next occupancy change from the stream, skipping comments
+        for line in self.slot_events:
+            if line.startswith('data: '):
+                return json.loads(line[len('data: '):])
+        return None
+
+    def poll_calendar_feed(self, from_str, to_str):
+        # Poll the iCalendar feed the way a dispatch client does, sending the
+        # ETag of the last copy. Returns the status code; the feed text is kept
+        # in calendar_feed when it changed.
+        headers = {}
+        if (from_str, to_str) in self.calendar_etags:
+            headers['If-None-Match'] = self.calendar_etags[(from_str, to_str)]
+        response = self.session.get(f"{self.base_url}/calendar.ics",
+                                    params={'from': from_str, 'to': to_str}, headers=headers)
+        if response.status_code == 200:
+            self.calendar_etags[(from_str, to_str)] = response.headers.get('ETag')
+            self.calendar_feed = response.text
+        return response.status_code
+
+    def search_appointments(self, text):
+        # Search appointment details, following every page of results
+        results = []
+        offset = 0
+        while offset is not None:
+            response = self.session.get(f"{self.base_url}/api/appointments/search",
+                                        params={'q': text, 'offset': offset})
+            response.raise_for_status()
+            page = response.json()
+            results.extend(page["results"])
+            offset = page["next_offset"]
+        return results
+
+    def get_utilization(self, from_str, to_str, group):
+        # Booked versus free places between two dates, by day, hour or weekday
+        response = self.session.get(f"{self.base_url}/api/stats/utilization",
+                                    params={'from': from_str, 'to': to_str, 'group': group})
+        response.raise_for_status()
+        return response.json()["groups"]
+
+    def start_backup(self):
+        # Start an online backup of the database
+        response = self.session.post(f"{self.base_url}/api/admin/backup")
+        return response.status_code == 202
+
+    def wait_for_backup(self, timeout=30):
+        # Poll the backup until it finishes and return its final status
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            state = self.session.get(f"{self.base_url}/api/admin/backup").json()
+            if state["status"] != "running":
+                return state
+            time.sleep(0.05)
+        return None
+
+    def get_slot_config(self):
+        # Fetch the slot rules (capacity and slot length) once from the API
+        if self.slot_config is None:
+            response = self.session.get(f"{self.base_url}/api/slot-config")
+            if response.status_code != 200:
+                return None
+            self.slot_config = response.json()
+        return self.slot_config
+
+    def get_rules(self):
+        # The shared booking rules, configured the way the SUT is running them
+        return BookingRules.from_config(self.get_slot_config())
+
     def clear_all_slots(self):
         # Clear all booked slots (for testing)
         response = self.session.post(f"{self.base_url}/api/clear-slots")
@@ -42,13 +171,55 @@ class WebAppDriver:
     def set_details(self, details):
         self.details = details
 
+    def hold_time_slot(self, datetime_str):
+        # Simulate clicking a time slot, which holds it for this customer
+        response = self.session.post(f"{self.base_url}/api/holds",
+                                     data={'appointment_time': datetime_str})
+        if response.status_code == 201:
+            self.hold_id = response.json()["hold_id"]
+            return True
+        self.hold_id = None
+        return False
+
     def submit_form(self):
         # Submit the form data via a POST request.
         data = {
             'appointment_time': self.appointment_time,
             'details': self.details
         }
-        self.response = self.session.post(self.base_url, data=data)
+        if self.hold_id:
+            data['hold_id'] = self.hold_id
+        # Each submission carries a fresh idempotency key so that a retry can
+        # be recognised by the server
+        headers = {'Idempotency-Key': uuid.uuid4().hex}
+        self.last_submission = (data, headers)
+        self.response = self.session.post(self.base_url, data=data, headers=headers)
+        self.hold_id = None
+
+    def resubmit_form(self):
+        # Simulate a browser retrying the last submission after a timeout
+        data, headers = self.last_submission
+        self.response = self.session.post(self.base_url, data=data, headers=headers)
+
+    def find_appointment_id(self, datetime_str):
+        # Look up the id of the appointment booked at a time in the replica
+        self.get_booked_slots()
+        for appointment_id, appointment_time in self.replica.items():
+            if appointment_time.startswith(datetime_str):
+                return appointment_id
+        return None
+
+    def cancel_appointment(self, datetime_str):
+        # Cancel the appointment booked at a time
+        appointment_id = self.find_appointment_id(datetime_str)
+        self.response = self.session.delete(f"{self.base_url}/api/appointments/{appointment_id}")
+
+    def reschedule_appointment(self, datetime_str, new_datetime_str):
+        # Move the appointment booked at one time to another
+        appointment_id = self.find_appointment_id(datetime_str)
+        self.response = self.session.post(f"{self.base_url}/api/appointments/{appointment_id}/reschedule",
+                                          data={'appointment_time': new_datetime_str},
+                                          headers={'Idempotency-Key': uuid.uuid4().hex})
 
     def check_success_message(self):
         # Success is indicated by a redirect or a 200 OK without error message.
@@ -59,10 +230,9 @@ class WebAppDriver:
         print(f"Response text: {self.response.text[:500]}...")  # Print first 500 chars
         
         # But also check for error messages that would indicate failure
-        has_error = ("Time slot already booked" in self.response.text or 
+        has_error = (any(message in self.response.text for message in REASON_MESSAGES.values()) or
                    "Invalid datetime format" in self.response.text or
-                   "Cannot book appointments for past dates" in self.response.text or
-                   "Cannot book appointments on Sundays" in self.response.text)
+                   "Time slot is temporarily held" in self.response.text)
                    
         print(f"Has error: {has_error}")
         return successful and not has_error
@@ -71,64 +241,29 @@ class WebAppDriver:
         # Check if the expected error message is present in the response.
         return expected_message in self.response.text
     
+    def get_ui_state(self, date_str):
+        # Fetch what the page shows for a date: its date card and time slots
+        response = self.session.get(f"{self.base_url}/api/ui-state", params={'date': date_str})
+        if response.status_code == 200:
+            return response.json()
+        return None
+
     def check_time_slot_disabled(self, date_str, time_str):
         """
-        Check if a time slot is disabled in the UI by actually visiting the page and checking
-        what a user would see.
+        Check if a time slot is disabled in the UI, using the server's view of exactly
+        what the page renders for that date.
         """
-        # First visit the page to ensure we have the latest UI state
-        self.visit_page()
-        
-        # Create the datetime string in ISO format
-        datetime_str = f"{date_str}T{time_str}"
-        hour = int(time_str.split(':')[0])
-        
-        # Check if this is a past date (disabled)
-        today = datetime.now().strftime("%Y-%m-%d")
-        if date_str < today:
-            return True
-            
-        # Check if this is a Sunday (disabled)
-        date_obj = datetime.strptime(date_str, "%Y-%m-%d")
-        if date_obj.weekday() == 6:  # Sunday is 6 in Python's weekday()
-            return True
-            
-        # Ensure we have the latest booked slots from the API
-        self.get_booked_slots()
-        
-        # Check for the slot in the booked slots (API verification)
-        api_shows_booked = False
-        for slot in self.booked_slots:
-            # Compare year, month, day, hour (ignoring minutes)
-            if slot.startswith(datetime_str.split(':')[0]):
-                api_shows_booked = True
-                break
-        
-        # Now let's verify what a real user would see in the UI
-        # For a real browser test, we could check the DOM and CSS properties
-        # Here, we simulate by re-verifying the slots are displayed correctly
-        
-        # Force a refresh of the UI by visiting the page again with a timestamp
-        # This ensures we get fresh data
-        self.session.get(f"{self.base_url}?refresh={datetime.now().timestamp()}")
-        response = self.session.get(f"{self.base_url}/api/booked-slots?refresh={datetime.now().timestamp()}")
-        ui_booked_slots = response.json() if response.status_code == 200 else []
-        
-        # Check for the slot in the UI data
-        ui_shows_booked = False
-        for slot in ui_booked_slots:
-            slot_dt = datetime.fromisoformat(slot)
-            if (slot_dt.strftime('%Y-%m-%d') == date_str and 
-                slot_dt.hour == hour):
-                ui_shows_booked = True
-                break
-                
-        # Compare API and UI data - they should match
-        if api_shows_booked != ui_shows_booked:
-            print(f"WARNING: Inconsistency between API ({api_shows_booked}) and UI ({ui_shows_booked}) for slot {datetime_str}")
-        
-        # For the test to pass, both the API and UI should show the slot as booked
-        return api_shows_booked and ui_shows_booked
+        ui_state = self.get_ui_state(date_str)
+        if ui_state is None:
+            raise AssertionError(f"The server has no page state for {date_str}")
+        # A time inside a slot belongs to the slot it falls in
+        slot_start = self.get_rules().slot_start(datetime.fromisoformat(f"{date_str}T{time_str}"))
+        time_str = slot_start.strftime('%H:%M')
+        for slot in ui_state["slots"]:
+            if slot["time"] == time_str:
+                return not slot["enabled"]
+        # Times outside business hours have no slot on the page at all
+        return True
         
     def try_select_disabled_slot(self, date_str, time_str):
         # Simulate attempting to select a disabled slot
@@ -141,7 +276,5 @@ class WebAppDriver:
         self.submit_form()
         
         # Check for any error message that would indicate booking failure
-        return ("Time slot already booked" in self.response.text or
-                "Cannot book appointments for today or past dates" in self.response.text or
-                "Cannot book appointments on Sundays" in self.response.text or
+        return (any(message in self.response.text for message in REASON_MESSAGES.values()) or
                 not self.check_success_message())
@@ -1,4 +1,72 @@
 # dsl/dsl.py
+import contextvars
+import inspect
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+# Set while a domain action runs in this thread or asyncio task, so actions
+# it calls count towards it only
+_in_action = contextvars.ContextVar('in_action', default=False)
+
+def timed(action):
+    # Record how long a domain action takes, driver round-trips included.
+    # Actions called from inside another action count towards the outer one
+    # only. With an asyncio driver the action returns an awaitable and is
+    # timed until it completes; one that is never awaited is not recorded.
+    @wraps(action)
+    def wrapper(self, *args, **kwargs):
+        if _in_action.get():
+            return action(self, *args, **kwargs)
+        start = time.perf_counter()
+        token = _in_action.set(True)
+        try:
+            result = action(self, *args, **kwargs)
+        except BaseException:
+            _record_timing(self, action.__name__, start)
+            raise
+        finally:
+            _in_action.reset(token)
+        if inspect.isawaitable(result):
+            return _timed_await(self, action.__name__, start, result)
+        _record_timing(self, action.__name__, start)
+        return result
+    return wrapper
+
+def _record_timing(dsl, action, start):
+    dsl.timings.append((action, time.perf_counter() - start))
+
+async def _timed_await(dsl, action, start, awaitable):
+    token = _in_action.set(True)
+    try:
+        return await awaitable
+    finally:
+        _in_action.reset(token)
+        _record_timing(dsl, action, start)
+
+def then(result, step):
+    # Pass a driver call's result on to step(), once it is there: straight
+    # away from WebAppDriver, and as an awaitable from AsyncWebAppDriver, so
+    # one action body works with both. step() may call the driver again.
+    if inspect.isawaitable(result):
+        return _await_then(result, step)
+    return step(result)
+
+async def _await_then(awaitable, step):
+    result = step(await awaitable)
+    if inspect.isawaitable(result):
+        result = await result
+    return result
+
+def then_all(results, step):
+    # then() for a list of driver call results, awaited one after another.
+    if any(inspect.isawaitable(result) for result in results):
+        return _await_all_then(results, step)
+    return step(results)
+
+async def _await_all_then(results, step):
+    return step([await result if inspect.isawaitable(result) else result for result in results])
+
 class AppointmentDSL:
     """
     DSL layer that abstracts domain actions for the appointment scheduler.
@@ -6,69 +74,209 @@ class AppointmentDSL:
     """
     def __init__(self, driver):
         self.driver = driver
+        self.timings = []          # (action, seconds) for every action performed
+        self.latency_budgets = {}  # action -> slowest allowed call in milliseconds
 
+    def set_latency_budget(self, action, milliseconds):
+        # Declare how long any single call of an action may take, e.g.
+        # set_latency_budget("submit_appointment", 50)
+        self.latency_budgets[action] = milliseconds
+
+    def latency_budget_breaches(self):
+        # Actions whose slowest call went over budget, as (action, slowest ms, budget ms)
+        breaches = []
+        for action, budget in self.latency_budgets.items():
+            slowest = max((seconds for name, seconds in self.timings if name == action), default=0) * 1000
+            if slowest > budget:
+                breaches.append((action, slowest, budget))
+        return breaches
+
+    def verify_within_latency_budgets(self):
+        # Verify that every action with a budget stayed within it on every call
+        return not self.latency_budget_breaches()
+
+    def timing_report(self):
+        # Per-action calls, mean, slowest and budget for the actions performed so far
+        lines = [f"{'action':<40} {'calls':>5} {'mean ms':>9} {'max ms':>9} {'budget':>7}"]
+        actions = {}
+        for action, seconds in self.timings:
+            actions.setdefault(action, []).append(seconds * 1000)
+        for action, durations in actions.items():
+            budget = self.latency_budgets.get(action)
+            lines.append(f"{action:<40} {len(durations):>5} {sum(durations) / len(durations):>9.1f} "
+                         f"{max(durations):>9.1f} {budget if budget is not None else '-':>7}")
+        return '\n'.join(lines)
+
+    @timed
     def visit_booking_page(self):
         # Domain action: visit the appointment scheduling page
         return self.driver.visit_page()
         
+    @timed
+    def verify_page_is_sent_compressed(self):
+        # Verify that the booking page travels gzip-compressed to at most half its size
+        return then(self.driver.fetch_page_over_the_wire(),
+                    lambda page: page[0] == 'gzip' and page[1] * 2 <= page[2])
+        
+    @timed
     def clear_all_appointments(self):
         # Domain action: clear all appointments for testing
         return self.driver.clear_all_slots()
         
+    @timed
     def select_appointment_time(self, datetime_str):
         # Domain action: set the appointment time.
-        self.driver.set_appointment_time(datetime_str)
+        return self.driver.set_appointment_time(datetime_str)
 
+    @timed
+    def hold_time_slot(self, datetime_str):
+        # Domain action: click a time slot, holding it while the form is completed
+        return self.driver.hold_time_slot(datetime_str)
+
+    @timed
     def enter_appointment_details(self, details):
         # Domain action: enter the appointment details.
-        self.driver.set_details(details)
+        return self.driver.set_details(details)
 
+    @timed
     def submit_appointment(self):
         # Domain action: submit the appointment form.
-        self.driver.submit_form()
+        return self.driver.submit_form()
+
+    @timed
+    def cancel_appointment(self, datetime_str):
+        # Domain action: cancel the delivery booked at a time.
+        return self.driver.cancel_appointment(datetime_str)
+
+    @timed
+    def reschedule_appointment(self, datetime_str, new_datetime_str):
+        # Domain action: move the delivery booked at one time to another.
+        return self.driver.reschedule_appointment(datetime_str, new_datetime_str)
+
+    @timed
+    def retry_appointment_submission(self):
+        # Domain action: resend the same submission, as a browser does on timeout.
+        return self.driver.resubmit_form()
 
+    @timed
+    def count_booked_slots(self):
+        # Domain action: count the appointments currently booked.
+        return then(self.driver.get_booked_slots(), lambda _: len(self.driver.booked_slots))
+
+    @timed
+    def verify_sync_fetched_only(self, datetime_str):
+        # Verify that the last sync transferred just the change for one booking.
+        changes = self.driver.last_changes
+        return len(changes) == 1 and changes[0]["appointment_time"].startswith(datetime_str)
+
+    @timed
     def verify_appointment_success(self):
         # Verify that the appointment was successfully booked.
         return self.driver.check_success_message()
 
+    @timed
     def verify_booking_constraint(self):
         # Verify that booking fails when the time slot is already taken.
         return self.driver.check_error_message("Time slot already booked")
         
+    @timed
+    def verify_slot_is_held(self):
+        # Verify that booking fails because another customer holds the slot.
+        return self.driver.check_error_message("Time slot is temporarily held")
+        
+    @timed
     def verify_time_slot_is_disabled(self, date_str, time_str):
         # Domain action: verify that a specific time slot is disabled in the UI
         return self.driver.check_time_slot_disabled(date_str, time_str)
         
+    @timed
     def attempt_to_select_disabled_slot(self, date_str, time_str):
         # Domain action: attempt to select and book a slot that should be disabled
         return self.driver.try_select_disabled_slot(date_str, time_str)
         
+    @timed
+    def find_next_available_slots(self, after, count=1):
+        # Domain action: find the earliest bookable slots from a given time
+        return self.driver.get_next_available(after, count)
+        
+    @timed
+    def watch_for_slot_updates(self):
+        # Domain action: keep a booking page open, listening for slot changes
+        return self.driver.subscribe_slot_events()
+        
+    @timed
+    def verify_slot_update_received(self, op, datetime_str):
+        # Verify that the open page is told about a change to the given slot
+        return then(self.driver.next_slot_event(),
+                    lambda event: event is not None and event["op"] == op and event["slot"].startswith(datetime_str))
+        
+    @timed
+    def search_bookings(self, keywords):
+        # Domain action: support staff look bookings up by words in their notes
+        return then(self.driver.search_appointments(keywords),
+                    lambda results: [result["appointment_time"][:16] for result in results])
+        
+    @timed
+    def check_day_utilization(self, date_str):
+        # Domain action: ops check how full a day is; returns (booked, free)
+        return then(self.driver.get_utilization(date_str, date_str, "day"),
+                    lambda days: (days[0]["booked"], days[0]["free"]))
+        
+    @timed
+    def check_hour_utilization(self, date_str, hour):
+        # Domain action: ops check how many places are booked at an hour of a day
+        return then(self.driver.get_utilization(date_str, date_str, "hour"),
+                    lambda rows: next((row["booked"] for row in rows if row["key"] == hour), None))
+        
+    @timed
+    def back_up_bookings(self):
+        # Domain action: ops take a backup while the shop stays open
+        return self.driver.start_backup()
+        
+    @timed
+    def verify_backup_holds(self, appointments):
+        # Verify that the backup finished, passed its checks and holds the given number of bookings
+        return then(self.driver.wait_for_backup(),
+                    lambda state: (state is not None and state["status"] == "complete" and state["verified"] and
+                                   state["appointments"] == appointments))
+        
+    @timed
+    def fetch_dispatch_schedule(self, date_str):
+        # Domain action: a driver's dispatch tool polls the day's schedule
+        return self.driver.poll_calendar_feed(date_str, date_str)
+        
+    @timed
+    def verify_dispatch_schedule_includes(self, text):
+        # Verify that the last schedule fetched mentions the given text
+        return self.driver.calendar_feed is not None and text in self.driver.calendar_feed
+        
+    @timed
     def verify_all_booked_slots_disabled(self):
         # Domain action: verify that all booked slots are properly disabled
-        # First get the booked slots
-        self.driver.get_booked_slots()
-        if not self.driver.booked_slots:
-            return True  # No booked slots to check
-            
-        # Check each slot is disabled
-        for slot in self.driver.booked_slots:
-            date_part = slot.split('T')[0]
-            time_part = slot.split('T')[1].split(':')[0] + ":00"
-            if not self.driver.check_time_slot_disabled(date_part, time_part):
-                return False
-                
-        return True
+        # First get the booked slots, then check each one
+        return then(self.driver.get_booked_slots(),
+                    lambda _: then(self.driver.get_rules(),
+                                   lambda rules: self._check_all_disabled(rules, self.driver.booked_slots)))
+
+    def _check_all_disabled(self, rules, slots):
+        # Whether the page disables the slot, as the shared rules lay them
+        # out, of every booked time in slots
+        checks = []
+        for slot in slots:
+            slot_start = rules.slot_start(datetime.fromisoformat(slot))
+            checks.append(self.driver.check_time_slot_disabled(slot_start.strftime("%Y-%m-%d"),
+                                                               slot_start.strftime("%H:%M")))
+        return then_all(checks, all)
         
+    @timed
     def verify_past_date_is_disabled(self):
         # Domain action: verify that past dates are disabled
-        from datetime import datetime, timedelta
         yesterday = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
         return self.driver.check_time_slot_disabled(yesterday, "12:00")
     
+    @timed
     def verify_sunday_is_disabled(self):
         # Domain action: verify that Sunday is disabled
-        from datetime import datetime, timedelta
-        
         # Find the next Sunday
         today = datetime.now()
         days_until_sunday = 6 - today.weekday() if today.weekday() != 6 else 7
@@ -76,17 +284,11 @@ class AppointmentDSL:
         
         return self.driver.check_time_slot_disabled(next_sunday, "12:00")
     
+    @timed
     def verify_tomorrow_is_default_selection(self):
         # Domain action: verify that tomorrow (or next business day) is pre-selected
-        from datetime import datetime, timedelta
-        
-        # Calculate tomorrow (skipping Sunday)
-        tomorrow = datetime.now() + timedelta(days=1)
-        if tomorrow.weekday() == 6:  # Sunday
-            tomorrow += timedelta(days=1)  # Move to Monday
-            
-        tomorrow_str = tomorrow.strftime("%Y-%m-%d")
-        
         # This is a simplified check since we can't easily check the UI selection state
         # We verify that tomorrow is enabled (not disabled) as a proxy for being selected
-        return not self.driver.check_time_slot_disabled(tomorrow_str, "12:00")
+        return then(self.driver.get_rules(),
+                    lambda rules: then(self.driver.check_time_slot_disabled(
+                        rules.first_bookable_date().strftime("%Y-%m-%d"), "12:00"), lambda disabled: not disabled))
@@ -2,6 +2,8 @@
 import unittest
 from dsl.dsl import AppointmentDSL
 from driver.driver import WebAppDriver
+from driver.async_driver import AsyncClientPool, AsyncWebAppDriver
+import asyncio
 import time
 from datetime import datetime, timedelta
 
@@ -24,6 +26,10 @@ class TestAppointmentScheduler(unittest.TestCase):
         # Clear all appointments at the start of each test
         self.dsl.clear_all_appointments()
 
+    def tearDown(self):
+        # Show how long each domain action took (pytest shows it for failures)
+        print(self.dsl.timing_report())
+
     def test_successful_appointment_booking(self):
         """
         Test that an appointment is successfully booked.
@@ -106,6 +112,9 @@ class TestAppointmentScheduler(unittest.TestCase):
         
         # Verify the time slot is greyed out
         self.assertTrue(self.dsl.verify_time_slot_is_disabled(date_part, time_part))
+        # A time inside a slot is checked against the slot it falls in
+        self.assertTrue(self.driver.check_time_slot_disabled(date_part, "16:30"))
+        self.assertFalse(self.driver.check_time_slot_disabled(date_part, "17:30"))
 
     def test_successfully_book_available_time_slot(self):
         """
@@ -245,5 +254,453 @@ class TestAppointmentScheduler(unittest.TestCase):
         time.sleep(1)
         self.assertFalse(self.dsl.verify_appointment_success())
 
+    def test_next_available_skips_booked_slots(self):
+        """
+        Test that the next available slots skip a slot that is already booked.
+        """
+        # Use a future date (7 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=7)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+        
+        # Book the first slot of the day
+        self.dsl.select_appointment_time(f"{date_str}T08:00")
+        self.dsl.enter_appointment_details("Early delivery")
+        self.dsl.submit_appointment()
+        self.assertTrue(self.dsl.verify_appointment_success())
+        
+        # The search should start from the next free slot
+        self.assertEqual(self.dsl.find_next_available_slots(f"{date_str}T00:00", 2),
+                         [f"{date_str}T09:00:00", f"{date_str}T10:00:00"])
+
+    def test_next_available_skips_sunday(self):
+        """
+        Test that the next available slot after Saturday closing is on Monday.
+        """
+        # Find the next Saturday at least two days ahead
+        saturday = datetime.now() + timedelta(days=2)
+        while saturday.weekday() != 5:
+            saturday += timedelta(days=1)
+        monday_str = (saturday + timedelta(days=2)).strftime("%Y-%m-%d")
+        
+        after = saturday.strftime("%Y-%m-%d") + "T21:00"
+        self.assertEqual(self.dsl.find_next_available_slots(after),
+                         [f"{monday_str}T08:00:00"])
+
+    def test_held_slot_cannot_be_booked_by_another_customer(self):
+        """
+        Test that a slot held by one customer cannot be booked by another until released.
+        """
+        # Use a future date (8 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=8)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        appointment_time = future_date.strftime("%Y-%m-%d") + "T11:00"
+        
+        # The first customer clicks the slot and starts typing notes
+        self.assertTrue(self.dsl.hold_time_slot(appointment_time))
+        
+        # A second customer cannot hold or book the same slot
+        other_dsl = AppointmentDSL(WebAppDriver("http://localhost:8999"))
+        self.assertFalse(other_dsl.hold_time_slot(appointment_time))
+        other_dsl.select_appointment_time(appointment_time)
+        other_dsl.enter_appointment_details("Second customer")
+        other_dsl.submit_appointment()
+        self.assertTrue(other_dsl.verify_slot_is_held())
+        
+        # The holder completes the booking
+        self.dsl.select_appointment_time(appointment_time)
+        self.dsl.enter_appointment_details("First customer")
+        self.dsl.submit_appointment()
+        self.assertTrue(self.dsl.verify_appointment_success())
+
+    def test_retried_submission_returns_original_result(self):
+        """
+        Test that retrying a submission does not report the customer's own booking as a conflict.
+        """
+        # Use a future date (9 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=9)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        appointment_time = future_date.strftime("%Y-%m-%d") + "T13:00"
+        
+        self.dsl.select_appointment_time(appointment_time)
+        self.dsl.enter_appointment_details("Retried delivery")
+        self.dsl.submit_appointment()
+        self.assertTrue(self.dsl.verify_appointment_success())
+        
+        # The browser retries the same request after a timeout
+        self.dsl.retry_appointment_submission()
+        self.assertTrue(self.dsl.verify_appointment_success())
+        self.assertEqual(self.dsl.count_booked_slots(), 1)
+
+    def test_open_page_is_told_about_new_booking(self):
+        """
+        Test that an open booking page is pushed another customer's booking without reloading.
+        """
+        # Use a future date (10 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=10)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        appointment_time = future_date.strftime("%Y-%m-%d") + "T12:00"
+        
+        # One customer has the page open
+        watcher = AppointmentDSL(WebAppDriver("http://localhost:8999"))
+        self.assertTrue(watcher.watch_for_slot_updates())
+        
+        # Another customer books a slot
+        self.dsl.select_appointment_time(appointment_time)
+        self.dsl.enter_appointment_details("Pushed delivery")
+        self.dsl.submit_appointment()
+        self.assertTrue(self.dsl.verify_appointment_success())
+        
+        # The open page hears about it
+        self.assertTrue(watcher.verify_slot_update_received("book", appointment_time))
+
+    def test_sync_fetches_only_new_bookings(self):
+        """
+        Test that keeping a copy of the booked slots up to date only transfers new bookings.
+        """
+        # Use a future date (11 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=11)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+        
+        self.dsl.select_appointment_time(f"{date_str}T09:00")
+        self.dsl.enter_appointment_details("First delivery")
+        self.dsl.submit_appointment()
+        self.assertEqual(self.dsl.count_booked_slots(), 1)
+        
+        self.dsl.select_appointment_time(f"{date_str}T10:00")
+        self.dsl.enter_appointment_details("Second delivery")
+        self.dsl.submit_appointment()
+        self.assertEqual(self.dsl.count_booked_slots(), 2)
+        self.assertTrue(self.dsl.verify_sync_fetched_only(f"{date_str}T10:00"))
+
+    def test_cannot_book_today(self):
+        """
+        Test that the system requires appointments to be booked at least one day in advance.
+        """
+        today = datetime.now()
+        if today.weekday() == 6:
+            self.skipTest("Sundays are already rejected")
+        
+        # Attempt to book today (simulating a user bypassing client-side validation)
+        self.dsl.select_appointment_time(today.strftime("%Y-%m-%d") + "T20:00")
+        self.dsl.enter_appointment_details("Same-day appointment")
+        self.dsl.submit_appointment()
+        self.assertFalse(self.dsl.verify_appointment_success())
+        
+    def test_cannot_book_outside_business_hours(self):
+        """
+        Test that the system prevents booking appointments outside business hours.
+        """
+        # Use a future date (12 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=12)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        
+        self.dsl.select_appointment_time(future_date.strftime("%Y-%m-%d") + "T22:00")
+        self.dsl.enter_appointment_details("Late appointment")
+        self.dsl.submit_appointment()
+        self.assertFalse(self.dsl.verify_appointment_success())
+
+    def test_held_slot_is_greyed_out(self):
+        """
+        Test that a slot another customer is holding is greyed out in the time picker.
+        """
+        # Use a future date (13 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=13)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+        
+        self.assertFalse(self.dsl.verify_time_slot_is_disabled(date_str, "17:00"))
+        other_dsl = AppointmentDSL(WebAppDriver("http://localhost:8999"))
+        self.assertTrue(other_dsl.hold_time_slot(f"{date_str}T17:00"))
+        self.assertTrue(self.dsl.verify_time_slot_is_disabled(date_str, "17:00"))
+
+    def test_dispatch_schedule_feed(self):
+        """
+        Test that the day's schedule feed lists bookings with their notes and is cheap to re-poll.
+        """
+        # Use a future date (14 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=14)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+        
+        self.dsl.select_appointment_time(f"{date_str}T15:00")
+        self.dsl.enter_appointment_details("Leave parcel with neighbour")
+        self.dsl.submit_appointment()
+        self.assertTrue(self.dsl.verify_appointment_success())
+        
+        self.assertEqual(self.dsl.fetch_dispatch_schedule(date_str), 200)
+        self.assertTrue(self.dsl.verify_dispatch_schedule_includes("Leave parcel with neighbour"))
+        
+        # Nothing has changed, so polling again is answered with Not Modified
+        self.assertEqual(self.dsl.fetch_dispatch_schedule(date_str), 304)
+
+    def test_search_bookings_by_notes(self):
+        """
+        Test that support staff can find bookings by words in their notes.
+        """
+        # Use a future date (15 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=15)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+        
+        for time_str, details in [("09:00", "Fragile: glass vase, ring the bell"),
+                                  ("10:00", "Leave at the back door")]:
+            self.dsl.select_appointment_time(f"{date_str}T{time_str}")
+            self.dsl.enter_appointment_details(details)
+            self.dsl.submit_appointment()
+            self.assertTrue(self.dsl.verify_appointment_success())
+        
+        self.assertEqual(self.dsl.search_bookings("glass bell"), [f"{date_str}T09:00"])
+        self.assertEqual(self.dsl.search_bookings("piano"), [])
+        
+        # Cleared bookings are no longer found
+        self.dsl.clear_all_appointments()
+        self.assertEqual(self.dsl.search_bookings("glass"), [])
+
+    def test_utilization_counts_booked_and_free_places(self):
+        """
+        Test that ops see booked and free places for a day, updated as bookings come in.
+        """
+        # Use a future date (16 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=16)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+        rules = self.driver.get_rules()
+        places = rules.slots_per_day() * rules.capacity
+        
+        self.dsl.select_appointment_time(f"{date_str}T09:00")
+        self.dsl.submit_appointment()
+        self.assertEqual(self.dsl.check_day_utilization(date_str), (1, places - 1))
+        
+        self.dsl.select_appointment_time(f"{date_str}T11:00")
+        self.dsl.submit_appointment()
+        self.assertEqual(self.dsl.check_day_utilization(date_str), (2, places - 2))
+        self.assertEqual(self.dsl.check_hour_utilization(date_str, 11), 1)
+        self.assertEqual(self.dsl.check_hour_utilization(date_str, 12), 0)
+
+    def test_cancelled_slot_can_be_booked_again(self):
+        """
+        Test that cancelling a booking frees its slot straight away.
+        """
+        # Use a future date (17 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=17)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        appointment_time = future_date.strftime("%Y-%m-%dT10:00")
+        date_str = future_date.strftime("%Y-%m-%d")
+        
+        self.dsl.select_appointment_time(appointment_time)
+        self.dsl.submit_appointment()
+        self.assertTrue(self.dsl.verify_time_slot_is_disabled(date_str, "10:00"))
+        
+        self.dsl.cancel_appointment(appointment_time)
+        self.assertTrue(self.dsl.verify_appointment_success())
+        self.assertFalse(self.dsl.verify_time_slot_is_disabled(date_str, "10:00"))
+        self.assertEqual(self.dsl.count_booked_slots(), 0)
+        
+        self.dsl.select_appointment_time(appointment_time)
+        self.dsl.submit_appointment()
+        self.assertTrue(self.dsl.verify_appointment_success())
+
+    def test_reschedule_moves_booking_only_to_a_free_slot(self):
+        """
+        Test that rescheduling moves a booking, and is refused if the new slot is taken.
+        """
+        # Use a future date (18 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=18)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+        
+        for time_str in ("09:00", "11:00"):
+            self.dsl.select_appointment_time(f"{date_str}T{time_str}")
+            self.dsl.submit_appointment()
+        
+        # The 11:00 slot is taken, so the 09:00 booking stays where it is
+        self.dsl.reschedule_appointment(f"{date_str}T09:00", f"{date_str}T11:00")
+        self.assertTrue(self.dsl.verify_booking_constraint())
+        self.assertTrue(self.dsl.verify_time_slot_is_disabled(date_str, "09:00"))
+        
+        self.dsl.reschedule_appointment(f"{date_str}T09:00", f"{date_str}T13:00")
+        self.assertTrue(self.dsl.verify_appointment_success())
+        self.assertFalse(self.dsl.verify_time_slot_is_disabled(date_str, "09:00"))
+        self.assertTrue(self.dsl.verify_time_slot_is_disabled(date_str, "13:00"))
+        self.assertEqual(self.dsl.count_booked_slots(), 2)
+
+    def test_reschedule_into_another_month(self):
+        """
+        Test that a booking moved into another month is found at its new time only.
+        """
+        # Use a future date (40 days ahead to avoid conflicts) and one a month later
+        future_date = datetime.now() + timedelta(days=40)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        later_date = future_date + timedelta(days=35)
+        if later_date.weekday() == 6:  # Skip Sunday
+            later_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+        later_str = later_date.strftime("%Y-%m-%d")
+
+        self.dsl.select_appointment_time(f"{date_str}T15:00")
+        self.dsl.enter_appointment_details("Piano tuning visit")
+        self.dsl.submit_appointment()
+        self.dsl.reschedule_appointment(f"{date_str}T15:00", f"{later_str}T15:00")
+        self.assertTrue(self.dsl.verify_appointment_success())
+        self.assertFalse(self.dsl.verify_time_slot_is_disabled(date_str, "15:00"))
+        self.assertTrue(self.dsl.verify_time_slot_is_disabled(later_str, "15:00"))
+        self.assertEqual(self.dsl.search_bookings("piano"), [f"{later_str}T15:00"])
+        self.assertEqual(self.dsl.count_booked_slots(), 1)
+
+        # The moved booking can still be cancelled
+        self.dsl.cancel_appointment(f"{later_str}T15:00")
+        self.assertTrue(self.dsl.verify_appointment_success())
+        self.assertEqual(self.dsl.count_booked_slots(), 0)
+
+    def test_booking_actions_stay_within_latency_budgets(self):
+        """
+        Test that viewing, booking and checking a slot stay within their latency budgets.
+        """
+        self.dsl.set_latency_budget("visit_booking_page", 500)
+        self.dsl.set_latency_budget("submit_appointment", 250)
+        self.dsl.set_latency_budget("verify_time_slot_is_disabled", 100)
+        
+        # Use a future date (19 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=19)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+        
+        for time_str in ("09:00", "10:00", "11:00"):
+            self.assertTrue(self.dsl.visit_booking_page())
+            self.dsl.select_appointment_time(f"{date_str}T{time_str}")
+            self.dsl.submit_appointment()
+            self.assertTrue(self.dsl.verify_time_slot_is_disabled(date_str, time_str))
+        
+        self.assertTrue(self.dsl.verify_within_latency_budgets(), self.dsl.timing_report())
+
+    def test_backup_while_taking_bookings(self):
+        """
+        Test that a backup can be taken without stopping bookings.
+        """
+        # Use a future date (20 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=20)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+        
+        for time_str in ("09:00", "10:00"):
+            self.dsl.select_appointment_time(f"{date_str}T{time_str}")
+            self.dsl.submit_appointment()
+        
+        self.assertTrue(self.dsl.back_up_bookings())
+        self.assertTrue(self.dsl.verify_backup_holds(2))
+        
+        # Booking goes on as normal afterwards
+        self.dsl.select_appointment_time(f"{date_str}T11:00")
+        self.dsl.submit_appointment()
+        self.assertTrue(self.dsl.verify_appointment_success())
+
+    def test_customers_racing_for_one_slot(self):
+        """
+        Test that when many customers submit the same slot at once, only the slot's capacity is booked.
+        """
+        # Use a future date (21 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=21)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        appointment_time = future_date.strftime("%Y-%m-%dT14:00")
+        customers = 30
+        
+        async def book_at_once():
+            async with AsyncClientPool("http://localhost:8999", concurrency=customers) as pool:
+                async def customer():
+                    dsl = AppointmentDSL(AsyncWebAppDriver(pool))
+                    dsl.select_appointment_time(appointment_time)
+                    await dsl.submit_appointment()
+                    return dsl.verify_appointment_success()
+                return await asyncio.gather(*(customer() for _ in range(customers)))
+        
+        successes = sum(asyncio.run(book_at_once()))
+        self.assertEqual(successes, self.driver.get_rules().capacity)
+        self.assertEqual(self.dsl.count_booked_slots(), successes)
+
+    def test_page_is_sent_compressed(self):
+        """
+        Test that the booking page is sent gzip-compressed, before and after a booking changes it.
+        """
+        self.assertTrue(self.dsl.verify_page_is_sent_compressed())
+        
+        # Use a future date (22 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=22)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        self.dsl.select_appointment_time(future_date.strftime("%Y-%m-%dT09:00"))
+        self.dsl.submit_appointment()
+        self.assertTrue(self.dsl.verify_appointment_success())
+        self.assertTrue(self.dsl.verify_page_is_sent_compressed())
+        self.assertTrue(self.dsl.verify_all_booked_slots_disabled())
+
+    def test_dsl_with_async_driver(self):
+        """
+        Test that the domain actions work unchanged against the asyncio driver.
+        """
+        # Use a future date (23 days ahead to avoid conflicts)
+        future_date = datetime.now() + timedelta(days=23)
+        if future_date.weekday() == 6:  # Skip Sunday
+            future_date += timedelta(days=1)
+        date_str = future_date.strftime("%Y-%m-%d")
+
+        async def customer_and_staff():
+            async with AsyncClientPool("http://localhost:8999") as pool:
+                dsl = AppointmentDSL(AsyncWebAppDriver(pool))
+                watcher = AppointmentDSL(AsyncWebAppDriver(pool))
+                self.assertTrue(await watcher.watch_for_slot_updates())
+                self.assertTrue(await dsl.visit_booking_page())
+                self.assertTrue(await dsl.verify_page_is_sent_compressed())
+                for time_str in ("09:00", "10:00"):
+                    dsl.select_appointment_time(f"{date_str}T{time_str}")
+                    dsl.enter_appointment_details("Async customer delivery")
+                    await dsl.submit_appointment()
+                    self.assertTrue(dsl.verify_appointment_success())
+                self.assertEqual(await dsl.count_booked_slots(), 2)
+                self.assertTrue(await watcher.verify_slot_update_received("book", f"{date_str}T09:00"))
+                self.assertTrue(await dsl.verify_all_booked_slots_disabled())
+                self.assertTrue(await dsl.verify_time_slot_is_disabled(date_str, "09:00"))
+                self.assertTrue(await dsl.verify_past_date_is_disabled())
+                self.assertTrue(await dsl.verify_sunday_is_disabled())
+                self.assertTrue(await dsl.verify_tomorrow_is_default_selection())
+                self.assertEqual(await dsl.search_bookings("async customer"),
+                                 [f"{date_str}T09:00", f"{date_str}T10:00"])
+                self.assertEqual((await dsl.check_day_utilization(date_str))[0], 2)
+                self.assertEqual(await dsl.check_hour_utilization(date_str, 10), 1)
+                self.assertEqual(await dsl.fetch_dispatch_schedule(date_str), 200)
+                self.assertTrue(dsl.verify_dispatch_schedule_includes("Async customer delivery"))
+                self.assertTrue(await dsl.back_up_bookings())
+                self.assertTrue(await dsl.verify_backup_holds(2))
+                await dsl.reschedule_appointment(f"{date_str}T10:00", f"{date_str}T11:00")
+                self.assertTrue(dsl.verify_appointment_success())
+                await dsl.cancel_appointment(f"{date_str}T09:00")
+                self.assertTrue(dsl.verify_appointment_success())
+                self.assertEqual(await dsl.count_booked_slots(), 1)
+                return dsl
+
+        dsl = asyncio.run(customer_and_staff())
+        # Each action was timed once, its driver round-trips included
+        timed_actions = [action for action, _ in dsl.timings]
+        self.assertEqual(timed_actions.count("count_booked_slots"), 2)
+        self.assertEqual(timed_actions.count("verify_tomorrow_is_default_selection"), 1)
+        self.assertEqual(self.dsl.count_booked_slots(), 1)
+
 if __name__ == '__main__':
     unittest.main()
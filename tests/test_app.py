@@ -0,0 +1,560 @@
+# tests/test_app.py
+import importlib.util
+import json
+import os
+import queue
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app')
+# app.py imports its sibling modules by name, as when it runs as a script.
+# The directory is on the path only while it loads, or app.py would shadow
+# the `app` package the driver and the other tests import from.
+sys.path.insert(0, APP_DIR)
+try:
+    _spec = importlib.util.spec_from_file_location('scheduler', os.path.join(APP_DIR, 'app.py'))
+    scheduler = importlib.util.module_from_spec(_spec)
+    _spec.loader.exec_module(scheduler)
+finally:
+    sys.path.remove(APP_DIR)
+
+class AppTestCase(unittest.TestCase):
+    """
+    Runs the app in-process on a fresh database in a temporary directory, for
+    behaviour the acceptance tests cannot reach through a running server.
+    Subclasses can change the slot capacity and length, and the slot store.
+    """
+    capacity = 1
+    slot_minutes = 60
+    slot_store = 'sqlite'
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        rules = scheduler.BookingRules(self.capacity, self.slot_minutes,
+                                       scheduler.FIRST_SLOT_HOUR, scheduler.LAST_SLOT_HOUR)
+        for name, value in (('DATABASE', os.path.join(self.tmp, 'appointments.db')),
+                            ('ARCHIVE_DIR', os.path.join(self.tmp, 'archive')),
+                            ('SLOT_STORE', self.slot_store),
+                            ('SLOT_CAPACITY', self.capacity),
+                            ('SLOT_MINUTES', self.slot_minutes),
+                            ('RULES', rules)):
+            patcher = mock.patch.object(scheduler, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        # The snapshot of the previous test's database must not be reused
+        scheduler._booked_snapshot = None
+        scheduler.setup()
+        # Let the in-memory store's checkpoint thread stop with the test
+        self.addCleanup(scheduler._forget_slot_store)
+        self.client = scheduler.app.test_client()
+
+    def book(self, appointment_time, details="Details"):
+        # Book straight into the database, past dates included.
+        booked = scheduler.book_in_database(datetime.fromisoformat(appointment_time), appointment_time, details)
+        scheduler.bump_generation()
+        return booked
+
+    def booked_slots(self):
+        return self.client.get('/api/booked-slots').get_json()
+
+    def submit(self, appointment_time, details="Details"):
+        # Book through the booking form, rules and all.
+        return self.client.post('/', data={"appointment_time": appointment_time, "details": details})
+
+    def enabled_slots(self, day):
+        # Time -> whether the page enables that slot, from /api/ui-state.
+        state = self.client.get(f"/api/ui-state?date={day.strftime('%Y-%m-%d')}").get_json()
+        return {slot["time"]: slot["enabled"] for slot in state["slots"]}
+
+    def future_day(self, days=7):
+        # A bookable day at least `days` ahead, skipping Sunday.
+        day = datetime.now() + timedelta(days=days)
+        if day.weekday() == 6:
+            day += timedelta(days=1)
+        return day.replace(hour=0, minute=0, second=0, microsecond=0)
+
+class TestSlotCapacity(AppTestCase):
+    """
+    Tests for slots that take more than one appointment.
+    """
+    capacity = 2
+
+    def test_slot_takes_capacity_bookings(self):
+        """
+        Test that a slot takes exactly SLOT_CAPACITY bookings.
+        """
+        appointment_time = self.future_day().replace(hour=9).strftime('%Y-%m-%dT%H:%M')
+        self.assertEqual(self.submit(appointment_time, "First van").status_code, 302)
+        self.assertEqual(self.submit(appointment_time, "Second van").status_code, 302)
+        response = self.submit(appointment_time, "No van left")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"Time slot already booked", response.data)
+        self.assertEqual(len(self.booked_slots()), 2)
+
+    def test_reserve_slot_stops_at_capacity(self):
+        """
+        Test that reserve_slot refuses the place after the last one and frees it again.
+        """
+        slot = self.future_day().replace(hour=9)
+        conn = sqlite3.connect(scheduler.DATABASE)
+        c = conn.cursor()
+        self.assertTrue(scheduler.reserve_slot(c, slot))
+        self.assertTrue(scheduler.reserve_slot(c, slot.replace(minute=30)))
+        self.assertFalse(scheduler.reserve_slot(c, slot))
+        scheduler.free_slot(c, slot)
+        self.assertTrue(scheduler.reserve_slot(c, slot))
+        conn.close()
+
+    def test_full_slot_is_disabled(self):
+        """
+        Test that the page disables a slot only once all its places are taken.
+        """
+        day = self.future_day()
+        appointment_time = day.replace(hour=9).strftime('%Y-%m-%dT%H:%M')
+        self.submit(appointment_time)
+        self.assertTrue(self.enabled_slots(day)["09:00"])
+        self.submit(appointment_time)
+        self.assertFalse(self.enabled_slots(day)["09:00"])
+
+class TestHalfHourSlots(AppTestCase):
+    """
+    Tests for 30-minute slots.
+    """
+    slot_minutes = 30
+
+    def test_half_hours_are_separate_slots(self):
+        """
+        Test that back-to-back half-hour slots can both be booked.
+        """
+        day = self.future_day()
+        self.assertEqual(self.submit(day.replace(hour=10).strftime('%Y-%m-%dT%H:%M')).status_code, 302)
+        self.assertEqual(self.submit(day.replace(hour=10, minute=30).strftime('%Y-%m-%dT%H:%M')).status_code, 302)
+        self.assertEqual(len(self.booked_slots()), 2)
+
+    def test_booking_inside_a_taken_slot_is_refused(self):
+        """
+        Test that a time inside an already booked half hour is refused.
+        """
+        day = self.future_day()
+        self.assertEqual(self.submit(day.replace(hour=10, minute=30).strftime('%Y-%m-%dT%H:%M')).status_code, 302)
+        response = self.submit(day.replace(hour=10, minute=45).strftime('%Y-%m-%dT%H:%M'))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"Time slot already booked", response.data)
+
+    def test_page_offers_half_hour_slots(self):
+        """
+        Test that the page state lists every half hour and disables only the booked one.
+        """
+        day = self.future_day()
+        self.submit(day.replace(hour=10, minute=30).strftime('%Y-%m-%dT%H:%M'))
+        slots = self.enabled_slots(day)
+        self.assertEqual(len(slots), 2 * (scheduler.LAST_SLOT_HOUR - scheduler.FIRST_SLOT_HOUR + 1))
+        self.assertFalse(slots["10:30"])
+        self.assertTrue(slots["10:00"])
+        self.assertTrue(slots["11:00"])
+
+class TestHolds(AppTestCase):
+    """
+    Tests for slot holds racing bookings.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.appointment_time = self.future_day().replace(hour=9).strftime('%Y-%m-%dT%H:%M')
+        scheduler.clear_holds()
+        self.addCleanup(scheduler.clear_holds)
+
+    def hold(self, appointment_time):
+        return self.client.post('/api/holds', data={"appointment_time": appointment_time})
+
+    def test_hold_refused_on_slot_booked_behind_snapshot(self):
+        """
+        Test that a slot booked by another worker is not held while this worker's snapshot lags.
+        """
+        scheduler.get_snapshot()
+        # Booked without bumping the generation, as seen before the snapshot catches up
+        self.assertTrue(scheduler.book_in_database(datetime.fromisoformat(self.appointment_time),
+                                                   self.appointment_time, "Other worker"))
+        self.assertEqual(scheduler.get_snapshot().counts, {})
+        response = self.hold(self.appointment_time)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"Time slot is not available", response.data)
+
+    def test_held_slot_is_refused_to_others(self):
+        """
+        Test that a held slot can be booked by its holder only.
+        """
+        hold_id = self.hold(self.appointment_time).get_json()["hold_id"]
+        response = self.submit(self.appointment_time, "Someone else")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"Time slot is temporarily held", response.data)
+        self.assertFalse(scheduler.book_in_database(datetime.fromisoformat(self.appointment_time),
+                                                    self.appointment_time, "Someone else"))
+
+        response = self.client.post('/', data={"appointment_time": self.appointment_time,
+                                               "details": "Holder", "hold_id": hold_id})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(self.booked_slots()), 1)
+
+    def test_hold_does_not_exceed_capacity_with_booking(self):
+        """
+        Test that once a slot is booked it can no longer be held.
+        """
+        self.assertEqual(self.submit(self.appointment_time).status_code, 302)
+        self.assertEqual(self.hold(self.appointment_time).status_code, 400)
+
+    def test_hold_from_another_worker_is_counted(self):
+        """
+        Test that a hold placed by another worker blocks the slot here and can be released here.
+        """
+        conn = scheduler.state_db()
+        conn.execute("INSERT INTO holds (hold_id, slot_start, expires_at) VALUES ('other', ?, ?)",
+                     (self.appointment_time, time.time() + 60))
+        conn.commit()
+        conn.close()
+        response = self.submit(self.appointment_time, "Someone else")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(b"Time slot is temporarily held", response.data)
+        self.assertEqual(self.hold(self.appointment_time).status_code, 400)
+
+        self.assertEqual(self.client.delete('/api/holds/other').status_code, 200)
+        self.assertEqual(self.submit(self.appointment_time).status_code, 302)
+
+    def test_expired_hold_is_published_once(self):
+        """
+        Test that the release of a hold that expired, placed by any worker, is published once.
+        """
+        conn = scheduler.state_db()
+        conn.execute("INSERT INTO holds (hold_id, slot_start, expires_at) VALUES ('other', ?, ?)",
+                     (self.appointment_time, time.time() - 1))
+        conn.commit()
+        conn.close()
+        events = queue.Queue()
+        with mock.patch.object(scheduler, '_subscribers', {events}), \
+                mock.patch.object(scheduler, '_holds_checked_at', time.time() - 2):
+            scheduler.publish_expired_holds()
+            scheduler.publish_expired_holds()
+        self.assertEqual(json.loads(events.get_nowait()),
+                         {"op": "release", "slot": datetime.fromisoformat(self.appointment_time).isoformat()})
+        self.assertTrue(events.empty())
+
+class TestIdempotency(AppTestCase):
+    """
+    Tests for replaying booking POSTs that repeat an idempotency key.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.appointment_time = self.future_day().replace(hour=9).strftime('%Y-%m-%dT%H:%M')
+
+    def submit(self, appointment_time, details="Details", key="key-1"):
+        return self.client.post('/', data={"appointment_time": appointment_time, "details": details},
+                                headers={"Idempotency-Key": key})
+
+    def test_retry_is_replayed(self):
+        """
+        Test that a retry gets the original response without booking again, and a reused key is refused.
+        """
+        first = self.submit(self.appointment_time)
+        self.assertEqual(first.status_code, 302)
+        retry = self.submit(self.appointment_time)
+        self.assertEqual(retry.status_code, 302)
+        self.assertEqual(retry.headers["Location"], first.headers["Location"])
+        self.assertEqual(len(self.booked_slots()), 1)
+        self.assertEqual(self.submit(self.appointment_time, "Other details").status_code, 422)
+
+    def test_abandoned_key_is_reused(self):
+        """
+        Test that a key left running by a worker that died is taken over once it is old enough.
+        """
+        conn = scheduler.state_db()
+        conn.execute("INSERT INTO idempotency_keys (path, key, stored_at, fingerprint) VALUES ('/', 'key-1', ?, '[]')",
+                     (time.time() - scheduler.IDEMPOTENCY_IN_FLIGHT_SECONDS - 1,))
+        conn.commit()
+        conn.close()
+        self.assertEqual(self.submit(self.appointment_time).status_code, 302)
+        self.assertEqual(len(self.booked_slots()), 1)
+
+    def test_oldest_keys_are_trimmed(self):
+        """
+        Test that only the newest IDEMPOTENCY_CACHE_SIZE responses are kept.
+        """
+        day = self.future_day()
+        with mock.patch.object(scheduler, 'IDEMPOTENCY_CACHE_SIZE', 2):
+            for hour, key in ((9, "key-1"), (10, "key-2"), (11, "key-3")):
+                self.assertEqual(self.submit(day.replace(hour=hour).strftime('%Y-%m-%dT%H:%M'), key=key).status_code,
+                                 302)
+        conn = scheduler.state_db()
+        keys = [key for key, in conn.execute("SELECT key FROM idempotency_keys ORDER BY stored_at")]
+        conn.close()
+        self.assertEqual(keys, ["key-2", "key-3"])
+
+class TestSnapshotOrdering(AppTestCase):
+    """
+    Tests for keeping the read snapshot in commit order when writes bump the
+    generation out of order or come from other workers.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.day = self.future_day()
+        self.snapshot = scheduler.get_snapshot()
+
+    def appointment_id(self, seq):
+        conn = sqlite3.connect(scheduler.DATABASE)
+        appointment_id = conn.execute("SELECT appointment_id FROM changes WHERE seq = ?", (seq,)).fetchone()[0]
+        conn.close()
+        return appointment_id
+
+    def test_bumps_out_of_commit_order(self):
+        """
+        Test that two bookings bumping the generation in reverse commit order both show up.
+        """
+        first, second = self.day.replace(hour=9), self.day.replace(hour=10)
+        first_seq = scheduler.book_in_database(first, first.strftime('%Y-%m-%dT%H:%M'), "First")
+        second_seq = scheduler.book_in_database(second, second.strftime('%Y-%m-%dT%H:%M'), "Second")
+        scheduler.patch_snapshot(scheduler.bump_generation(), (second_seq,), added=(second,))
+        scheduler.patch_snapshot(scheduler.bump_generation(), (first_seq,), added=(first,))
+        self.assertEqual(sorted(self.booked_slots()), [first.isoformat(), second.isoformat()])
+
+    def test_cancel_bumping_before_its_booking(self):
+        """
+        Test that a cancel whose patch arrives before its booking's leaves the slot free.
+        """
+        slot = self.day.replace(hour=9)
+        seq = scheduler.book_in_database(slot, slot.strftime('%Y-%m-%dT%H:%M'), "Cancelled")
+        self.assertEqual(self.client.delete(f"/api/appointments/{self.appointment_id(seq)}").status_code, 200)
+        scheduler.patch_snapshot(scheduler.bump_generation(), (seq,), added=(slot,))
+        self.assertEqual(self.booked_slots(), [])
+        self.assertTrue(self.enabled_slots(self.day)["09:00"])
+
+    def test_other_workers_writes_are_caught_up(self):
+        """
+        Test that another worker's booking is read from the change feed, not by reloading every month.
+        """
+        earlier = self.day.replace(hour=9) + timedelta(days=62)
+        self.book(earlier.strftime('%Y-%m-%dT%H:%M'))
+        before = scheduler.get_snapshot()
+        # Booked and bumped by another worker, so never patched here
+        slot = self.day.replace(hour=11)
+        scheduler.book_in_database(slot, slot.strftime('%Y-%m-%dT%H:%M'), "Other worker")
+        scheduler.bump_generation()
+        with mock.patch.object(scheduler, 'list_partitions', side_effect=AssertionError("full reload")):
+            after = scheduler.get_snapshot()
+        self.assertIn(slot.isoformat(), self.booked_slots())
+        month = earlier.strftime('%Y-%m')
+        self.assertIs(after.months[month], before.months[month])
+
+class TestRescheduleAcrossMonths(AppTestCase):
+    """
+    Tests for keeping an appointment's id when it moves to another month.
+    """
+
+    def setUp(self):
+        super().setUp()
+        day = self.future_day(40)
+        later = self.future_day(75)
+        self.first, self.later = day.replace(hour=9), later.replace(hour=9)
+        self.assertEqual(self.submit(self.first.strftime('%Y-%m-%dT%H:%M')).status_code, 302)
+        self.appointment_id = self.client.get('/api/changes').get_json()["changes"][-1]["id"]
+
+    def reschedule(self, appointment_id, slot):
+        return self.client.post(f"/api/appointments/{appointment_id}/reschedule",
+                                data={"appointment_time": slot.strftime('%Y-%m-%dT%H:%M')})
+
+    def test_move_keeps_id(self):
+        """
+        Test that a booking moved to another month and back keeps its id, and replicas see one id.
+        """
+        since = self.client.get('/api/changes').get_json()["last_seq"]
+        response = self.reschedule(self.appointment_id, self.later)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["id"], self.appointment_id)
+        changes = self.client.get(f'/api/changes?since={since}').get_json()["changes"]
+        self.assertEqual([(change["op"], change["id"]) for change in changes],
+                         [("delete", self.appointment_id), ("insert", self.appointment_id)])
+        # Moving again, back to its first month, uses the same id
+        self.assertEqual(self.reschedule(self.appointment_id, self.first.replace(hour=10)).get_json()["id"],
+                         self.appointment_id)
+        self.assertEqual(self.booked_slots(), [self.first.replace(hour=10).isoformat()])
+
+    def test_moved_booking_can_be_cancelled_by_id(self):
+        """
+        Test that a booking moved to another month is cancelled by the id it was booked with.
+        """
+        self.assertEqual(self.reschedule(self.appointment_id, self.later).status_code, 200)
+        self.assertEqual(self.client.delete(f"/api/appointments/{self.appointment_id}").status_code, 200)
+        self.assertEqual(self.booked_slots(), [])
+        self.assertEqual(self.client.delete(f"/api/appointments/{self.appointment_id}").status_code, 404)
+
+    def test_move_leaves_new_months_ids_alone(self):
+        """
+        Test that a booking moved into an earlier month does not move that month's ids into its own range.
+        """
+        self.assertEqual(self.submit(self.later.strftime('%Y-%m-%dT%H:%M')).status_code, 302)
+        later_id = self.client.get('/api/changes').get_json()["changes"][-1]["id"]
+        self.assertEqual(self.reschedule(later_id, self.first.replace(hour=11)).status_code, 200)
+        self.assertEqual(self.submit(self.first.replace(hour=12).strftime('%Y-%m-%dT%H:%M')).status_code, 302)
+        new_id = self.client.get('/api/changes').get_json()["changes"][-1]["id"]
+        self.assertEqual(scheduler.partition_for_id(new_id), scheduler.partition_name(self.first))
+
+class TestMemoryStoreSnapshot(AppTestCase):
+    """
+    Tests for catching the read snapshot up with the in-memory slot store
+    without reloading every month.
+    """
+    capacity = 2
+    slot_store = 'memory'
+
+    def setUp(self):
+        super().setUp()
+        self.day = self.future_day()
+        self.store = scheduler.slot_store()
+        scheduler.get_snapshot()
+
+    def journal(self, slot, details="Other request"):
+        # Book in the store and bump without patching the snapshot, as a
+        # booking whose bump came out of order.
+        appointment_time = slot.strftime('%Y-%m-%dT%H:%M')
+        self.assertTrue(self.store.book(scheduler.RULES.slot_key(slot), appointment_time, details))
+        scheduler.bump_generation()
+
+    def caught_up_slots(self):
+        with mock.patch.object(scheduler, 'list_partitions', side_effect=AssertionError("full reload")):
+            return sorted(self.booked_slots())
+
+    def test_journal_and_checkpoints_are_caught_up(self):
+        """
+        Test that journalled bookings, checkpointed or not, are caught up once each.
+        """
+        first, second, third = (self.day.replace(hour=hour) for hour in (9, 10, 11))
+        self.assertEqual(self.submit(first.strftime('%Y-%m-%dT%H:%M')).status_code, 302)
+        self.journal(second)
+        scheduler.checkpoint_slot_store()
+        self.journal(third)
+        self.assertEqual(self.caught_up_slots(), [first.isoformat(), second.isoformat(), third.isoformat()])
+        scheduler.checkpoint_slot_store()
+        self.assertEqual(self.caught_up_slots(), [first.isoformat(), second.isoformat(), third.isoformat()])
+
+    def test_clear_drops_earlier_journal_bookings(self):
+        """
+        Test that a clear drops journalled bookings made before it and keeps those made after it.
+        """
+        before, after = self.day.replace(hour=9), self.day.replace(hour=10)
+        self.journal(before)
+        self.assertEqual(self.client.post('/api/clear-slots').status_code, 200)
+        self.journal(after)
+        self.assertEqual(self.caught_up_slots(), [after.isoformat()])
+
+class TestDetachPartition(AppTestCase):
+    """
+    Tests for moving a finished month's partition into an archive file.
+    """
+
+    def setUp(self):
+        super().setUp()
+        # A month that is over, and one booking that stays live
+        first_of_month = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        self.month = (first_of_month - timedelta(days=40)).replace(day=1)
+        self.past = [self.month.replace(day=10, hour=9).strftime('%Y-%m-%dT%H:%M'),
+                     self.month.replace(day=10, hour=10).strftime('%Y-%m-%dT%H:%M')]
+        self.future = (first_of_month + timedelta(days=70)).replace(day=10, hour=9).strftime('%Y-%m-%dT%H:%M')
+        for appointment_time in self.past:
+            self.assertTrue(self.book(appointment_time, "Archived customer"))
+        self.assertTrue(self.book(self.future, "Live customer"))
+        self.detach_url = f"/api/admin/partitions/{self.month.strftime('%Y-%m')}/detach"
+        self.archive = os.path.join(scheduler.ARCHIVE_DIR, f"appointments-{self.month.strftime('%Y-%m')}.db")
+
+    def test_detached_bookings_disappear(self):
+        """
+        Test that a detached month's bookings leave listings, search and slot occupancy.
+        """
+        since = self.client.get('/api/changes').get_json()["last_seq"]
+        response = self.client.post(self.detach_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["appointments"], 2)
+        # Replicas see the month go in one change
+        changes = self.client.get(f'/api/changes?since={since}').get_json()["changes"]
+        self.assertEqual([(change["op"], change["appointment_time"]) for change in changes],
+                         [("detach", self.month.isoformat())])
+
+        self.assertEqual(self.booked_slots(), [datetime.fromisoformat(self.future).isoformat()])
+        results = self.client.get('/api/appointments/search?q=customer').get_json()["results"]
+        self.assertEqual([result["details"] for result in results], ["Live customer"])
+        counts = scheduler.get_snapshot().counts
+        for appointment_time in self.past:
+            self.assertNotIn(appointment_time, counts)
+        conn = sqlite3.connect(scheduler.DATABASE)
+        self.assertEqual(conn.execute("SELECT slot_start FROM slot_counts").fetchall(), [(self.future,)])
+        conn.close()
+
+        conn = sqlite3.connect(self.archive)
+        name = scheduler.partition_name(self.month)
+        self.assertEqual(conn.execute(f"SELECT COUNT(*) FROM {name}").fetchone()[0], 2)
+        conn.close()
+
+    def test_failed_detach_leaves_no_archive(self):
+        """
+        Test that a detach failing after the archive is attached changes nothing.
+        """
+        scheduler.app.testing = True
+        self.addCleanup(setattr, scheduler.app, 'testing', False)
+        # Fail the transaction once the archive holds a copy of the month
+        conn = sqlite3.connect(scheduler.DATABASE)
+        conn.execute('''CREATE TRIGGER fail_detach BEFORE DELETE ON slot_counts BEGIN
+                          SELECT RAISE(ABORT, 'disk full');
+                        END''')
+        conn.commit()
+        with self.assertRaises(sqlite3.DatabaseError):
+            self.client.post(self.detach_url)
+        self.assertFalse(os.path.exists(self.archive))
+        conn.execute("DROP TRIGGER fail_detach")
+        conn.commit()
+        conn.close()
+        self.assertEqual(len(self.booked_slots()), 3)
+
+        self.assertEqual(self.client.post(self.detach_url).status_code, 200)
+        self.assertEqual(len(self.booked_slots()), 1)
+
+    def test_moved_booking_outlives_its_first_month(self):
+        """
+        Test that a booking moved out of a month keeps its id after that month is detached.
+        """
+        later = (datetime.fromisoformat(self.future) + timedelta(days=1)).strftime('%Y-%m-%dT%H:%M')
+        conn = sqlite3.connect(scheduler.DATABASE)
+        appointment_id = conn.execute(f"SELECT id FROM {scheduler.partition_name(self.month)} "
+                                      "WHERE appointment_time = ?", (self.past[0],)).fetchone()[0]
+        conn.close()
+        # Moved straight in the database: the rules refuse the past month it comes from
+        c_conn = sqlite3.connect(scheduler.DATABASE)
+        c = c_conn.cursor()
+        c.execute(f"DELETE FROM {scheduler.partition_name(self.month)} WHERE id = ?", (appointment_id,))
+        scheduler.move_appointment(c, appointment_id, later, "Archived customer")
+        c_conn.commit()
+        c_conn.close()
+
+        self.assertEqual(self.client.post(self.detach_url).get_json()["appointments"], 1)
+        results = self.client.get('/api/appointments/search?q=archived').get_json()["results"]
+        self.assertEqual([result["id"] for result in results], [appointment_id])
+        self.assertEqual(self.client.delete(f"/api/appointments/{appointment_id}").status_code, 200)
+
+    def test_book_after_another_worker_detached(self):
+        """
+        Test that booking into a month detached behind this worker's back recreates its partition.
+        """
+        self.assertEqual(self.client.post(self.detach_url).status_code, 200)
+        # Another worker did the detach, so this one still thinks it exists
+        scheduler._known_partitions.add(scheduler.partition_name(self.month))
+        appointment_time = self.month.replace(day=11, hour=9).strftime('%Y-%m-%dT%H:%M')
+        self.assertTrue(self.book(appointment_time))
+        self.assertIn(datetime.fromisoformat(appointment_time).isoformat(), self.booked_slots())
+
+if __name__ == '__main__':
+    unittest.main()
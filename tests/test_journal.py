@@ -0,0 +1,143 @@
+# tests/test_journal.py
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from app.journal import SlotJournal, JournalError
+
+class TestSlotJournal(unittest.TestCase):
+    """
+    Unit tests for the in-memory slot store's journal: replay after a crash,
+    checkpoints and rolling back bookings that could not be made durable.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        self.path = os.path.join(self.tmp, 'appointments.db.journal')
+        # Stand-in for the database: checkpointed bookings and their lsn
+        self.stored = []
+        self.stored_lsn = 0
+
+    def open_store(self, capacity=1):
+        # Open a store the way the app does after a restart: from the
+        # database's slot counts and checkpointed lsn.
+        counts = {}
+        for appointment_time, _ in self.stored:
+            counts[appointment_time] = counts.get(appointment_time, 0) + 1
+        store = SlotJournal(self.path, capacity)
+        store.open(counts, self.stored_lsn)
+        return store
+
+    def write(self, bookings, lsn):
+        self.stored.extend((appointment_time, details) for _, appointment_time, details in bookings)
+        self.stored_lsn = lsn
+
+    def book(self, store, appointment_time, details="Details"):
+        # The tests use the appointment time as its slot key
+        return store.book(appointment_time, appointment_time, details)
+
+    def test_replay_after_crash(self):
+        """
+        Test that bookings only in the journal come back after a crash.
+        """
+        store = self.open_store(capacity=2)
+        self.assertTrue(self.book(store, "2030-01-07T09:00", "First"))
+        self.assertTrue(self.book(store, "2030-01-07T09:00", "Second"))
+        self.assertTrue(self.book(store, "2030-01-07T10:00", "Third"))
+
+        replayed = self.open_store(capacity=2)
+        self.assertEqual(replayed.counts, store.counts)
+        self.assertEqual(replayed.pending, store.pending)
+        self.assertEqual(replayed.lsn, 3)
+        self.assertFalse(self.book(replayed, "2030-01-07T09:00"))
+
+    def test_torn_record_is_cut_off(self):
+        """
+        Test that a record only partly written before a crash is dropped on replay.
+        """
+        store = self.open_store()
+        self.assertTrue(self.book(store, "2030-01-07T09:00"))
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(b'{"lsn": 2, "slot": "2030-01-07T1')
+
+        replayed = self.open_store()
+        self.assertEqual(replayed.counts, {"2030-01-07T09:00": 1})
+        self.assertEqual(replayed.lsn, 1)
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.assertTrue(self.book(replayed, "2030-01-07T10:00"))
+
+    def test_checkpoint_then_replay_matches(self):
+        """
+        Test that a store reopened after a checkpoint and more bookings is the store before the crash.
+        """
+        store = self.open_store()
+        self.book(store, "2030-01-07T09:00")
+        self.book(store, "2030-01-07T10:00")
+        self.assertEqual(store.checkpoint(self.write), 2)
+        self.assertEqual(os.path.getsize(self.path), 0)
+        self.book(store, "2030-01-07T11:00")
+
+        replayed = self.open_store()
+        self.assertEqual(replayed.counts, store.counts)
+        self.assertEqual(replayed.pending, store.pending)
+        self.assertEqual(replayed.lsn, store.lsn)
+
+    def test_crash_before_journal_is_emptied(self):
+        """
+        Test that replay skips bookings a checkpoint stored before the journal was truncated.
+        """
+        store = self.open_store()
+        self.book(store, "2030-01-07T09:00")
+        self.book(store, "2030-01-07T10:00")
+        shutil.copy(self.path, self.path + '.before')
+        store.checkpoint(self.write)
+        # The crash came after the database commit but before the truncation
+        shutil.copy(self.path + '.before', self.path)
+
+        replayed = self.open_store()
+        self.assertEqual(replayed.pending, [])
+        self.assertEqual(replayed.counts, store.counts)
+        self.assertEqual(replayed.checkpoint(self.write), 0)
+        self.assertEqual(len(self.stored), 2)
+
+    def test_failed_fsync_rolls_the_booking_back(self):
+        """
+        Test that a booking whose fsync fails is neither counted nor checkpointed.
+        """
+        store = self.open_store()
+        self.assertTrue(self.book(store, "2030-01-07T09:00"))
+        size = os.path.getsize(self.path)
+
+        with mock.patch('app.journal.os.fsync', side_effect=OSError("disk gone")):
+            with self.assertRaises(JournalError):
+                self.book(store, "2030-01-07T10:00")
+        self.assertEqual(store.counts, {"2030-01-07T09:00": 1})
+        self.assertEqual([booking[2] for booking in store.pending], ["2030-01-07T09:00"])
+        self.assertEqual(store.rolled_back, 1)
+        self.assertEqual(os.path.getsize(self.path), size)
+
+        # The slot is free again and the store keeps working
+        self.assertTrue(self.book(store, "2030-01-07T10:00"))
+        store.checkpoint(self.write)
+        self.assertEqual([appointment_time for appointment_time, _ in self.stored],
+                         ["2030-01-07T09:00", "2030-01-07T10:00"])
+
+    def test_failed_fsync_is_not_replayed(self):
+        """
+        Test that a rolled back booking does not come back after a restart.
+        """
+        store = self.open_store()
+        self.book(store, "2030-01-07T09:00")
+        with mock.patch('app.journal.os.fsync', side_effect=OSError("disk gone")):
+            with self.assertRaises(JournalError):
+                self.book(store, "2030-01-07T10:00")
+
+        replayed = self.open_store()
+        self.assertEqual(replayed.counts, {"2030-01-07T09:00": 1})
+        self.assertEqual(len(replayed.pending), 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+# tests/test_rules.py
+import unittest
+from datetime import date, datetime, timedelta
+from app.rules import BookingRules, PAST, SUNDAY, CLOSED, FULL
+
+# A fixed "now": Friday 2030-05-31 at noon. The next day is the last
+# Saturday of May, the one after it a Sunday and then June starts.
+NOW = datetime(2030, 5, 31, 12, 0)
+
+class TestBookingRules(unittest.TestCase):
+    """
+    Unit tests for the booking rules shared by the app, the driver and the DSL.
+    """
+
+    def setUp(self):
+        self.rules = BookingRules(capacity=2, slot_minutes=60, first_slot_hour=8, last_slot_hour=20)
+        self.half_hours = BookingRules(capacity=1, slot_minutes=30, first_slot_hour=8, last_slot_hour=20)
+
+    def test_evaluate_reasons(self):
+        """
+        Test that evaluate gives each candidate the first rule it breaks.
+        """
+        counts = {"2030-06-03T10:00": 2, "2030-06-03T11:00": 1}
+        candidates = [
+            datetime(2030, 5, 31, 15, 0),   # today
+            datetime(2030, 5, 30, 15, 0),   # yesterday
+            datetime(2030, 6, 2, 10, 0),    # Sunday
+            datetime(2030, 6, 3, 7, 0),     # before the first slot
+            datetime(2030, 6, 3, 21, 0),    # after the last slot starts
+            datetime(2030, 6, 3, 10, 30),   # inside a full slot
+            datetime(2030, 6, 3, 11, 0),    # one place left
+            datetime(2030, 6, 1, 8, 0),     # tomorrow's first slot
+        ]
+        self.assertEqual(self.rules.evaluate(candidates, counts, NOW),
+                         [PAST, PAST, SUNDAY, CLOSED, CLOSED, FULL, None, None])
+
+    def test_evaluate_last_slot_of_the_day(self):
+        """
+        Test that the slot starting at the last slot hour is open and the one after it closed.
+        """
+        reasons = self.half_hours.evaluate([datetime(2030, 6, 3, 20, 0), datetime(2030, 6, 3, 20, 30),
+                                            datetime(2030, 6, 3, 21, 0)], now=NOW)
+        self.assertEqual(reasons, [None, None, CLOSED])
+
+    def test_evaluate_half_hour_slots(self):
+        """
+        Test that with 30-minute slots a booking fills only its own half hour.
+        """
+        counts = {"2030-06-03T10:30": 1}
+        reasons = self.half_hours.evaluate([datetime(2030, 6, 3, 10, 0), datetime(2030, 6, 3, 10, 45),
+                                            datetime(2030, 6, 3, 11, 0)], counts, NOW)
+        self.assertEqual(reasons, [None, FULL, None])
+
+    def test_slot_ordinals_are_consecutive(self):
+        """
+        Test that slot ordinals run on without gaps from the last slot of Saturday to Monday.
+        """
+        saturday_last = self.rules.slot_ordinal(datetime(2030, 6, 1, 20, 0))
+        monday_first = self.rules.slot_ordinal(datetime(2030, 6, 3, 8, 0))
+        self.assertEqual(monday_first, saturday_last + 1)
+        self.assertEqual(self.rules.slot_ordinal(datetime(2030, 6, 1, 19, 0)), saturday_last - 1)
+        self.assertEqual(self.rules.slot_from_ordinal(saturday_last), datetime(2030, 6, 1, 20, 0))
+        self.assertEqual(self.rules.slot_from_ordinal(monday_first), datetime(2030, 6, 3, 8, 0))
+
+    def test_slot_ordinal_of_unbookable_times(self):
+        """
+        Test that Sundays and times outside business hours have no ordinal.
+        """
+        self.assertIsNone(self.rules.slot_ordinal(datetime(2030, 6, 2, 12, 0)))
+        self.assertIsNone(self.rules.slot_ordinal(datetime(2030, 6, 3, 7, 59)))
+        self.assertIsNone(self.rules.slot_ordinal(datetime(2030, 6, 3, 21, 0)))
+        self.assertIsNotNone(self.rules.slot_ordinal(datetime(2030, 6, 3, 20, 59)))
+
+    def test_slot_ordinals_round_trip(self):
+        """
+        Test that every slot of a week maps to an ordinal and back, for hourly and half-hour slots.
+        """
+        for rules in (self.rules, self.half_hours):
+            for day in range(7):
+                monday = datetime(2030, 6, 3) + timedelta(days=day)
+                if monday.weekday() == 6:
+                    continue
+                for slot in rules.day_slots(monday):
+                    self.assertEqual(rules.slot_from_ordinal(rules.slot_ordinal(slot)), slot)
+                    self.assertEqual(rules.slot_ordinal(slot + timedelta(minutes=rules.slot_minutes - 1)),
+                                     rules.slot_ordinal(slot))
+
+    def test_first_slot_ordinal_from(self):
+        """
+        Test that the first slot at or after a time rounds up to the next slot start.
+        """
+        ordinal = self.half_hours.first_slot_ordinal_from
+        slot = self.half_hours.slot_ordinal
+        self.assertEqual(ordinal(datetime(2030, 6, 3, 10, 0)), slot(datetime(2030, 6, 3, 10, 0)))
+        self.assertEqual(ordinal(datetime(2030, 6, 3, 10, 0, 1)), slot(datetime(2030, 6, 3, 10, 30)))
+        self.assertEqual(ordinal(datetime(2030, 6, 3, 10, 31)), slot(datetime(2030, 6, 3, 11, 0)))
+        self.assertEqual(ordinal(datetime(2030, 6, 3, 5, 0)), slot(datetime(2030, 6, 3, 8, 0)))
+
+    def test_first_slot_ordinal_from_rolls_over(self):
+        """
+        Test that after the last slot the next one is on the following business day, past Sunday and month end.
+        """
+        ordinal = self.rules.first_slot_ordinal_from
+        slot = self.rules.slot_ordinal
+        # Friday evening after the last slot starts: Saturday morning
+        self.assertEqual(ordinal(datetime(2030, 5, 31, 20, 1)), slot(datetime(2030, 6, 1, 8, 0)))
+        # Saturday evening: Monday morning, in the next month
+        self.assertEqual(ordinal(datetime(2030, 5, 25, 20, 30)), slot(datetime(2030, 5, 27, 8, 0)))
+        self.assertEqual(ordinal(datetime(2030, 6, 1, 21, 0)), slot(datetime(2030, 6, 3, 8, 0)))
+        # Any time on Sunday: Monday morning
+        self.assertEqual(ordinal(datetime(2030, 6, 2, 9, 0)), slot(datetime(2030, 6, 3, 8, 0)))
+        # Year end
+        self.assertEqual(ordinal(datetime(2030, 12, 31, 23, 0)), slot(datetime(2031, 1, 1, 8, 0)))
+
+    def test_first_bookable_date(self):
+        """
+        Test that the first bookable date is tomorrow, or Monday when tomorrow is a Sunday.
+        """
+        self.assertEqual(self.rules.first_bookable_date(NOW), date(2030, 6, 1))
+        self.assertEqual(self.rules.first_bookable_date(datetime(2030, 6, 1, 9, 0)), date(2030, 6, 3))
+        self.assertEqual(self.rules.first_bookable_date(datetime(2030, 6, 2, 9, 0)), date(2030, 6, 3))
+        self.assertEqual(self.rules.first_bookable_date(datetime(2030, 6, 30, 23, 59)), date(2030, 7, 1))
+        self.assertEqual(self.rules.first_bookable_date(datetime(2030, 12, 31, 0, 0)), date(2031, 1, 1))
+
+    def test_slot_minutes_must_divide_an_hour(self):
+        """
+        Test that slot lengths that do not divide an hour are refused.
+        """
+        with self.assertRaises(ValueError):
+            BookingRules(slot_minutes=45)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+# tests/test_snapshot.py
+import unittest
+from datetime import datetime
+from app.rules import BookingRules
+from app.snapshot import BookedSnapshot
+
+class TestBookedSnapshot(unittest.TestCase):
+    """
+    Unit tests for the month-by-month read snapshot of booked slots.
+    """
+
+    def setUp(self):
+        self.rules = BookingRules(capacity=2)
+        self.slots = [datetime(2030, 6, 3, 9, 0), datetime(2030, 7, 1, 9, 0),
+                      datetime(2030, 6, 3, 9, 30), datetime(2030, 6, 4, 10, 0)]
+        self.snapshot = BookedSnapshot.build(1, 4, 0, self.rules, self.slots)
+
+    def assertSameAsRebuilt(self, snapshot, slots):
+        rebuilt = BookedSnapshot.build(snapshot.generation, snapshot.seq, snapshot.lsn, self.rules, slots)
+        self.assertEqual(snapshot.slots, rebuilt.slots)
+        self.assertEqual(snapshot.months, rebuilt.months)
+        self.assertEqual(dict(snapshot.counts), dict(rebuilt.counts))
+
+    def test_build_groups_by_month(self):
+        """
+        Test that slots are listed month by month, in booking order within a month.
+        """
+        self.assertEqual(self.snapshot.month_keys, ["2030-06", "2030-07"])
+        self.assertEqual(self.snapshot.slots, (datetime(2030, 6, 3, 9, 0), datetime(2030, 6, 3, 9, 30),
+                                               datetime(2030, 6, 4, 10, 0), datetime(2030, 7, 1, 9, 0)))
+        self.assertEqual(self.snapshot.counts, {"2030-06-03T09:00": 2, "2030-06-04T10:00": 1,
+                                                "2030-07-01T09:00": 1})
+        self.assertEqual(self.snapshot.counts.get("2030-08-01T09:00", 0), 0)
+
+    def test_patch_rebuilds_only_touched_months(self):
+        """
+        Test that a patch shares the months it does not touch with the old snapshot.
+        """
+        patched = self.snapshot.patched(2, [(True, datetime(2030, 7, 2, 10, 0))], seq=5)
+        self.assertIs(patched.months["2030-06"], self.snapshot.months["2030-06"])
+        self.assertIsNot(patched.months["2030-07"], self.snapshot.months["2030-07"])
+        self.assertSameAsRebuilt(patched, self.slots + [datetime(2030, 7, 2, 10, 0)])
+        # The old snapshot is unchanged
+        self.assertSameAsRebuilt(self.snapshot, self.slots)
+        self.assertEqual((patched.generation, patched.seq, patched.lsn), (2, 5, 0))
+        self.assertEqual((self.snapshot.generation, self.snapshot.seq), (1, 4))
+
+    def test_patch_moves_out_of_month(self):
+        """
+        Test that a move out of a month and a cancel that empties a month match a rebuild.
+        """
+        patched = self.snapshot.patched(2, [(False, datetime(2030, 7, 1, 9, 0)), (False, datetime(2030, 6, 3, 9, 0)),
+                                            (True, datetime(2030, 8, 1, 8, 0))])
+        self.assertNotIn("2030-07", patched.months)
+        self.assertSameAsRebuilt(patched, [datetime(2030, 6, 3, 9, 30), datetime(2030, 6, 4, 10, 0),
+                                           datetime(2030, 8, 1, 8, 0)])
+        with self.assertRaises(ValueError):
+            patched.patched(3, [(False, datetime(2030, 7, 1, 9, 0))])
+
+    def test_changes_apply_in_order(self):
+        """
+        Test that a booking and its cancellation in one batch leave the slot free.
+        """
+        slot = datetime(2030, 9, 2, 9, 0)
+        patched = self.snapshot.patched(2, [(True, slot), (False, slot), (True, slot), (False, slot)], seq=8)
+        self.assertSameAsRebuilt(patched, self.slots)
+        self.assertEqual(patched.seq, 8)
+
+    def test_cleared_patch_starts_empty(self):
+        """
+        Test that a cleared patch drops every earlier booking.
+        """
+        slot = datetime(2030, 9, 2, 9, 0)
+        patched = self.snapshot.patched(2, [(True, slot)], cleared=True, seq=9)
+        self.assertSameAsRebuilt(patched, [slot])
+
+    def test_without_month_drops_whole_month(self):
+        """
+        Test that dropping a month removes all its bookings and shares the other months.
+        """
+        dropped = self.snapshot.without_month("2030-06")
+        self.assertEqual(dropped.slots, (datetime(2030, 7, 1, 9, 0),))
+        self.assertIs(dropped.months["2030-07"], self.snapshot.months["2030-07"])
+        self.assertEqual((dropped.generation, dropped.seq, dropped.lsn), (1, 4, 0))
+        self.assertEqual(dropped.without_month("2030-08").slots, dropped.slots)
+
+    def test_full_slots_from_spans_months(self):
+        """
+        Test that full slots come in order from the requested ordinal across months.
+        """
+        snapshot = self.snapshot.patched(2, [(True, datetime(2030, 7, 1, 9, 0)), (True, datetime(2030, 6, 28, 20, 0)),
+                                             (True, datetime(2030, 6, 28, 20, 0))])
+        june = self.rules.slot_ordinal(datetime(2030, 6, 3, 9, 0))
+        end_of_june = self.rules.slot_ordinal(datetime(2030, 6, 28, 20, 0))
+        july = self.rules.slot_ordinal(datetime(2030, 7, 1, 9, 0))
+        self.assertEqual(list(snapshot.full_slots_from(june)), [june, end_of_june, july])
+        self.assertEqual(list(snapshot.full_slots_from(june + 1)), [end_of_june, july])
+        self.assertEqual(list(snapshot.full_slots_from(end_of_june + 1)), [july])
+        self.assertEqual(list(snapshot.full_slots_from(july + 1)), [])
+
+if __name__ == '__main__':
+    unittest.main()